@@ -0,0 +1,82 @@
+"""Commit throughput of concurrent writers to one timeline
+
+Usage::
+
+    python benchmarks/bench_concurrent.py [n_commits] [work_ms]
+
+Each writer thread repeatedly opens a plan, spends `work_ms` milliseconds
+outside the interpreter (as when waiting on I/O), changes a key of its own in
+a MappingFlow, and commits. Writers either hold a lock from opening to
+committing, as a single-plan timeline requires, or commit optimistically,
+retrying on conflicts.
+
+"""
+from __future__ import print_function, division
+
+import sys
+import threading
+import time
+
+from timeflow import MappingFlow, TimeLine, Retention, ConflictError
+
+
+def run(n_writers, n_commits, work, optimistic):
+    tl = TimeLine(require_single_plan=False, retention=Retention(keep_last=100))
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, {'writers': n_writers})
+    tl.commit(plan)
+
+    lock = threading.Lock()
+    retries = [0]
+
+    def writer(index):
+        for count in range(n_commits // n_writers):
+            while True:
+                if not optimistic:
+                    lock.acquire()
+                try:
+                    plan = tl.new_plan()
+                    time.sleep(work)
+                    mapping.at(plan)[index] = count
+                    tl.commit(plan)
+                    break
+                except ConflictError:
+                    tl.cancel(plan)
+                    retries[0] += 1
+                finally:
+                    if not optimistic:
+                        lock.release()
+
+    threads = [threading.Thread(target=writer, args=(index,))
+               for index in range(n_writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    assert len(mapping.at(tl.HEAD)) == n_writers + 1
+
+    # unlink events, so that the history is not freed recursively
+    while tl.HEAD.parent is not None:
+        event = tl.HEAD
+        while event.parent.parent is not None:
+            event = event.parent
+        event.forget_parent()
+    return n_commits / elapsed, retries[0]
+
+
+def main(argv):
+    n_commits = int(argv[1]) if len(argv) > 1 else 400
+    work = float(argv[2]) / 1000 if len(argv) > 2 else 0.001
+
+    for n_writers in (1, 2, 4, 8):
+        locked, _unused = run(n_writers, n_commits, work, optimistic=False)
+        rate, retries = run(n_writers, n_commits, work, optimistic=True)
+        print('{} writers: {:>8.0f} commits/s locked {:>8.0f} commits/s optimistic '
+              '{:>5} retries'.format(n_writers, locked, rate, retries))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
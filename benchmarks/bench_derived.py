@@ -0,0 +1,83 @@
+"""Views computed over flows that change rarely
+
+Usage::
+
+    python benchmarks/bench_derived.py [n_keys] [n_commits] [change_every]
+
+Each commit writes to a busy flow; one commit in `change_every` also changes a
+key of a MappingFlow of `n_keys` keys. A view summing the mapping is read
+after every commit: computed from the mapping at each read, as a derived flow,
+and as an incremental derived flow.
+
+"""
+from __future__ import print_function, division
+
+import sys
+import time
+
+from timeflow import MappingFlow, SimpleFlow, TimeLine, Retention, NO_VALUE
+
+
+def total(prices):
+    return sum(prices.values())
+
+
+def add(value, diff):
+    return value + sum((new if new is not NO_VALUE else 0) -
+                       (old if old is not NO_VALUE else 0)
+                       for old, new in diff.values())
+
+
+def release(tl):
+    # unlink events, so that the history is not freed recursively
+    while tl.HEAD.parent is not None:
+        event = tl.HEAD
+        while event.parent.parent is not None:
+            event = event.parent
+        event.forget_parent()
+
+
+def run(mode, n_keys, n_commits, change_every):
+    tl = TimeLine(retention=Retention(keep_last=100))
+    prices = MappingFlow()
+    busy = SimpleFlow()
+    plan = tl.new_plan()
+    prices.at(plan).update(dict.fromkeys(range(n_keys), 1))
+    tl.commit(plan)
+
+    if mode == 'derived':
+        view = tl.derive(total, prices, default=0)
+    elif mode == 'incremental':
+        view = tl.derive(add, prices, incremental=True, default=0)
+
+    start = time.perf_counter()
+    for count in range(n_commits):
+        plan = tl.new_plan()
+        busy.set_at(plan, count)
+        if count % change_every == 0:
+            prices.at(plan)[count % n_keys] = count
+        tl.commit(plan)
+
+        if mode == 'on read':
+            value = total(prices.at(tl.HEAD))
+        else:
+            value = view.read_at(tl.HEAD)
+    elapsed = time.perf_counter() - start
+
+    assert value == total(prices.at(tl.HEAD))
+    release(tl)
+    return elapsed
+
+
+def main(argv):
+    n_keys = int(argv[1]) if len(argv) > 1 else 10000
+    n_commits = int(argv[2]) if len(argv) > 2 else 2000
+    change_every = int(argv[3]) if len(argv) > 3 else 20
+
+    for mode in ('on read', 'derived', 'incremental'):
+        elapsed = run(mode, n_keys, n_commits, change_every)
+        print('{:<12} {:>8.1f} us/commit'.format(mode, elapsed / n_commits * 1e6))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,82 @@
+"""Loading an exported history, against replaying its commits
+
+Usage::
+
+    python benchmarks/bench_export.py [n_events]
+
+Commits `n_events` plans, each changing one key of a MappingFlow and one
+element of a SetFlow, then exports the timeline and loads it back.
+
+"""
+from __future__ import print_function, division
+
+import os
+import sys
+import tempfile
+import time
+
+from timeflow import TimeLine, MappingFlow, SetFlow
+from timeflow.clock import LogicalClock
+from timeflow.serialize import FlowRegistry
+
+
+def build(n_events):
+    tl = TimeLine(clock=LogicalClock())
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, {'a': 0, 'b': 0})
+    set_ = SetFlow.introduce_at(plan, {0})
+    tl.commit(plan)
+
+    for ii in range(1, n_events):
+        plan = tl.new_plan()
+        mapping.at(plan)['a'] = ii
+        set_.at(plan).add(ii)
+        tl.commit(plan)
+
+    return tl
+
+
+def release(tl):
+    # Unlink events oldest first; otherwise dropping HEAD frees the whole
+    # chain recursively.
+    events = []
+    event = tl.HEAD
+    while event is not None and hasattr(event, 'forget_parent'):
+        events.append(event)
+        event = event.parent
+    for event in reversed(events):
+        if hasattr(event.parent, 'referrers'):
+            event.forget_parent()
+
+
+def main(argv):
+    n_events = int(argv[1]) if len(argv) > 1 else 100000
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        tl = build(n_events)
+        replay = time.perf_counter() - start
+
+        registry = FlowRegistry()
+        start = time.perf_counter()
+        tl.export(path, registry)
+        export = time.perf_counter() - start
+        release(tl)
+        del tl
+
+        start = time.perf_counter()
+        tl = TimeLine.load(path, registry)
+        load = time.perf_counter() - start
+        release(tl)
+
+        print('{} events, {:.1f} bytes/event'.format(
+            n_events, os.path.getsize(path) / n_events))
+        print('commits {:.2f}s, export {:.2f}s, load {:.2f}s ({:.1f}x faster)'.format(
+            replay, export, load, replay / load))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
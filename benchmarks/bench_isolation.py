@@ -0,0 +1,98 @@
+"""Reads of past events from several threads, while another thread commits
+
+Usage::
+
+    python benchmarks/bench_isolation.py [n_readers] [seconds] [n_keys]
+
+A writer thread commits to a MappingFlow of `n_keys` keys, setting key
+``i % n_keys`` to ``i`` in commit ``i``. Reader threads look up random keys at
+random recent events, and check the values. Reads and commits per second, and
+wrong or failed reads, are reported with and without isolated reads.
+
+"""
+from __future__ import print_function, division
+
+import random
+import sys
+import threading
+import time
+
+from timeflow import MappingFlow, TimeLine, Retention
+
+
+def expected(commit, key, n_keys):
+    last = commit - (commit - key) % n_keys
+    return last if last >= 0 else -1
+
+
+def run(n_readers, seconds, n_keys, isolated_reads):
+    mapping = MappingFlow()
+    mapping.isolated_reads = isolated_reads
+
+    tl = TimeLine(retention=Retention(keep_last=200))
+    plan = tl.new_plan()
+    mapping.at(plan).update(dict.fromkeys(range(n_keys), -1))
+    recent = [(tl.commit(plan), -1)]
+
+    done = threading.Event()
+    commits = [0]
+    reads = [0] * n_readers
+    wrong = [0] * n_readers
+
+    def writer():
+        count = 0
+        while not done.is_set():
+            plan = tl.new_plan()
+            mapping.at(plan)[count % n_keys] = count
+            recent.append((tl.commit(plan), count))
+            if len(recent) > 100:
+                del recent[:50]
+            count += 1
+        commits[0] = count
+
+    def reader(index):
+        rand = random.Random(index)
+        while not done.is_set():
+            event, commit = recent[rand.randrange(-min(len(recent), 50), 0)]
+            key = rand.randrange(n_keys)
+            try:
+                if mapping.read_at(event)[key] != expected(commit, key, n_keys):
+                    wrong[index] += 1
+            except Exception:
+                wrong[index] += 1
+            reads[index] += 1
+
+    threads = [threading.Thread(target=writer)]
+    threads.extend(threading.Thread(target=reader, args=(index,))
+                   for index in range(n_readers))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    # unlink events, so that the history is not freed recursively
+    del recent[:]
+    while tl.HEAD.parent is not None:
+        event = tl.HEAD
+        while event.parent.parent is not None:
+            event = event.parent
+        event.forget_parent()
+
+    return sum(reads) / seconds, commits[0] / seconds, sum(wrong)
+
+
+def main(argv):
+    n_readers = int(argv[1]) if len(argv) > 1 else 4
+    seconds = float(argv[2]) if len(argv) > 2 else 2
+    n_keys = int(argv[3]) if len(argv) > 3 else 64
+
+    for isolated_reads in (False, True):
+        read_rate, commit_rate, wrong = run(n_readers, seconds, n_keys, isolated_reads)
+        print('isolated_reads={!s:<5} {:>9.0f} reads/s {:>7.0f} commits/s '
+              '{:>6} wrong reads'.format(isolated_reads, read_rate, commit_rate, wrong))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
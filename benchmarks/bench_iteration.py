@@ -0,0 +1,55 @@
+"""Iteration over a MappingFlow at events some distance from its core
+
+Usage::
+
+    python benchmarks/bench_iteration.py [n_keys] [n_events]
+
+Commits `n_events` plans to a MappingFlow of `n_keys` keys, each setting one
+key, so that the core stays at HEAD. Reports the time taken to iterate over
+all keys, and to take only the first key, at events 0, 1, 10, 100 and 900
+commits behind HEAD.
+
+"""
+from __future__ import print_function, division
+
+import sys
+import timeit
+
+from timeflow import TimeLine, MappingFlow
+from timeflow.clock import LogicalClock
+
+
+def main(argv):
+    n_keys = int(argv[1]) if len(argv) > 1 else 10000
+    n_events = int(argv[2]) if len(argv) > 2 else 1000
+
+    tl = TimeLine(clock=LogicalClock())
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, dict.fromkeys(range(n_keys), -1))
+    events = [tl.commit(plan)]
+    for ii in range(n_events):
+        plan = tl.new_plan()
+        mapping.at(plan)[ii % n_keys] = ii
+        events.append(tl.commit(plan))
+
+    for behind in (0, 1, 10, 100, 900):
+        if behind >= len(events):
+            break
+        instance = mapping.at(events[-1 - behind])
+        number = 20
+        full = timeit.timeit(lambda: sum(1 for _unused in instance), number=number)
+        first = timeit.timeit(lambda: next(iter(instance)), number=number)
+        print('{:>4} behind HEAD: all keys {:>8.3f}ms, first key {:>8.3f}ms'.format(
+            behind, full / number * 1000, first / number * 1000))
+
+    # unlink events, so that the history is not freed recursively
+    del events[:]
+    while tl.HEAD.parent is not None:
+        event = tl.HEAD
+        while event.parent.parent is not None:
+            event = event.parent
+        event.forget_parent()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,93 @@
+"""Bytes retained per event on a long timeline
+
+Usage::
+
+    python benchmarks/bench_memory.py [n_events] [--arena] [--compact] [--tiered]
+
+Commits `n_events` plans, each changing one key of a MappingFlow and one
+element of a SetFlow, and reports the memory still allocated per event while
+the whole history is kept alive. Run it from two checkouts to compare them.
+With `--arena`, the timeline's structures are owned by an Arena. With
+`--compact`, mapping diffs are stored by CompactDiffs. With `--tiered`, diffs
+of all but the last 100 events are spilled to a SQLite file.
+
+"""
+from __future__ import print_function, division
+
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from timeflow import TimeLine, MappingFlow, SetFlow, Arena, CompactDiffs
+from timeflow.tiered import ColdTier, TieredTimeLine
+
+
+def build(n_events, arena=None, compact_diffs=None, tier=None):
+    if tier is not None:
+        tl = TieredTimeLine(tier, max_commits=100, arena=arena,
+                            compact_diffs=compact_diffs)
+    else:
+        tl = TimeLine(arena=arena, compact_diffs=compact_diffs)
+    plan = tl.new_plan([])
+    mapping = MappingFlow.introduce_at(plan, {'a': 0, 'b': 0})
+    mapping.compact_diffs = compact_diffs
+    set_ = SetFlow.introduce_at(plan, {0})
+    events = [tl.commit(plan)]
+
+    for ii in range(1, n_events):
+        plan = tl.new_plan([mapping, set_])
+        mapping.at(plan)['a'] = ii
+        set_.at(plan).add(ii)
+        events.append(tl.commit(plan))
+
+    return tl, events
+
+
+def release(events):
+    # Unlink events first; otherwise dropping HEAD frees the whole chain
+    # recursively.
+    for event in events:
+        event.forget_parent()
+    while events:
+        events.pop()
+
+
+def retained_bytes(n_events, arena=None, compact_diffs=None, tier=None):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tl, events = build(n_events, arena, compact_diffs, tier)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tl
+    release(events)
+    return after - before
+
+
+def main(argv):
+    args = [arg for arg in argv[1:] if not arg.startswith('--')]
+    n_events = int(args[0]) if args else 10000
+    arena = Arena() if '--arena' in argv else None
+    compact_diffs = CompactDiffs() if '--compact' in argv else None
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'cold.sqlite')
+    tier = ColdTier(path) if '--tiered' in argv else None
+    try:
+        total = retained_bytes(n_events, arena, compact_diffs, tier)
+    finally:
+        if tier is not None:
+            tier.close()
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(directory)
+
+    print('{} events: {} bytes, {:.1f} bytes/event'.format(
+        n_events, total, total / n_events))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
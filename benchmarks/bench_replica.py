@@ -0,0 +1,105 @@
+"""Following a leader timeline through each transport
+
+Usage::
+
+    python benchmarks/bench_replica.py [n_keys] [n_commits]
+
+Each commit changes one key of a MappingFlow of `n_keys` keys on the leader.
+A follower thread applies the feed to a :class:`ReplicaTimeLine`. Reported
+are the commits per second replicated, and the bytes sent per commit.
+
+"""
+from __future__ import print_function, division
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from timeflow import (MappingFlow, TimeLine, Retention, HistoryStore,
+                      ChangeFeed, ReplicaTimeLine)
+from timeflow.replica import QueueTransport, PipeTransport, FileTransport
+from timeflow.serialize import FlowRegistry
+
+
+class CountingTransport(object):
+    def __init__(self, transport):
+        self.transport = transport
+        self.bytes = 0
+
+    def send(self, record):
+        self.bytes += len(record)
+        self.transport.send(record)
+
+
+def release(tl):
+    # unlink events, so that the history is not freed recursively
+    while tl.HEAD.parent is not None:
+        event = tl.HEAD
+        while event.parent.parent is not None:
+            event = event.parent
+        event.forget_parent()
+
+
+def run(kind, n_keys, n_commits, path):
+    if kind == 'queue':
+        sending = receiving = QueueTransport()
+    elif kind == 'pipe':
+        sending, receiving = PipeTransport.pair()
+    else:
+        sending = FileTransport(os.path.join(path, 'feed'))
+        receiving = FileTransport(os.path.join(path, 'feed'))
+    sending = CountingTransport(sending)
+
+    registry = FlowRegistry()
+    mapping = registry.register(MappingFlow(), 'mapping')
+    tl = TimeLine(retention=Retention(keep_last=100))
+    plan = tl.new_plan()
+    mapping.at(plan).update(dict.fromkeys(range(n_keys), 0))
+    tl.commit(plan)
+
+    feed = ChangeFeed(tl, registry)
+    feed.attach(sending, cursor=0)
+    replica = ReplicaTimeLine(HistoryStore(os.path.join(path, 'replica')),
+                              receiving, horizon=100)
+
+    def follow():
+        while replica.cursor < n_commits + 1:
+            replica.sync(timeout=1)
+
+    start = time.perf_counter()
+    follower = threading.Thread(target=follow)
+    follower.start()
+    for count in range(n_commits):
+        plan = tl.new_plan()
+        mapping.at(plan)[count % n_keys] = count + 1
+        tl.commit(plan)
+    follower.join()
+    elapsed = time.perf_counter() - start
+
+    replica_mapping = replica.store.registry.flow('mapping')
+    assert replica_mapping.at(replica.HEAD) == mapping.at(tl.HEAD)
+
+    replica.store.close()
+    release(tl)
+    release(replica)
+    return n_commits / elapsed, (sending.bytes - len(feed.read()[0])) / n_commits
+
+
+def main(argv):
+    n_keys = int(argv[1]) if len(argv) > 1 else 10000
+    n_commits = int(argv[2]) if len(argv) > 2 else 2000
+
+    for kind in ('queue', 'pipe', 'file'):
+        path = tempfile.mkdtemp()
+        try:
+            rate, size = run(kind, n_keys, n_commits, path)
+        finally:
+            shutil.rmtree(path)
+        print('{:<6} {:>8.0f} commits/s {:>6.0f} bytes/commit'.format(kind, rate, size))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,57 @@
+"""Memory and commit latency of a long timeline under a retention policy
+
+Usage::
+
+    python benchmarks/bench_retention.py [n_events] [--thinning]
+
+Commits `n_events` plans, each changing one key of a MappingFlow and one
+element of a SetFlow, keeping the last 1000 events; with `--thinning`, also
+one per 100 events older than that, and one per 1000 older than 10000. Reports
+the memory allocated, and the slowest commit, every tenth of the way.
+
+"""
+from __future__ import print_function, division
+
+import sys
+import time
+import tracemalloc
+
+from timeflow import TimeLine, MappingFlow, SetFlow
+from timeflow.clock import LogicalClock
+from timeflow.retention import Retention
+
+
+def main(argv):
+    args = [arg for arg in argv[1:] if not arg.startswith('--')]
+    n_events = int(args[0]) if args else 100000
+    if '--thinning' in argv:
+        retention = Retention(thinning=[(1000, 100), (10000, 1000)])
+    else:
+        retention = Retention(keep_last=1000)
+
+    tracemalloc.start()
+    tl = TimeLine(clock=LogicalClock(), retention=retention)
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, {'a': 0})
+    set_ = SetFlow.introduce_at(plan, {0})
+    tl.commit(plan)
+
+    slowest = 0
+    for ii in range(1, n_events):
+        start = time.perf_counter()
+        plan = tl.new_plan()
+        mapping.at(plan)['a'] = ii
+        set_.at(plan).add(ii)
+        set_.at(plan).discard(ii - 1)
+        tl.commit(plan)
+        slowest = max(slowest, time.perf_counter() - start)
+
+        if ii % (n_events // 10) == 0:
+            print('{:>9} events: {:>6} kept, {:>10} bytes, slowest commit {:.2f}ms'.format(
+                ii, len(retention), tracemalloc.get_traced_memory()[0],
+                slowest * 1000))
+            slowest = 0
+
+
+if __name__ == '__main__':
+    main(sys.argv)
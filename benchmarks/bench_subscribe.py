@@ -0,0 +1,98 @@
+"""Fan-out of changes to consumers: polling snapshots against subscriptions
+
+Usage::
+
+    python benchmarks/bench_subscribe.py [n_keys] [n_commits] [n_consumers]
+
+Each commit changes one key of a MappingFlow of `n_keys` keys. Polling
+consumers materialize HEAD after each commit and diff it against their last
+snapshot; subscribed consumers receive diffs from :meth:`TimeLine.subscribe`.
+
+"""
+from __future__ import print_function, division
+
+import asyncio
+import sys
+import time
+
+from timeflow import MappingFlow, TimeLine, Retention
+
+
+def setup(n_keys):
+    tl = TimeLine(retention=Retention(keep_last=100))
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, dict.fromkeys(range(n_keys), 0))
+    tl.commit(plan)
+    return tl, mapping
+
+
+def release(tl):
+    # unlink events, so that the history is not freed recursively
+    while tl.HEAD.parent is not None:
+        event = tl.HEAD
+        while event.parent.parent is not None:
+            event = event.parent
+        event.forget_parent()
+
+
+def commit(tl, mapping, count, n_keys):
+    plan = tl.new_plan()
+    mapping.at(plan)[count % n_keys] = count + 1
+    tl.commit(plan)
+
+
+def poll(n_keys, n_commits, n_consumers):
+    tl, mapping = setup(n_keys)
+    snapshots = [dict(mapping.materialize(tl.HEAD)) for _unused in range(n_consumers)]
+    received = 0
+
+    start = time.perf_counter()
+    for count in range(n_commits):
+        commit(tl, mapping, count, n_keys)
+        for index, last in enumerate(snapshots):
+            snapshot = dict(mapping.materialize(tl.HEAD))
+            received += sum(1 for key, value in snapshot.items() if last.get(key) != value)
+            snapshots[index] = snapshot
+    elapsed = time.perf_counter() - start
+
+    release(tl)
+    return elapsed, received
+
+
+async def push(n_keys, n_commits, n_consumers):
+    tl, mapping = setup(n_keys)
+    subscriptions = [tl.subscribe(mapping) for _unused in range(n_consumers)]
+    received = 0
+
+    start = time.perf_counter()
+    for count in range(n_commits):
+        commit(tl, mapping, count, n_keys)
+        for subscription in subscriptions:
+            change = await subscription.__anext__()
+            received += len(change.diff)
+    elapsed = time.perf_counter() - start
+
+    release(tl)
+    return elapsed, received
+
+
+def main(argv):
+    n_keys = int(argv[1]) if len(argv) > 1 else 10000
+    n_commits = int(argv[2]) if len(argv) > 2 else 200
+    n_consumers = int(argv[3]) if len(argv) > 3 else 8
+
+    elapsed, received = poll(n_keys, n_commits, n_consumers)
+    print('polling      {:>8.1f} us/commit {:>7} changes'.format(
+        elapsed / n_commits * 1e6, received))
+
+    loop = asyncio.new_event_loop()
+    try:
+        elapsed, received = loop.run_until_complete(push(n_keys, n_commits, n_consumers))
+    finally:
+        loop.close()
+    print('subscribed   {:>8.1f} us/commit {:>7} changes'.format(
+        elapsed / n_commits * 1e6, received))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
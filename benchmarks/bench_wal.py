@@ -0,0 +1,74 @@
+"""Commit throughput of a LoggedTimeLine at each durability level
+
+Usage::
+
+    python benchmarks/bench_wal.py [n_threads] [n_commits]
+
+Each of `n_threads` threads commits `n_commits` plans, each changing the
+thread's own key of a MappingFlow, to one logged timeline.
+
+"""
+from __future__ import print_function, division
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from timeflow import MappingFlow
+from timeflow.wal import WriteAheadLog, LoggedTimeLine, NONE, BATCHED, PER_COMMIT
+
+
+def committer(tl, mapping, key, n_commits):
+    for ii in range(n_commits):
+        plan = tl.new_plan()
+        mapping.at(plan)[key] = ii
+        tl.commit(plan)
+
+
+def run(durability, n_threads, n_commits):
+    directory = tempfile.mkdtemp()
+    try:
+        wal = WriteAheadLog(os.path.join(directory, 'wal'), durability=durability)
+        tl = LoggedTimeLine(wal, require_single_plan=False)
+        plan = tl.new_plan()
+        mapping = MappingFlow.introduce_at(plan, dict.fromkeys(range(n_threads), 0))
+        tl.commit(plan)
+
+        threads = [threading.Thread(target=committer, args=(tl, mapping, key, n_commits))
+                   for key in range(n_threads)]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        wal.close()
+
+        # unlink events, so that the history is not freed recursively
+        while tl.HEAD.parent is not None:
+            event = tl.HEAD
+            while event.parent.parent is not None:
+                event = event.parent
+            event.forget_parent()
+
+        return len(wal) / elapsed, wal.syncs
+    finally:
+        shutil.rmtree(directory)
+
+
+def main(argv):
+    n_threads = int(argv[1]) if len(argv) > 1 else 8
+    n_commits = int(argv[2]) if len(argv) > 2 else 500
+
+    for durability in (NONE, BATCHED, PER_COMMIT):
+        rate, syncs = run(durability, n_threads, n_commits)
+        print('{:<12} {:>10.0f} commits/s {:>8} syncs'.format(durability, rate, syncs))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
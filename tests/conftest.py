@@ -5,6 +5,8 @@ import pytest
 import logging
 import inspect
 
+from timeflow import MappingFlow, SetFlow, SimpleFlow
+
 
 logging.basicConfig(format='{name:26} - {levelname} - {message}', style='{')
 
@@ -31,3 +33,59 @@ def log_level():
     level_name = pytest.config.getoption('log')
     level = name_to_level.get(level_name, 0)
     return level
+
+
+def commit(tl, change):
+    """Commit to `tl` a plan staged by `change(plan)`"""
+    plan = tl.new_plan()
+    change(plan)
+    return tl.commit(plan)
+
+
+def make_flows():
+    """A MappingFlow, SetFlow and SimpleFlow, as changed by :func:`commit_change`"""
+    return MappingFlow(), SetFlow(), SimpleFlow()
+
+
+def commit_change(tl, flows, ii):
+    """Commit to `tl` change `ii` of the history shared by the storage tests
+
+    Change 0 fills in `flows`, from :func:`make_flows`. Each change sets 'a'
+    in the mapping to `ii` and adds `ii` to the set; change 5 deletes 'b'.
+    Every third change sets the value, and the one before it sets it to None.
+    :func:`expected` gives the states after change `ii`.
+
+    """
+    mapping, set_, value = flows
+    plan = tl.new_plan()
+    if ii == 0:
+        mapping.at(plan).update({'a': 0, 'b': 0})
+    else:
+        mapping.at(plan)['a'] = ii
+    if ii == 5:
+        del mapping.at(plan)['b']
+    set_.at(plan).add(ii)
+    if ii % 3 == 0:
+        value.set_at(plan, 'v%d' % ii)
+    elif ii % 3 == 2:
+        value.set_at(plan, None)
+    return tl.commit(plan)
+
+
+def build(tl, n_commits):
+    """Commit the first `n_commits` changes of the shared history to `tl`
+
+    :returns: the flows, a tuple of mapping, set and value.
+
+    """
+    flows = make_flows()
+    for ii in range(n_commits):
+        commit_change(tl, flows, ii)
+    return flows
+
+
+def expected(ii):
+    """The states of the flows after change `ii` of the shared history"""
+    mapping = {'a': ii} if ii >= 5 else {'a': ii, 'b': 0}
+    value = None if ii % 3 == 2 else 'v%d' % (ii - ii % 3)
+    return mapping, set(range(ii + 1)), value
@@ -1,8 +1,10 @@
 import time as _time
+import weakref
 import logging
 from timeflow.event import Event, walk, NullEvent
 from timeflow.linked_mapping import empty_mapping
 import nose
+import nose.tools
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
@@ -42,3 +44,104 @@ def test_event_time_collision():
 
         if event.time - start_time > 5:
             raise ValueError('Aborting test; use a faster setup.')
+
+
+class _TimedEvent(object):
+    def __init__(self, time):
+        self.time = time
+
+
+def test_time_index():
+    from timeflow.event import TimeIndex
+
+    index = TimeIndex()
+    events = [_TimedEvent(time) for time in (10, 20, 20, 30, 40)]
+    for event in events:
+        index.add(event)
+    del event
+
+    late = _TimedEvent(25)   # out of order
+    index.add(late)
+
+    assert index.event_at(10) is events[0]
+    assert index.event_at(15) is events[0]
+    assert index.event_at(20) is events[2]
+    assert index.event_at(27) is late
+    assert index.event_at(1000) is events[-1]
+    with nose.tools.assert_raises(ValueError):
+        index.event_at(5)
+
+    assert index.events_between(20, 30) == [events[1], events[2], late, events[3]]
+    assert index.events_between(20, 30, inclusive=False) == [late]
+
+    # entries for collected events are skipped, then compacted
+    del events[2:4], late
+    with nose.tools.assert_raises(LookupError):
+        index.event_at(30)
+    assert index.event_at(40) is events[2]
+    assert index.events_between(0, 100) == events
+    assert len(index) == 3
+
+    del events[-1]
+    latest = _TimedEvent(50)
+    index.add(latest)
+    # runs of collected events are compacted into one entry, still gone
+    assert len(index._refs) == 4
+    assert len(index) == 3
+    assert index.events_between(0, 100) == events + [latest]
+    assert index.event_at(15) is events[0]
+    for time in (20, 30, 45):
+        with nose.tools.assert_raises(LookupError):
+            index.event_at(time)
+    assert index.event_at(50) is latest
+
+
+def test_clocks():
+    from timeflow import TimeLine
+    from timeflow.clock import LogicalClock, monotonic_ns, wall_clock_ns
+
+    clock = LogicalClock(start=100)
+    tl = TimeLine(clock=clock)
+    fork = TimeLine(clock=clock)
+
+    events = []
+    for _tl in (tl, fork, tl, fork):
+        events.append(_tl.commit(_tl.new_plan()))
+
+    assert [event.time for event in events] == [100, 101, 102, 103]
+    assert all(event.count == 0 for event in events)
+    assert len({hash(event) for event in events}) == 4
+
+    tl = TimeLine(clock=monotonic_ns)
+    e0 = tl.commit(tl.new_plan())
+    e1 = tl.commit(tl.new_plan())
+    assert e0.time_order < e1.time_order
+
+    assert abs(wall_clock_ns() / 1e9 - _time.time()) < 60
+
+
+def test_supplied_time():
+    from timeflow import TimeLine, MappingFlow
+
+    tl = TimeLine()
+
+    plan = tl.new_plan()
+    flow = MappingFlow.introduce_at(plan, {'a': 0})
+    tl.commit(plan, time=1.5)
+
+    plan = tl.new_plan()
+    flow.at(plan)['a'] = 1
+    tl.commit(plan, time=2.25)
+
+    assert flow.read_at_time(tl, 2.) == {'a': 0}
+    assert flow.read_at_time(tl, 2.25) == {'a': 1}
+
+
+def test_compact_events():
+    from timeflow import TimeLine
+
+    tl = TimeLine()
+    tl.commit(tl.new_plan())
+
+    assert not hasattr(tl.HEAD, '__dict__')
+    assert weakref.ref(tl.HEAD)() is tl.HEAD
@@ -0,0 +1,75 @@
+import io
+
+from timeflow import TimeLine
+from timeflow.clock import LogicalClock
+from timeflow.event import Event
+from timeflow.export import export_events, load_events, connected_events
+from timeflow.linked_structure import SELF
+from timeflow.serialize import FlowRegistry
+
+from conftest import build, expected
+
+
+def build_fork():
+    tl = TimeLine(clock=LogicalClock())
+    mapping, set_, value = build(tl, 6)
+
+    # a fork from the event at time 2
+    fork = TimeLine(HEAD=tl.event_at(2), clock=LogicalClock(10))
+    plan = fork.new_plan()
+    mapping.at(plan)['fork'] = True
+    fork.commit(plan)
+
+    return tl, fork, mapping, set_, value
+
+
+def contents(event, mapping, set_, value):
+    return dict(mapping.at(event)), set(set_.at(event)), value.read_at(event)
+
+
+def test_round_trip():
+    tl, fork, mapping, set_, value = build_fork()
+    registry = FlowRegistry()
+    fp = io.BytesIO()
+    export_events(tl.HEAD, fp, registry)
+
+    fp.seek(0)
+    head = load_events(fp, registry)
+
+    original = connected_events(tl.HEAD)
+    loaded = connected_events(head)
+    assert [event.time for event in loaded] == [event.time for event in original]
+    for left, right in zip(original, loaded):
+        assert (contents(left, mapping, set_, value)
+                == contents(right, mapping, set_, value))
+
+    # the fork is a second child of the event at time 2
+    assert [child.time for child in loaded[2].referrers] == [3, 10]
+
+    # unchanged structures are shared, and each history has one core
+    assert loaded[4].time == 10
+    assert set_.at(loaded[4]) is set_.at(loaded[2])
+    cores = [event for event in loaded
+             if mapping.at(event).relation_to_base is SELF]
+    assert len(cores) == 2
+
+
+def test_timeline_export(tmpdir):
+    tl, fork, mapping, set_, value = build_fork()
+    path = str(tmpdir.join('events'))
+    registry = FlowRegistry()
+    tl.export(path, registry)
+
+    loaded = TimeLine.load(path, registry, clock=LogicalClock(6))
+    assert isinstance(loaded.HEAD, Event)
+    assert contents(loaded.event_at(4), mapping, set_, value) == expected(4)
+
+    plan = loaded.new_plan()
+    mapping.at(plan)['c'] = 'c'
+    loaded.commit(plan)
+    assert dict(mapping.at(loaded.HEAD)) == {'a': 5, 'c': 'c'}
+
+    # flows are created by name for a fresh registry
+    registry = FlowRegistry()
+    head = TimeLine.load(path, registry).HEAD
+    assert dict(registry.flow('flow-0').at(head)) == {'a': 5}
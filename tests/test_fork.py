@@ -54,3 +54,21 @@ def test_fork_1():
 
     assert wr_tl() is None or gc.get_referrers(wr_tl()) == []
     assert tl_head() is None or gc.get_referrers(tl_head()) == [],  (gc.get_referrers(tl_head()))
+
+
+def test_interned_forks():
+    from timeflow import InternTable
+
+    tl, mflow = setup_first_timeline()
+    mflow.intern_table = InternTable()
+
+    tl_2 = TimeLine(tl.HEAD.parent)
+
+    for _tl in (tl, tl_2):
+        plan = _tl.new_plan()
+        mflow.at(plan)['a'] = 'converged'
+        _tl.commit(plan)
+
+    assert mflow.at(tl.HEAD) == {'a': 'converged', 'b': 'b0'}
+    assert mflow.at(tl.HEAD) is mflow.at(tl_2.HEAD)
+    assert hash(tl.HEAD.instance) == hash(tl_2.HEAD.instance)
@@ -288,3 +288,240 @@ def test_hatch_egg_optimized(log_level: int):
         assert ghosted(cc_ref)
 
         logger.debug('bottom: aa.base: %s', (aa.debug_label if aa.relation_to_base is SELF else aa.base.debug_label))
+
+
+def test_keyframes():
+    from timeflow.linked_structure import Keyframes, walk_to_core
+
+    keyframes = Keyframes(every=3)
+
+    aa = LinkedMapping.first_egg({'a': 0, 'b': 0}).hatch()
+    history = [aa]
+
+    for ii in range(1, 10):
+        egg = history[-1].egg()
+        egg['a'] = ii
+        hatched = egg.hatch(); del egg
+        keyframes.apply(hatched)
+        history.append(hatched)
+
+    for ii, ls in enumerate(history):
+        assert ls == {'a': ii, 'b': 0}
+        assert len(walk_to_core(ls)) - 1 < 3
+
+    assert history[-1].relation_to_base is SELF
+    assert sum(ls.relation_to_base is SELF for ls in history) == 5
+
+
+def test_keyframes_max_diffs():
+    from timeflow.linked_structure import Keyframes
+
+    keyframes = Keyframes(max_diffs=4)
+
+    aa = LinkedMapping.first_egg({'z': 0}).hatch()
+    bb_egg = aa.egg()
+    bb_egg.update({'x': 1, 'y': 1})
+    bb = bb_egg.hatch(); del bb_egg
+    keyframes.apply(bb)
+    assert aa.relation_to_base is PARENT
+
+    cc_egg = bb.egg()
+    cc_egg.update({'x': 2, 'y': 2})
+    cc = cc_egg.hatch(); del cc_egg
+    keyframes.apply(cc)
+
+    assert bb.relation_to_base is SELF
+    assert aa.relation_to_base is PARENT and aa.unproxied_base is bb
+    assert aa == {'z': 0}
+    assert bb == {'z': 0, 'x': 1, 'y': 1}
+    assert cc == {'z': 0, 'x': 2, 'y': 2}
+
+
+def test_len():
+    aa, bb, desired_aa, desired_bb = setup_main_test_cases()
+    assert len(aa) == len(desired_aa)
+    assert len(bb) == len(desired_bb)
+
+    cc_egg = bb.egg()
+    assert len(cc_egg) == len(desired_bb)
+    cc_egg['new'] = 1
+    cc_egg['varies'] = 30
+    del cc_egg['constant']
+    assert len(cc_egg) == len(desired_bb)
+    cc_egg['newer'] = 2
+    assert len(cc_egg) == len(desired_bb) + 1
+
+    cc = hatch_egg_optimized(cc_egg); del cc_egg
+    assert len(cc) == len(dict(cc)) == len(desired_bb) + 1
+
+    # sizes are kept when the core moves
+    transfer_core(aa, bb)
+    assert len(aa) == len(desired_aa)
+    assert len(bb) == len(desired_bb)
+
+
+def test_bulk_writes():
+    from timeflow.linked_structure import batch_lookup
+
+    aa, bb, desired_aa, desired_bb = setup_main_test_cases()
+    assert batch_lookup(bb, ['varies', 'to_delete', 'additional', 'nope']) == {
+        'varies': 20, 'to_delete': NO_VALUE,
+        'additional': 'additional_val', 'nope': NO_VALUE}
+
+    cc_egg = bb.egg()
+    cc_egg.update({'varies': 10, 'constant': 100, 'new': 1}, also_new=2)
+    cc_egg['additional'] = 'changed'
+    assert cc_egg['new'] == 1
+    assert dict(cc_egg.diff_parent) == {}
+
+    cc = hatch_egg_optimized(cc_egg); del cc_egg
+
+    assert cc.diff_parent == {
+        'varies': (20, 10),
+        'new': (NO_VALUE, 1),
+        'also_new': (NO_VALUE, 2),
+        'additional': ('additional_val', 'changed')}
+    assert cc == dict(desired_bb, varies=10, new=1, also_new=2,
+                      additional='changed')
+    assert bb == desired_bb
+
+
+def test_eq_uses_diffs(monkeypatch):
+    aa, bb, desired_aa, desired_bb = setup_main_test_cases()
+
+    cc_egg = bb.egg()
+    cc_egg['varies'] = 'temporary'
+    cc_egg['varies'] = 20
+    cc = hatch_egg_simple(cc_egg); del cc_egg
+
+    dd_egg = bb.egg()
+    dd_egg['constant'] = 'changed'
+    dd = hatch_egg_simple(dd_egg); del dd_egg
+
+    def fail(self):
+        raise AssertionError('iterated')
+
+    monkeypatch.setattr(LinkedMapping, '__iter__', fail)
+
+    assert aa != bb
+    assert bb == cc and cc == bb
+    assert bb != dd and dd != bb
+    assert bb != {}
+    assert bb != LinkedMapping.empty_variant
+
+    monkeypatch.undo()
+
+    assert bb == desired_bb
+    assert dd != cc
+
+
+def test_fingerprint():
+    aa, bb, desired_aa, desired_bb = setup_main_test_cases()
+
+    # same contents as aa, reached from bb
+    cc_egg = bb.egg()
+    cc_egg.update(desired_aa)
+    del cc_egg['additional']
+    cc = hatch_egg_optimized(cc_egg); del cc_egg
+
+    dd = hatch_egg_optimized(LinkedMapping.first_egg(dict(desired_aa)))
+
+    assert aa.fingerprint == cc.fingerprint == dd.fingerprint != bb.fingerprint
+    assert hash(aa) == hash(cc) == hash(dd)
+    assert {aa: 'found'}[cc] == 'found'
+
+    ee_egg = aa.egg()
+    ee_egg['unhashable'] = []
+    ee = hatch_egg_simple(ee_egg); del ee_egg
+    assert ee.fingerprint is None
+    with pytest.raises(TypeError):
+        hash(ee)
+
+    with pytest.raises(TypeError):
+        hash(aa.egg())
+
+
+def test_intern_table():
+    from timeflow.linked_structure import InternTable
+
+    table = InternTable()
+    aa = table.hatch(LinkedMapping.first_egg({'a': 0}))
+
+    bb_egg = aa.egg()
+    bb_egg['a'] = 1
+    bb = table.hatch(bb_egg); del bb_egg
+
+    cc_egg = aa.egg()
+    cc_egg['a'] = 1
+    cc = table.hatch(cc_egg); del cc_egg
+
+    dd_egg = bb.egg()
+    dd_egg['a'] = 0
+    dd = table.hatch(dd_egg); del dd_egg
+
+    assert cc is bb
+    assert dd is aa
+    assert aa == {'a': 0} and bb == {'a': 1}
+    assert len(table) == 2
+
+
+def test_ancestry_diff(monkeypatch):
+    from timeflow.linked_structure import common_ancestor
+
+    aa, bb, desired_aa, desired_bb = setup_main_test_cases()
+
+    # two branches from aa; intermediate structures are kept alive, as events
+    # would keep them
+    left = aa
+    history = []
+    for ii in range(3):
+        egg = left.egg()
+        egg['varies'] = ('left', ii)
+        egg['left_only_%d' % ii] = ii
+        left = hatch_egg_optimized(egg); del egg
+        history.append(left)
+    left_egg = left.egg()
+    del left_egg['left_only_0']
+    left = hatch_egg_optimized(left_egg); del left_egg
+
+    right_egg = bb.egg()
+    right_egg['constant'] = 'changed'
+    right = hatch_egg_optimized(right_egg); del right_egg
+
+    assert common_ancestor(left, right)[0] is aa
+    assert common_ancestor(right, left)[0] is aa
+
+    monkeypatch.setattr(LinkedMapping, '_diff', None)
+
+    assert dict(diff(left, right)) == {
+        'varies': (('left', 2), 20),
+        'left_only_1': (1, NO_VALUE),
+        'left_only_2': (2, NO_VALUE),
+        'constant': (100, 'changed'),
+        'to_delete': ('to_delete_val', NO_VALUE),
+        'additional': (NO_VALUE, 'additional_val')}
+    assert dict(diff(right, left)) == {k: (v[1], v[0]) for k, v in diff(left, right)}
+
+    assert left != right
+    assert left == dict(desired_aa, varies=('left', 2), left_only_1=1, left_only_2=2)
+
+
+def test_compact_nodes():
+    aa = hatch_egg_simple(LinkedMapping.first_egg({'a': 1}))
+    egg = aa.egg()
+    egg['a'] = 2
+    bb = hatch_egg_simple(egg); del egg
+
+    assert not hasattr(aa, '__dict__')
+    assert not hasattr(bb, '__dict__')
+    assert weakref.ref(bb)() is bb
+
+    assert bb.parent() is aa
+    assert bb.diff_parent == {'a': (1, 2)}
+
+    # an orphaned diff is dropped along with the parent
+    transfer_core(aa, bb)
+    del aa
+    assert bb.parent() is None
+    assert bb.diff_parent is None
+    assert bb == {'a': 2}
@@ -1,8 +1,9 @@
 import weakref
+import collections
 import nose.tools
 
 from timeflow.linked_structure import (transfer_core, create_core_in, hatch_egg_simple,
-                                       CHILD, SELF, DIFF_LEFT, DIFF_RIGHT, diff)
+                                       PARENT, CHILD, SELF, DIFF_LEFT, DIFF_RIGHT, diff)
 from timeflow.linked_set import LinkedSet
 
 
@@ -124,3 +125,93 @@ def test_diff():
             == {'to_delete': DIFF_RIGHT,
                 'added': DIFF_LEFT,
                 'new_val': DIFF_RIGHT})
+
+
+def test_len():
+    aa, bb = setup_tests()
+    assert len(aa) == len(bb) == 2
+
+    cc_egg = bb.egg()
+    cc_egg.add('new')
+    cc_egg.discard('always_here')
+    cc_egg.add('newer')
+    assert len(cc_egg) == 3
+
+    cc = cc_egg.hatch(); del cc_egg
+    assert len(cc) == len(set(cc)) == 3
+
+
+def test_bulk_writes():
+    aa, bb = setup_tests()
+
+    cc_egg = bb.egg()
+    cc_egg.update(['added', 'new_0', 'new_1'])
+    cc_egg.difference_update(['always_here', 'never_here', 'new_1'])
+    assert 'new_0' in cc_egg
+    assert 'new_1' not in cc_egg
+    assert cc_egg.diff_parent == {}
+
+    assert cc_egg == {'added', 'new_0'}
+    assert cc_egg.diff_parent == {'always_here': PARENT, 'new_0': CHILD}
+
+    cc = cc_egg.hatch(); del cc_egg
+    assert cc == {'added', 'new_0'}
+    test_standard_assertions(aa, bb)
+
+
+def test_eq():
+    aa, bb = setup_tests()
+
+    cc_egg = bb.egg()
+    cc_egg.add('temporary')
+    cc_egg.discard('temporary')
+    cc = hatch_egg_simple(cc_egg); del cc_egg
+
+    assert aa != bb
+    assert bb == cc
+    assert cc == {'always_here', 'added'}
+    assert cc != LinkedSet.empty_variant
+    assert LinkedSet.empty_variant != cc
+
+
+def test_fingerprint():
+    aa, bb = setup_tests()
+
+    cc_egg = bb.egg()
+    cc_egg.add('to_delete')
+    cc_egg.remove('added')
+    cc = cc_egg.hatch(); del cc_egg
+
+    assert aa.fingerprint == cc.fingerprint != bb.fingerprint
+    assert hash(aa) == hash(cc)
+    assert hash(aa) == collections.Set._hash(aa)
+
+
+def test_ancestry_diff():
+    aa, bb = setup_tests()
+
+    cc_egg = aa.egg()
+    cc_egg.add('cc_only')
+    cc_egg.remove('always_here')
+    cc = cc_egg.hatch(); del cc_egg
+
+    assert dict(diff(bb, cc)) == {'to_delete': DIFF_RIGHT,
+                                  'added': DIFF_LEFT,
+                                  'cc_only': DIFF_RIGHT,
+                                  'always_here': DIFF_LEFT}
+
+
+def test_iterate_far_from_core():
+    from timeflow.linked_structure import walk_to_core
+
+    nodes = [hatch_egg_simple(LinkedSet.first_egg({0, 1}))]
+    for ii in range(2, 2000):
+        egg = nodes[-1].egg()
+        egg.add(ii)
+        egg.remove(ii - 2)
+        nodes.append(hatch_egg_simple(egg)); del egg
+        transfer_core(nodes[-2], nodes[-1])
+
+    assert len(walk_to_core(nodes[0])) == len(nodes)
+    assert set(nodes[0]) == {0, 1}
+    assert set(nodes[1000]) == {1000, 1001}
@@ -0,0 +1,148 @@
+import pytest
+
+from timeflow import TimeLine, MappingFlow, SetFlow, SimpleFlow, ConflictError
+from timeflow.linked_mapping import LinkedMapping
+from timeflow.linked_structure import NO_VALUE
+from timeflow.merge import Conflict, ours, theirs
+
+from conftest import commit
+
+
+class IntFlow(SimpleFlow):
+    default = 0
+
+
+def forked():
+    tl = TimeLine()
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, dict(a=1, b=2, c=3))
+    set_ = SetFlow.introduce_at(plan, {1, 2, 3})
+    value = IntFlow.introduce_at(plan, 1)
+    tl.commit(plan)
+
+    plan = tl.new_plan()
+    mapping.at(plan)['d'] = 4
+    tl.commit(plan)
+
+    return tl, TimeLine(tl.HEAD), mapping, set_, value
+
+
+def test_merge():
+    tl, branch, mapping, set_, value = forked()
+    fork = tl.HEAD
+
+    def change_ours(plan):
+        mapping.at(plan)['a'] = 10
+        set_.at(plan).add(4)
+
+    def change_theirs(plan):
+        mapping.at(plan)['b'] = 20
+        del mapping.at(plan)['c']
+        mapping.at(plan)['a'] = 10
+        set_.at(plan).discard(1)
+        value.set_at(plan, 2)
+
+    commit(tl, change_ours)
+    commit(branch, change_theirs)
+    commit(branch, lambda plan: mapping.at(plan).update(e=5))
+
+    merged = tl.merge(branch)
+
+    assert tl.HEAD is merged
+    assert mapping.at(merged) == dict(a=10, b=20, d=4, e=5)
+    assert set_.at(merged) == {2, 3, 4}
+    assert value.read_at(merged) == 2
+    assert mapping.at(branch.HEAD) == dict(a=10, b=20, d=4, e=5)
+    assert set_.at(branch.HEAD) == {2, 3}
+    assert mapping.at(fork) == dict(a=1, b=2, c=3, d=4)
+
+
+def test_merge_flows_changed_on_one_side():
+    tl, branch, mapping, set_, value = forked()
+    introduced = []
+
+    def change_theirs(plan):
+        mapping.at(plan)['a'] = 10
+        introduced.append(MappingFlow.introduce_at(plan, dict(x=1)))
+
+    commit(branch, change_theirs)
+    merged = tl.merge(branch)
+
+    assert mapping.at(merged) is mapping.at(branch.HEAD)
+    assert introduced[0].at(merged) == dict(x=1)
+
+
+def test_conflicts():
+    tl, branch, mapping, set_, value = forked()
+
+    def change_ours(plan):
+        mapping.at(plan)['a'] = 10
+        del mapping.at(plan)['b']
+        set_.at(plan).add(4)
+        value.set_at(plan, 3)
+
+    def change_theirs(plan):
+        mapping.at(plan)['a'] = 20
+        mapping.at(plan)['b'] = 30
+        mapping.at(plan)['c'] = 30
+        set_.at(plan).add(4)
+        value.set_at(plan, 2)
+
+    head = commit(tl, change_ours)
+    commit(branch, change_theirs)
+
+    with pytest.raises(ConflictError) as info:
+        tl.merge(branch)
+    assert info.value.conflicts == {mapping: {'a', 'b'}, value: None}
+    assert tl.HEAD is head
+    assert not tl.has_uncommitted_plan
+
+    seen = []
+    def resolver(conflict):
+        seen.append(conflict)
+        return theirs(conflict) if conflict.key == 'b' else ours(conflict)
+
+    merged = tl.merge(branch, resolver)
+    assert mapping.at(merged) == dict(a=10, b=30, c=30, d=4)
+    assert set_.at(merged) == {1, 2, 3, 4}
+    assert value.read_at(merged) == 3
+    assert sorted(seen, key=lambda conflict: str(conflict.key)) == [
+        Conflict(value, None, 1, 3, 2),
+        Conflict(mapping, 'a', 1, 10, 20),
+        Conflict(mapping, 'b', 2, NO_VALUE, 30)]
+
+
+def test_merge_walks_only_the_divergence(monkeypatch):
+    tl, branch, mapping, set_, value = forked()
+    commit(tl, lambda plan: mapping.at(plan).update(x=1))
+    commit(branch, lambda plan: mapping.at(plan).update(y=1))
+
+    def full_diff(left, right):
+        raise AssertionError('diffed whole structures')
+    monkeypatch.setattr(LinkedMapping, '_diff', staticmethod(full_diff))
+
+    merged = tl.merge(branch)
+    assert mapping.at(merged) == dict(a=1, b=2, c=3, d=4, x=1, y=1)
+
+
+def test_no_shared_history():
+    tl, branch, mapping, set_, value = forked()
+    other = TimeLine()
+    commit(other, lambda plan: value.set_at(plan, 5))
+
+    with pytest.raises(ValueError):
+        tl.merge(other)
+
+
+def test_merge_again():
+    tl, branch, mapping, set_, value = forked()
+    commit(branch, lambda plan: mapping.at(plan).update(x=1))
+    merged = tl.merge(branch)
+    assert merged.merged is branch.HEAD
+
+    commit(tl, lambda plan: mapping.at(plan).update(x=2))
+    commit(branch, lambda plan: mapping.at(plan).update(y=1))
+
+    # starts from the last merge, where both sides had x=1
+    merged = tl.merge(branch)
+    assert mapping.at(merged) == dict(a=1, b=2, c=3, d=4, x=2, y=1)
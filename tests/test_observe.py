@@ -0,0 +1,147 @@
+from timeflow import (TimeLine, MappingFlow, SetFlow, SimpleFlow, NO_VALUE,
+                      HistoryStore, ChangeFeed, ReplicaTimeLine)
+from timeflow.clock import LogicalClock
+from timeflow.replica import QueueTransport
+
+from conftest import commit
+
+
+def counting(rule):
+    calls = []
+    def counted(*args):
+        calls.append(args)
+        return rule(*args)
+    return counted, calls
+
+
+def test_derived_flow():
+    tl = TimeLine(clock=LogicalClock())
+    prices = MappingFlow()
+    held = SetFlow()
+    other = SimpleFlow()
+
+    rule, calls = counting(lambda prices, held: sum(prices.get(name, 0) for name in held))
+    total = tl.derive(rule, prices, held)
+    first = tl.HEAD
+    assert total.read_at(first) == 0
+
+    e1 = commit(tl, lambda plan: prices.at(plan).update(a=1, b=2, c=4))
+    e2 = commit(tl, lambda plan: held.at(plan).update({'a', 'c'}))
+    e3 = commit(tl, lambda plan: other.set_at(plan, 'unrelated'))
+    e4 = commit(tl, lambda plan: prices.at(plan).update(c=10))
+
+    assert [total.read_at(event) for event in (e1, e2, e3, e4)] == [0, 5, 5, 11]
+    # the unrelated commit did not recompute the rule
+    assert len(calls) == 4
+    assert tl.HEAD.instance[total] == 11
+
+
+def test_incremental():
+    tl = TimeLine(clock=LogicalClock())
+    prices = MappingFlow()
+    commit(tl, lambda plan: prices.at(plan).update(a=1, b=2))
+
+    def add(total, diff):
+        return total + sum((new if new is not NO_VALUE else 0) -
+                           (old if old is not NO_VALUE else 0)
+                           for old, new in diff.values())
+    rule, calls = counting(add)
+
+    total = tl.derive(rule, prices, incremental=True, default=0)
+    assert total.read_at(tl.HEAD) == 3
+
+    def change(plan):
+        prices.at(plan)['a'] = 5
+        del prices.at(plan)['b']
+    commit(tl, change)
+
+    assert total.read_at(tl.HEAD) == 5
+    assert calls[-1] == (3, {'a': (1, 5), 'b': (2, NO_VALUE)})
+
+
+def test_chained():
+    tl = TimeLine(clock=LogicalClock())
+    values = MappingFlow()
+    total = tl.derive(lambda values: sum(values.values()), values, default=0)
+    double = tl.derive(lambda total: 2 * total, total, default=0)
+
+    rule, calls = counting(lambda total: total > 10)
+    large = tl.derive(rule, total, default=False)
+
+    commit(tl, lambda plan: values.at(plan).update(a=3, b=4))
+    assert (total.read_at(tl.HEAD), double.read_at(tl.HEAD), large.read_at(tl.HEAD)) == (7, 14, False)
+
+    # unchanged values are not passed on
+    commit(tl, lambda plan: values.at(plan).update(a=4, b=3))
+    assert len(calls) == 2
+
+    commit(tl, lambda plan: values.at(plan).update(c=5))
+    assert (total.read_at(tl.HEAD), double.read_at(tl.HEAD), large.read_at(tl.HEAD)) == (12, 24, True)
+
+
+def test_stored(tmpdir):
+    store = HistoryStore(str(tmpdir))
+    tl = store.timeline(clock=LogicalClock())
+    values = store.registry.register(MappingFlow(), 'values')
+    count = store.registry.register(tl.derive(len, values, default=0), 'count')
+
+    commit(tl, lambda plan: values.at(plan).update(a=1, b=2))
+    commit(tl, lambda plan: values.at(plan).update(c=3))
+
+    assert count.read_at(store.event(0)) == 2
+    assert count.read_at(store.event(1)) == 3
+    store.close()
+
+    # reopened without the rule, as a plain value
+    store = HistoryStore(str(tmpdir))
+    event = store.event(1)
+    count = store.registry.flow('count')
+    assert type(count) is SimpleFlow
+    assert count.read_at(event) == 3
+
+
+def test_replicated(tmpdir):
+    tl = TimeLine(clock=LogicalClock())
+    feed = ChangeFeed(tl)
+    values = feed.registry.register(MappingFlow(), 'values')
+    count = feed.registry.register(tl.derive(len, values, default=0), 'count')
+    transport = QueueTransport()
+    feed.attach(transport)
+
+    commit(tl, lambda plan: values.at(plan).update(a=1, b=2))
+    commit(tl, lambda plan: values.at(plan).clear())
+    assert count.read_at(tl.HEAD) == 0
+
+    replica = ReplicaTimeLine(HistoryStore(str(tmpdir)), transport)
+    assert replica.sync() == 2
+    count = replica.store.registry.flow('count')
+    assert type(count) is SimpleFlow
+    assert count.read_at(replica.event_at(0)) == 2
+    # back to the default of the derived flow, not to that of SimpleFlow
+    assert count.read_at(replica.HEAD) == 0
+
+
+def test_default_compared_by_equality():
+    tl = TimeLine(clock=LogicalClock())
+    values = MappingFlow()
+    total = tl.derive(lambda values: sum(values.values()), values, default=0.0)
+
+    commit(tl, lambda plan: values.at(plan).update(a=0))
+    # 0 == 0.0, so the default is not stored
+    assert total not in tl.HEAD.instance
+    assert total.read_at(tl.HEAD) == 0.0
+
+
+def test_merge_recomputes():
+    tl = TimeLine(clock=LogicalClock())
+    values = MappingFlow()
+    total = tl.derive(lambda values: sum(values.values()), values, default=0)
+    commit(tl, lambda plan: values.at(plan).update(a=1))
+
+    # the branch does not maintain `total`
+    branch = TimeLine(tl.HEAD)
+    commit(branch, lambda plan: values.at(plan).update(b=2))
+    commit(tl, lambda plan: values.at(plan).update(c=3))
+
+    tl.merge(branch)
+    assert total.read_at(tl.HEAD) == 6
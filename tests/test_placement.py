@@ -0,0 +1,56 @@
+from timeflow import TimeLine, MappingFlow, CorePlacement, CostModel
+from timeflow.linked_structure import SELF, PARENT, walk_to_core
+
+
+def setup_history(n_commits):
+    tl = TimeLine()
+
+    plan = tl.new_plan()
+    flow = MappingFlow.introduce_at(plan, {'a': 0, 'b': 0})
+    events = [tl.commit(plan)]
+
+    for ii in range(1, n_commits):
+        plan = tl.new_plan()
+        flow.at(plan)['a'] = ii
+        events.append(tl.commit(plan))
+
+    return tl, flow, events
+
+
+def test_hot_node_gets_core():
+    tl, flow, events = setup_history(20)
+    placement = flow.core_placement = CorePlacement(min_reads=4)
+
+    hot = flow.read_at(events[2])
+    assert hot.relation_to_base is PARENT
+    assert placement.stats(hot)['depth'] == 17
+
+    for _ in range(3):
+        flow.read_at(events[2])
+
+    assert hot.relation_to_base is SELF
+    assert hot == {'a': 2, 'b': 0}
+    assert len(walk_to_core(flow.read_at(events[0]))) == 3
+
+    migration, = placement.migrations
+    assert migration.node_ref() is hot
+    assert migration.reads == 4 and migration.depth == 17
+    assert migration.read_cost > migration.copy_cost
+
+    # HEAD keeps its own core
+    assert flow.read_at(tl.HEAD).relation_to_base is SELF
+    assert flow.read_at(tl.HEAD) == {'a': 19, 'b': 0}
+
+
+def test_cost_model():
+    tl, flow, events = setup_history(5)
+    placement = flow.core_placement = CorePlacement(
+        CostModel(hop_cost=1., item_cost=1000.), min_reads=1)
+
+    for _ in range(64):
+        flow.read_at(events[0])
+
+    node = flow.read_at(events[0])
+    assert not placement.migrations
+    assert node.relation_to_base is PARENT
+    assert placement.reads(node) == 65
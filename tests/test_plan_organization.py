@@ -4,7 +4,12 @@ Tests plan organization functionality.
 Make sure test_simple_flow passes first.
 """
 
-from timeflow import Plan, StepLine, SimpleFlow, TimeLine
+import threading
+
+import pytest
+
+from timeflow import Plan, StepLine, SimpleFlow, TimeLine, MappingFlow, SetFlow
+from timeflow import ConflictError
 
 
 class IntFlow(SimpleFlow):
@@ -33,3 +38,99 @@ def test_int_flow():
 
     assert si.read_at(e0) == 1
     assert si.read_at(e1) == 2
+
+
+def concurrent_timeline():
+    tl = TimeLine(require_single_plan=False)
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, dict(a=1, b=2, c=3))
+    set_ = SetFlow.introduce_at(plan, {1, 2})
+    value = IntFlow.introduce_at(plan, 1)
+    tl.commit(plan)
+    return tl, mapping, set_, value
+
+
+def test_rebase():
+    tl, mapping, set_, value = concurrent_timeline()
+
+    first = tl.new_plan()
+    second = tl.new_plan()
+    mapping.at(first)['a'] = 10
+    set_.at(first).add(3)
+    mapping.at(second)['b'] = 20
+    del mapping.at(second)['c']
+    set_.at(second).discard(1)
+    value.set_at(second, 2)
+
+    tl.commit(first)
+    e2 = tl.commit(second)
+
+    assert second.base_event is e2.parent
+    assert mapping.at(e2) == dict(a=10, b=20)
+    assert set_.at(e2) == {2, 3}
+    assert value.read_at(e2) == 2
+    assert mapping.at(e2.parent) == dict(a=10, b=2, c=3)
+
+
+def test_conflict():
+    tl, mapping, set_, value = concurrent_timeline()
+
+    first = tl.new_plan()
+    second = tl.new_plan()
+    mapping.at(first)['a'] = 10
+    mapping.at(first)['b'] = 20
+    value.set_at(first, 2)
+    mapping.at(second)['a'] = 30
+    mapping.at(second)['c'] = 30
+    value.set_at(second, 3)
+    set_.at(second).add(3)
+
+    e1 = tl.commit(first)
+    with pytest.raises(ConflictError) as info:
+        tl.commit(second)
+
+    assert info.value.conflicts == {mapping: {'a'}, value: None}
+    assert second.status == Plan.planning
+    assert tl.HEAD is e1
+    assert mapping.at(e1) == dict(a=10, b=20, c=3)
+    assert set_.at(e1) == {1, 2}
+
+
+def test_concurrent_writers():
+    tl, mapping, set_, value = concurrent_timeline()
+    n_threads, n_commits = 4, 10
+
+    def writer(index):
+        for count in range(n_commits):
+            while True:
+                plan = tl.new_plan()
+                mapping.at(plan)[(index, count)] = count
+                try:
+                    tl.commit(plan)
+                    break
+                except ConflictError:
+                    tl.cancel(plan)
+
+    threads = [threading.Thread(target=writer, args=(index,))
+               for index in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(mapping.at(tl.HEAD)) == 3 + n_threads * n_commits
+
+
+def test_hatch_policy_errors_propagate():
+    class BrokenKeyframes(object):
+        def apply(self, hatched):
+            raise AttributeError('bug in a hatch policy')
+
+    tl = TimeLine()
+    mapping = MappingFlow()
+    mapping.keyframes = BrokenKeyframes()
+    plan = tl.new_plan()
+    mapping.at(plan)['a'] = 1
+
+    with pytest.raises(AttributeError):
+        tl.commit(plan)
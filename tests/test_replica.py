@@ -0,0 +1,185 @@
+import threading
+
+import pytest
+
+from timeflow import TimeLine, BridgeMappingFlow, HistoryStore, ChangeFeed, ReplicaTimeLine
+from timeflow.clock import LogicalClock
+from timeflow.replica import QueueTransport, PipeTransport, FileTransport
+from timeflow.serialize import FlowRegistry
+
+from conftest import make_flows, commit_change, expected
+
+
+def leader():
+    tl = TimeLine(clock=LogicalClock())
+    registry = FlowRegistry()
+    mapping, set_, value = make_flows()
+    registry.register(mapping, 'mapping')
+    registry.register(set_, 'set')
+    registry.register(value, 'value')
+    return tl, registry, mapping, set_, value
+
+
+def replica_flows(replica):
+    registry = replica.store.registry
+    return registry.flow('mapping'), registry.flow('set'), registry.flow('value')
+
+
+def check(replica, n_commits):
+    mapping, set_, value = replica_flows(replica)
+    for ii in range(n_commits):
+        event = replica.event_at(ii)
+        assert (mapping.at(event), set_.at(event), value.read_at(event)) == expected(ii)
+
+
+@pytest.mark.parametrize('transport', ['queue', 'pipe', 'file'])
+def test_replica(tmpdir, transport):
+    if transport == 'queue':
+        sending = receiving = QueueTransport()
+    elif transport == 'pipe':
+        sending, receiving = PipeTransport.pair()
+    else:
+        sending = FileTransport(str(tmpdir.join('feed')))
+        receiving = FileTransport(str(tmpdir.join('feed')))
+
+    tl, registry, mapping, set_, value = leader()
+    feed = ChangeFeed(tl, registry)
+    feed.attach(sending)
+
+    # flows are created on the follower from their first change
+    replica = ReplicaTimeLine(HistoryStore(str(tmpdir.join('replica'))), receiving)
+    for ii in range(10):
+        commit_change(tl, (mapping, set_, value), ii)
+        assert replica.sync(timeout=1) == 1
+
+    assert len(feed) == replica.cursor == 10
+    assert replica.sync() == 0
+    check(replica, 10)
+
+    with pytest.raises(TypeError):
+        replica.commit(replica.new_plan())
+
+
+def test_resume(tmpdir):
+    tl, registry, mapping, set_, value = leader()
+    feed = ChangeFeed(tl, registry)
+    transport = QueueTransport()
+    feed.attach(transport)
+
+    store = HistoryStore(str(tmpdir), snapshot_every=4)
+    replica = ReplicaTimeLine(store, transport)
+    for ii in range(6):
+        commit_change(tl, (mapping, set_, value), ii)
+    assert replica.sync() == 6
+    store.close()
+
+    # the follower restarts, while the leader goes on
+    feed.detach(transport)
+    for ii in range(6, 9):
+        commit_change(tl, (mapping, set_, value), ii)
+
+    transport = QueueTransport()
+    replica = ReplicaTimeLine(HistoryStore(str(tmpdir), snapshot_every=4), transport)
+    assert replica.cursor == 6
+    check(replica, 6)
+
+    feed.attach(transport, cursor=replica.cursor)
+    commit_change(tl, (mapping, set_, value), 9)
+    assert replica.sync() == 4
+    check(replica, 10)
+
+    # records already applied are skipped
+    for record in feed.read(8):
+        assert replica.apply(record) == 0
+
+
+def test_missing_records(tmpdir):
+    tl, registry, mapping, set_, value = leader()
+    feed = ChangeFeed(tl, registry, backlog=2)
+    for ii in range(4):
+        commit_change(tl, (mapping, set_, value), ii)
+
+    with pytest.raises(IndexError):
+        feed.read(1)
+
+    replica = ReplicaTimeLine(HistoryStore(str(tmpdir)), QueueTransport())
+    with pytest.raises(ValueError):
+        replica.apply(feed.read(2)[0])
+
+
+def test_existing_history(tmpdir):
+    tl, registry, mapping, set_, value = leader()
+    for ii in range(3):
+        commit_change(tl, (mapping, set_, value), ii)
+
+    feed = ChangeFeed(tl, registry)
+    commit_change(tl, (mapping, set_, value), 3)
+
+    replica = ReplicaTimeLine(HistoryStore(str(tmpdir)), QueueTransport())
+    for record in feed.read():
+        replica.apply(record)
+
+    mapping, set_, value = replica_flows(replica)
+    assert replica.cursor == 2
+    assert mapping.at(replica.HEAD) == expected(3)[0]
+    assert set_.at(replica.HEAD) == expected(3)[1]
+    assert value.read_at(replica.HEAD) == expected(3)[2]
+
+
+def test_concurrent_reads(tmpdir):
+    tl, registry, mapping, set_, value = leader()
+    feed = ChangeFeed(tl, registry)
+    transport = QueueTransport()
+    feed.attach(transport)
+    replica = ReplicaTimeLine(HistoryStore(str(tmpdir)), transport)
+
+    def follow():
+        while replica.cursor < 30:
+            replica.sync(timeout=1)
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    for ii in range(30):
+        commit_change(tl, (mapping, set_, value), ii)
+    follower.join()
+
+    check(replica, 30)
+
+
+def test_restarted_leader(tmpdir):
+    tl, registry, mapping, set_, value = leader()
+    feed = ChangeFeed(tl, registry)
+    for ii in range(3):
+        commit_change(tl, (mapping, set_, value), ii)
+
+    store = HistoryStore(str(tmpdir))
+    replica = ReplicaTimeLine(store, QueueTransport())
+    for record in feed.read():
+        replica.apply(record)
+    store.close()
+
+    # a new feed numbers its records from 0 again
+    feed = ChangeFeed(tl, registry)
+    commit_change(tl, (mapping, set_, value), 3)
+    replica = ReplicaTimeLine(HistoryStore(str(tmpdir)), QueueTransport())
+    with pytest.raises(ValueError):
+        replica.apply(feed.read()[0])
+    assert replica.cursor == 3
+
+
+def test_flows_needing_arguments(tmpdir):
+    tl, registry, mapping, set_, value = leader()
+    bridge = registry.register(BridgeMappingFlow(TimeLine()), 'bridge')
+    feed = ChangeFeed(tl, registry)
+    plan = tl.new_plan()
+    bridge.at(plan)['a'] = 1
+    tl.commit(plan)
+
+    store = HistoryStore(str(tmpdir))
+    replica = ReplicaTimeLine(store, QueueTransport())
+    with pytest.raises(TypeError, match="'bridge'"):
+        replica.apply(feed.read()[0])
+
+    store.registry.register(BridgeMappingFlow(TimeLine()), 'bridge')
+    replica.apply(feed.read()[0])
+    assert store.registry.flow('bridge').at(replica.HEAD) == {'a': 1}
@@ -0,0 +1,131 @@
+import gc
+import itertools
+import weakref
+
+from timeflow import TimeLine
+from timeflow.clock import LogicalClock
+from timeflow.event import Event
+from timeflow.linked_structure import SELF
+from timeflow.retention import Retention, squash_event
+
+from conftest import build, commit_change, expected
+
+
+def build_retained(n_commits, **kwargs):
+    tl = TimeLine(clock=LogicalClock(), **kwargs)
+    mapping, set_, value = build(tl, n_commits)
+    return tl, mapping, set_, value
+
+
+def history(tl):
+    events = []
+    event = tl.HEAD
+    while isinstance(event, Event):
+        events.append(event)
+        event = event.parent
+    return events[::-1]
+
+
+def check(events, mapping, set_, value):
+    for event in events:
+        assert (dict(mapping.at(event)), set(set_.at(event)),
+                value.read_at(event)) == expected(event.time)
+
+
+def test_squash_event():
+    tl, mapping, set_, value = build_retained(4)
+    events = history(tl)
+    dropped = weakref.ref(events[2])
+    dropped_instance = weakref.ref(mapping.at(events[2]))
+
+    assert squash_event(events[2])
+    assert events[3].parent is events[1]
+    assert mapping.at(events[3]).parent() is mapping.at(events[1])
+    del events
+    gc.collect()
+    assert dropped() is None
+    assert dropped_instance() is None
+    check(history(tl), mapping, set_, value)
+
+    # HEAD, and events that plans are based on, are kept
+    events = history(tl)
+    assert not squash_event(events[-1])
+    plan = TimeLine(HEAD=events[1]).new_plan()
+    mapping.at(plan)
+    assert not squash_event(events[1])
+
+
+def test_keep_last():
+    tl, mapping, set_, value = build_retained(20, retention=Retention(keep_last=5))
+    events = history(tl)
+    assert [event.time for event in events] == list(range(15, 20))
+    assert len(tl.retention) == 5
+    check(events, mapping, set_, value)
+
+
+def test_max_age():
+    tl, mapping, set_, value = build_retained(20, retention=Retention(max_age=3))
+    assert [event.time for event in history(tl)] == [17, 18, 19]
+
+
+def test_thinning():
+    retention = Retention(thinning=[(5, 4), (15, 8)])
+    tl, mapping, set_, value = build_retained(40, retention=retention)
+    events = history(tl)
+    times = [event.time for event in events]
+
+    # all of the last 5, one per 4 older than that, one per 8 older than 15
+    assert times == [0, 8, 16, 24, 28, 32, 35, 36, 37, 38, 39]
+    assert len(retention) == len(times)
+    check(events, mapping, set_, value)
+
+    # one core per flow, at HEAD
+    assert [event for event in events
+            if mapping.at(event).relation_to_base is SELF] == [tl.HEAD]
+
+
+def test_forks_are_kept():
+    tl, mapping, set_, value = build_retained(4, retention=Retention(thinning=[(1, 100)]))
+    assert [event.time for event in history(tl)] == [0, 3]
+    fork = TimeLine(HEAD=tl.HEAD, clock=LogicalClock(100))
+    plan = fork.new_plan()
+    mapping.at(plan)['fork'] = True
+    fork.commit(plan)
+
+    for ii in range(4, 9):
+        commit_change(tl, (mapping, set_, value), ii)
+
+    events = history(tl)
+    assert [event.time for event in events] == [0, 3, 8]
+    check(events, mapping, set_, value)
+    assert dict(mapping.at(fork.HEAD)) == dict(expected(3)[0], fork=True)
+
+
+def test_combined_rules():
+    # events are dropped only once outside both keep_last and max_age
+    tl = TimeLine(clock=itertools.count(0, 600).__next__,
+                  retention=Retention(keep_last=10, max_age=1000))
+    build(tl, 5)
+    assert [event.time for event in history(tl)] == [0, 600, 1200, 1800, 2400]
+
+    tl, mapping, set_, value = build_retained(20, retention=Retention(keep_last=3, max_age=5))
+    assert [event.time for event in history(tl)] == [15, 16, 17, 18, 19]
+
+    # thinning leaves the latest keep_last events alone, and never truncates
+    tl, mapping, set_, value = build_retained(
+        40, retention=Retention(keep_last=100, thinning=[(10, 10)]))
+    assert len(history(tl)) == 40
+
+    tl, mapping, set_, value = build_retained(
+        40, retention=Retention(keep_last=5, thinning=[(0, 10)]))
+    events = history(tl)
+    assert [event.time for event in events] == [0, 10, 20, 30, 35, 36, 37, 38, 39]
+    check(events, mapping, set_, value)
+
+    tl, mapping, set_, value = build_retained(
+        40, retention=Retention(max_age=5, thinning=[(0, 10)]))
+    assert [event.time for event in history(tl)] == [0, 10, 20, 30, 35, 36, 37, 38, 39]
+
+    # without keep_last, nothing holds on to the first event
+    tl, mapping, set_, value = build_retained(4, retention=Retention(max_age=2))
+    assert tl.retention._latest is None
@@ -0,0 +1,195 @@
+import gc
+import threading
+
+from timeflow import TimeLine, MappingFlow, SetFlow, Retention
+from timeflow.linked_structure import consistent_read, core_moves
+from timeflow.snapshot import (SnapshotCache, materialize, snapshot_cache,
+                               IsolatedMapping, IsolatedSet)
+
+
+def setup_history():
+    tl = TimeLine()
+
+    plan = tl.new_plan()
+    mflow = MappingFlow.introduce_at(plan, {'a': 0, 'b': 0, 'c': 0})
+    sflow = SetFlow.introduce_at(plan, {0})
+    events = [tl.commit(plan)]
+
+    for ii in range(1, 6):
+        plan = tl.new_plan()
+        mflow.at(plan)['a'] = ii
+        if ii == 1:
+            del mflow.at(plan)['c']
+        sflow.at(plan).add(ii)
+        events.append(tl.commit(plan))
+
+    return tl, mflow, sflow, events
+
+
+def test_materialize():
+    tl, mflow, sflow, events = setup_history()
+
+    snapshot = materialize(mflow.at(events[0]))
+    assert type(snapshot) is dict
+    assert snapshot == {'a': 0, 'b': 0, 'c': 0}
+    assert materialize(mflow.at(events[3])) == {'a': 3, 'b': 0}
+
+    snapshot = materialize(sflow.at(events[2]))
+    assert type(snapshot) is frozenset
+    assert snapshot == {0, 1, 2}
+
+    assert materialize(MappingFlow().at(tl.HEAD)) == {}
+
+    plan = tl.new_plan()
+    mflow.at(plan)['d'] = 1
+    assert mflow.materialize(plan) == {'a': 5, 'b': 0, 'd': 1}
+
+
+def test_snapshot_cache():
+    tl, mflow, sflow, events = setup_history()
+    cache = SnapshotCache(maxsize=3)
+
+    first = cache.get(mflow, events[1])
+    assert first == {'a': 1, 'b': 0}
+    assert cache.get(mflow, events[1]) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.get(sflow, events[1])
+    cache.get(mflow, events[2])
+    cache.get(mflow, events[1])
+    cache.get(mflow, events[3])   # evicts (sflow, events[1])
+    assert len(cache) == 3
+    assert cache.get(mflow, events[1]) is first
+    assert cache.misses == 4
+    cache.get(sflow, events[1])
+    assert cache.misses == 5
+
+
+def test_snapshot_cache_drops_dead_events():
+    tl, mflow, sflow, events = setup_history()
+    cache = SnapshotCache()
+
+    fork = TimeLine(events[-2])
+    plan = fork.new_plan()
+    mflow.at(plan)['a'] = 'fork'
+    fork_event = fork.commit(plan)
+
+    assert cache.get(mflow, fork_event)['a'] == 'fork'
+    cache.get(mflow, events[0])
+    assert len(cache) == 2
+
+    del fork, fork_event, plan
+    gc.collect()
+    assert len(cache) == 1
+
+
+def test_flow_materialize():
+    tl, mflow, sflow, events = setup_history()
+    assert mflow.materialize(events[4]) is mflow.materialize(events[4])
+    snapshot_cache.clear()
+
+
+def test_isolated_reads():
+    tl, mflow, sflow, events = setup_history()
+    mflow.isolated_reads = sflow.isolated_reads = True
+
+    mapping = mflow.read_at(events[2])
+    assert type(mapping) is IsolatedMapping
+    assert mapping == {'a': 2, 'b': 0}
+    assert mapping['a'] == 2 and mapping.get('c') is None and 'b' in mapping
+    assert sorted(mapping) == ['a', 'b'] and len(mapping) == 2
+    assert type(materialize(mapping)) is dict
+
+    elements = sflow.read_at(events[2])
+    assert type(elements) is IsolatedSet
+    assert elements == {0, 1, 2} and 2 in elements and 3 not in elements
+    assert mflow.materialize(events[2]) == {'a': 2, 'b': 0}
+
+    plan = tl.new_plan()
+    mflow.at(plan)['b'] = 10
+    tl.commit(plan)
+    assert mapping == {'a': 2, 'b': 0}
+
+    # staged instances are not wrapped
+    plan = tl.new_plan()
+    assert mflow.read_at(plan) == {'a': 5, 'b': 10}
+    assert type(mflow.at(plan)) is not IsolatedMapping
+    tl.cancel(plan)
+
+
+def test_consistent_read_retries():
+    calls = []
+
+    def read():
+        calls.append(None)
+        if len(calls) == 1:
+            with core_moves:
+                pass
+            raise KeyError('half-moved')
+        return len(calls)
+
+    assert consistent_read(read) == 2
+
+    with core_moves:
+        # the thread moving cores reads them directly
+        assert consistent_read(len, 'abc') == 3
+
+
+def test_reads_during_commits():
+    mflow = MappingFlow()
+    mflow.isolated_reads = True
+    n_keys = 8
+
+    tl = TimeLine(retention=Retention(keep_last=10))
+    plan = tl.new_plan()
+    mflow.at(plan).update(dict.fromkeys(range(n_keys), -1))
+    recent = [(tl.commit(plan), -1)]
+    done = threading.Event()
+    wrong = []
+
+    def reader():
+        while not done.is_set():
+            entries = recent[:]
+            event, count = entries[len(entries) // 2]
+            for key in range(n_keys):
+                last = count - (count - key) % n_keys
+                try:
+                    value = mflow.read_at(event)[key]
+                except Exception as exc:
+                    value = exc
+                if value != (last if last >= 0 else -1):
+                    wrong.append((count, key, value))
+
+    readers = [threading.Thread(target=reader) for _unused in range(4)]
+    for thread in readers:
+        thread.start()
+    for count in range(300):
+        plan = tl.new_plan()
+        mflow.at(plan)[count % n_keys] = count
+        recent.append((tl.commit(plan), count))
+        del recent[:-10]
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert wrong == []
+
+
+def test_commit_holds_core_moves_only_to_move_cores():
+    mflow = MappingFlow()
+    tl = TimeLine()
+    held = []
+
+    def rule(mapping):
+        # run while hatching, between core moves
+        held.append(core_moves.sequence & 1)
+        return len(mapping)
+
+    count = tl.derive(rule, mflow)
+    for ii in range(3):
+        plan = tl.new_plan()
+        mflow.at(plan)[ii] = ii
+        tl.commit(plan)
+
+    assert count.read_at(tl.HEAD) == 3
+    assert held and not any(held)
@@ -0,0 +1,167 @@
+import gc
+import os
+import threading
+import weakref
+
+import pytest
+
+from timeflow import MappingFlow
+from timeflow.clock import LogicalClock
+from timeflow.event import NullEvent
+from timeflow.store import HistoryStore
+
+from conftest import build, expected
+
+
+def test_history_store(tmpdir):
+    store = HistoryStore(str(tmpdir), snapshot_every=4, segment_size=300)
+    tl = store.timeline(horizon=3, clock=LogicalClock())
+    mapping, set_, value = build(tl, 10)
+
+    assert len(store) == 10
+    assert len(os.listdir(str(tmpdir))) > 1
+
+    for ii in range(10):
+        event = tl.event_at(ii)
+        assert (mapping.at(event), set_.at(event), value.read_at(event)) == expected(ii)
+
+    # evicted events are rebuilt, without parents
+    assert isinstance(tl.event_at(2).parent, NullEvent)
+    assert tl.event_at(8) is tl.HEAD.parent
+
+
+def test_eviction(tmpdir):
+    store = HistoryStore(str(tmpdir))
+    tl = store.timeline(horizon=3, clock=LogicalClock())
+    mapping, set_, value = build(tl, 2)
+    first = weakref.ref(tl.HEAD.parent)
+
+    plan = tl.new_plan()
+    mapping.at(plan)['a'] = 'new'
+    tl.commit(plan)
+    gc.collect()
+    assert first() is not None
+
+    plan = tl.new_plan()
+    mapping.at(plan)['a'] = 'newer'
+    tl.commit(plan)
+    gc.collect()
+    assert first() is None
+    assert mapping.at(tl.event_at(0)) == {'a': 0, 'b': 0}
+
+
+def test_default_horizon(tmpdir):
+    from timeflow.linked_structure import SELF
+
+    store = HistoryStore(str(tmpdir))
+    tl = store.timeline(clock=LogicalClock())
+    mapping = MappingFlow()
+    for ii in range(tl.horizon + 100):
+        plan = tl.new_plan()
+        mapping.at(plan)[ii % 4] = ii
+        tl.commit(plan)
+
+    # evicted events die before the structures of their children, so the
+    # cores stay at HEAD
+    assert tl.HEAD.instance.relation_to_base is SELF
+    assert mapping.at(tl.HEAD).relation_to_base is SELF
+    assert mapping.at(tl.event_at(100)) == {0: 100, 1: 97, 2: 98, 3: 99}
+
+
+def test_concurrent_commits(tmpdir):
+    store = HistoryStore(str(tmpdir))
+    tl = store.timeline(require_single_plan=False, clock=LogicalClock())
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, dict.fromkeys(range(4), 0))
+    tl.commit(plan)
+
+    def committer(key):
+        for ii in range(1, 11):
+            plan = tl.new_plan()
+            mapping.at(plan)[key] = ii
+            tl.commit(plan)
+
+    threads = [threading.Thread(target=committer, args=(key,)) for key in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # the store holds the events in the order they were committed
+    assert len(store) == 41
+    event = tl.HEAD
+    for seq in reversed(range(41)):
+        assert event.time == seq
+        assert mapping.at(store.event(seq)) == mapping.at(event)
+        event = event.parent
+
+
+def test_reopen(tmpdir):
+    store = HistoryStore(str(tmpdir), snapshot_every=4, segment_size=300)
+    build(store.timeline(horizon=3, clock=LogicalClock()), 10)
+    store.close()
+
+    store = HistoryStore(str(tmpdir), snapshot_every=4, segment_size=300)
+    assert len(store) == 10
+
+    tl = store.timeline(clock=LogicalClock(10))
+    mapping = store.registry.flow('flow-0')
+    set_ = store.registry.flow('flow-1')
+    value = store.registry.flow('flow-2')
+    assert (mapping.at(tl.HEAD), set_.at(tl.HEAD), value.read_at(tl.HEAD)) == expected(9)
+
+    plan = tl.new_plan()
+    mapping.at(plan)['c'] = 'c'
+    tl.commit(plan)
+
+    assert mapping.at(tl.event_at(10)) == {'a': 9, 'c': 'c'}
+    assert mapping.at(tl.event_at(3)) == {'a': 3, 'b': 0}
+
+
+def test_torn_tail(tmpdir):
+    store = HistoryStore(str(tmpdir))
+    build(store.timeline(horizon=10, clock=LogicalClock()), 3)
+    store.close()
+
+    path = os.path.join(str(tmpdir), os.listdir(str(tmpdir))[0])
+    with open(path, 'ab') as fp:
+        fp.write(b'\x01partial record')
+
+    store = HistoryStore(str(tmpdir))
+    assert len(store) == 3
+    event = store.event(2)
+    assert store.registry.flow('flow-0').at(event) == {'a': 2, 'b': 0}
+
+
+def test_corrupt_segment(tmpdir):
+    store = HistoryStore(str(tmpdir), segment_size=300)
+    build(store.timeline(horizon=10, clock=LogicalClock()), 10)
+    store.close()
+
+    # only the last segment may be torn
+    first = os.path.join(str(tmpdir), sorted(os.listdir(str(tmpdir)))[0])
+    with open(first, 'r+b') as fp:
+        fp.seek(-1, os.SEEK_END)
+        fp.write(b'\xff')
+
+    with pytest.raises(ValueError):
+        HistoryStore(str(tmpdir), segment_size=300)
+
+
+def test_segment_view_grows_lazily(tmpdir):
+    store = HistoryStore(str(tmpdir))
+    tl = store.timeline(horizon=10, clock=LogicalClock())
+    mapping, set_, value = build(tl, 3)
+    segment = store._segments[-1]
+
+    store.states_at(1)
+    view = segment.view()
+    plan = tl.new_plan()
+    mapping.at(plan)['a'] = 'new'
+    tl.commit(plan)
+
+    # older records are read from the existing map
+    store.states_at(1)
+    assert segment.view(store._commits[1][2]) is view
+    store.states_at(3)
+    assert segment.view() is not view
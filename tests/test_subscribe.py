@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+from timeflow import TimeLine, MappingFlow, SetFlow, SimpleFlow
+from timeflow.linked_structure import NO_VALUE, DIFF_LEFT, DIFF_RIGHT
+
+from conftest import commit
+
+
+class IntFlow(SimpleFlow):
+    default = 0
+
+
+def setup_timeline():
+    tl = TimeLine()
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, dict(a=1, b=2))
+    set_ = SetFlow.introduce_at(plan, {1, 2})
+    tl.commit(plan)
+    return tl, mapping, set_
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_subscribe():
+    async def consume():
+        tl, mapping, set_ = setup_timeline()
+        value = IntFlow()
+        mapping_changes = tl.subscribe(mapping)
+        set_changes = tl.subscribe(set_)
+        value_changes = tl.subscribe(value)
+
+        e1 = commit(tl, lambda plan: mapping.at(plan).update(a=10, c=3))
+        e2 = commit(tl, lambda plan: set_.at(plan).add(3))
+        e3 = commit(tl, lambda plan: (mapping.at(plan).pop('b'),
+                                      set_.at(plan).discard(1),
+                                      value.set_at(plan, 5)))
+        for subscription in (mapping_changes, set_changes, value_changes):
+            subscription.close()
+
+        return ([change async for change in mapping_changes],
+                [change async for change in set_changes],
+                [change async for change in value_changes],
+                (e1, e2, e3))
+
+    mapping_changes, set_changes, value_changes, (e1, e2, e3) = run(consume())
+
+    assert [(change.event, change.diff) for change in mapping_changes] == [
+        (e1, {'a': (1, 10), 'c': (NO_VALUE, 3)}),
+        (e3, {'b': (2, NO_VALUE)})]
+    assert [(change.event, change.diff) for change in set_changes] == [
+        (e2, {3: DIFF_RIGHT}),
+        (e3, {1: DIFF_LEFT})]
+    assert [(change.event, change.diff) for change in value_changes] == [
+        (e3, {None: (0, 5)})]
+
+
+def test_keys_and_coalescing():
+    async def consume():
+        tl, mapping, set_ = setup_timeline()
+        changes = tl.subscribe(mapping, keys={'a', 'c'}, maxsize=2)
+
+        for ii in range(5):
+            commit(tl, lambda plan: mapping.at(plan).update(a=ii, b=ii))
+        commit(tl, lambda plan: mapping.at(plan).update(b=10))
+        commit(tl, lambda plan: mapping.at(plan).update(c=3))
+        head = commit(tl, lambda plan: mapping.at(plan).update(a=1))
+        changes.close()
+        return [change async for change in changes], changes.coalesced, head
+
+    changes, coalesced, head = run(consume())
+    assert [(change.diff, change.commits) for change in changes] == [
+        ({'a': (1, 0)}, 1),
+        ({'a': (0, 1), 'c': (NO_VALUE, 3)}, 6)]
+    assert changes[-1].event is head
+    assert coalesced == 5
+
+
+def test_commits_from_another_thread():
+    async def consume():
+        tl, mapping, set_ = setup_timeline()
+        changes = tl.subscribe(mapping)
+
+        def writer():
+            for ii in range(20):
+                commit(tl, lambda plan: mapping.at(plan).update(a=ii))
+            changes.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        received = [change async for change in changes]
+        thread.join()
+        return received
+
+    received = run(consume())
+    assert sum(change.commits for change in received) == 20
+    assert received[-1].diff['a'][1] == 19
+
+
+
+def test_loop_bound_on_first_iteration():
+    tl, mapping, set_ = setup_timeline()
+    # made outside of any event loop
+    changes = tl.subscribe(mapping)
+
+    def writer():
+        commit(tl, lambda plan: mapping.at(plan).update(a=3))
+        changes.close()
+
+    async def consume():
+        thread = threading.Thread(target=writer)
+        asyncio.get_running_loop().call_later(0.01, thread.start)
+        received = [change async for change in changes]
+        thread.join()
+        return received
+
+    received = run(consume())
+    assert [change.diff for change in received] == [{'a': (1, 3)}]
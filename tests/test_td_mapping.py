@@ -140,3 +140,189 @@ def test_nop_plan():
 
     trans = {CHILD:'CHILD', PARENT:'PARENT', SELF:'SELF'}
     assert tdi.at(e1).relation_to_base == SELF, "relation_to_base is {}".format(trans[tdi.at(e1).relation_to_base])
+
+
+def test_keyframes():
+    from timeflow import Keyframes
+    from timeflow.linked_structure import walk_to_core
+
+    tl = TimeLine(keyframes=Keyframes(every=4))
+
+    plan = tl.new_plan()
+    flow = MappingFlow.introduce_at(plan, {'a': 0})
+    flow.keyframes = Keyframes(every=4)
+    events = [tl.commit(plan)]
+
+    for ii in range(1, 20):
+        plan = tl.new_plan()
+        flow.at(plan)['a'] = ii
+        events.append(tl.commit(plan))
+
+    for ii, event in enumerate(events):
+        assert flow.at(event) == {'a': ii}
+        assert len(walk_to_core(flow.at(event))) <= 4
+        assert len(walk_to_core(event.instance)) <= 4
+
+
+def test_read_at_time():
+    tl = StepLine()
+
+    plan = tl.new_plan()
+    flow = MappingFlow.introduce_at(plan, {'a': 0})
+    e0 = tl.commit(plan)
+
+    plan = tl.new_plan()
+    flow.at(plan)['a'] = 1
+    e1 = tl.commit(plan)
+
+    assert tl.event_at(e1.time) is e1
+    assert flow.read_at_time(tl, e1.time) == {'a': 1}
+    assert tl.events_between(e0.time, e1.time) == [e0, e1]
+
+    del e0, plan
+    assert tl.events_between(0, e1.time) == [e1]
+
+    with nose.tools.assert_raises(ValueError):
+        tl.event_at(e1.time - 1000)
+
+
+def test_arena():
+    import gc
+    from timeflow import Arena
+
+    arena = Arena()
+    tl = TimeLine(arena=arena)
+
+    plan = tl.new_plan()
+    flow = MappingFlow.introduce_at(plan, {'a': 0})
+    events = [tl.commit(plan)]
+    for ii in range(1, 6):
+        plan = tl.new_plan()
+        flow.at(plan)['a'] = ii
+        events.append(tl.commit(plan))
+
+    nodes = [flow.at(event) for event in events]
+    assert all(node in arena for node in nodes)
+    assert len(arena) == 12    # a flow instance and an instance map per event
+    assert all(nodes[ii].base is nodes[ii + 1] for ii in range(5))
+    assert [node['a'] for node in nodes] == list(range(6))
+
+    # release the oldest history
+    refs = [weakref.ref(node) for node in nodes]
+    del nodes
+    for event in events[:3]:
+        arena.release(event.instance, *event.instance.values())
+    del event
+    assert len(arena) == 6
+
+    events[3].forget_parent()
+    del events[:3]
+    gc.collect()
+
+    assert [ref() is None for ref in refs] == [True] * 3 + [False] * 3
+    assert refs[3]().parent() is None
+    assert refs[3]().diff_parent is None
+    assert [flow.at(event)['a'] for event in events] == [3, 4, 5]
+
+    # forks stay in the arena
+    fork = TimeLine(HEAD=events[1])
+    plan = fork.new_plan()
+    flow.at(plan)['a'] = 'fork'
+    fork_event = fork.commit(plan)
+    assert flow.at(fork_event) in arena
+    assert flow.at(fork_event) == {'a': 'fork'}
+    assert flow.at(events[-1]) == {'a': 5}
+
+
+def test_arena_set_algebra():
+    from timeflow import Arena, SetFlow
+
+    arena = Arena()
+    tl = TimeLine(arena=arena)
+    plan = tl.new_plan()
+    flow = SetFlow.introduce_at(plan, {0, 1})
+    first = tl.commit(plan)
+    plan = tl.new_plan()
+    flow.at(plan).add(2)
+    flow.at(plan).discard(0)
+    second = tl.commit(plan)
+    assert len(arena) == 4
+
+    # results derived from owned sets are not owned, and are not kept
+    left, right = flow.at(first), flow.at(second)
+    for ii in range(100):
+        assert left | right == {0, 1, 2}
+        assert left & right == {1}
+    assert (left | right) not in arena
+    assert len(arena) == 4
+
+
+def test_arena_release_one_at_a_time():
+    import gc
+    from timeflow import Arena
+
+    arena = Arena()
+    tl = TimeLine(arena=arena)
+    flow = MappingFlow()
+    events = []
+    for ii in range(5):
+        plan = tl.new_plan()
+        flow.at(plan)['a'] = ii
+        events.append(tl.commit(plan))
+
+    # children of released structures are linked to them weakly again
+    for event in events[:4]:
+        arena.release(event.instance, flow.at(event))
+        child = flow.at(events[events.index(event) + 1])
+        assert child.parent() is flow.at(event)
+    assert len(arena) == 2
+    assert not arena._children
+
+    # the arena is freed without the cyclic garbage collector
+    ref = weakref.ref(arena)
+    gc.disable()
+    try:
+        del arena, tl, events, event, child
+        assert ref() is None
+    finally:
+        gc.enable()
+
+
+def test_compact_diffs():
+    from timeflow import CompactDiffs, diff, NO_VALUE
+    from timeflow.linked_mapping import CompactDiff
+
+    compact_diffs = CompactDiffs()
+    tl = TimeLine(compact_diffs=compact_diffs)
+
+    plan = tl.new_plan()
+    flow = MappingFlow.introduce_at(plan, {'a': 0, 'b': 0})
+    flow.compact_diffs = compact_diffs
+    events = [tl.commit(plan)]
+    for ii in range(1, 5):
+        plan = tl.new_plan()
+        flow.at(plan)['a'] = ii
+        if ii == 3:
+            del flow.at(plan)['b']
+        events.append(tl.commit(plan))
+
+    nodes = [flow.at(event) for event in events]
+    assert all(type(node.diff_parent) is CompactDiff for node in nodes[1:])
+    assert all(type(event.instance.diff_parent) is CompactDiff for event in events[2:])
+
+    # indexes are shared by diffs of the same keys
+    assert nodes[1].diff_parent.index is nodes[4].diff_parent.index
+    assert nodes[3].diff_parent == {'a': (2, 3), 'b': (0, NO_VALUE)}
+
+    assert [dict(node) for node in nodes] == [
+        {'a': 0, 'b': 0}, {'a': 1, 'b': 0}, {'a': 2, 'b': 0}, {'a': 3}, {'a': 4}]
+    assert dict(diff(nodes[2], nodes[4])) == {'a': (2, 4), 'b': (0, NO_VALUE)}
+    assert dict(diff(nodes[4], nodes[2])) == {'a': (4, 2), 'b': (NO_VALUE, 0)}
+    assert nodes[1] == {'a': 1, 'b': 0}
+
+    # the core moves back through packed diffs
+    head = events.pop()
+    del tl, head, nodes
+    assert flow.at(events[-1]).relation_to_base is SELF
+    assert flow.at(events[-1]) == {'a': 3}
+    assert flow.at(events[0]) == {'a': 0, 'b': 0}
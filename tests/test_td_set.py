@@ -113,6 +113,10 @@ def test_bridge_set():
 
     assert 30 in sf
 
+    intersection = sf.intersection({30, 50})
+    assert intersection == {30}
+    intersection.add(60)
+
 
 
 def test_bridge_set_errors():
@@ -124,3 +128,40 @@ def test_bridge_set_errors():
 
     with nose.tools.assert_raises(AttributeError):
         sf.head.remove('to_delete')
+
+
+def test_set_algebra_between_versions():
+    from timeflow.linked_set import LinkedSet
+
+    tl = TimeLine()
+
+    plan = tl.new_plan()
+    sf = SetFlow()
+    sf.at(plan).update(range(100))
+    e0 = tl.commit(plan)
+
+    plan = tl.new_plan()
+    sf.at(plan).difference_update([0, 1])
+    sf.at(plan).update(['a', 'b'])
+    e1 = tl.commit(plan)
+
+    s0, s1 = sf.at(e0), sf.at(e1)
+    full_0, full_1 = set(range(100)), set(range(2, 100)) | {'a', 'b'}
+
+    union = s0 | s1
+    intersection = s0 & s1
+    assert isinstance(union, LinkedSet) and union.parent() is s0
+    assert isinstance(intersection, LinkedSet) and intersection.parent() is s0
+    assert union == full_0 | full_1
+    assert intersection == full_0 & full_1
+
+    assert s0 - s1 == {0, 1}
+    assert s1 - s0 == {'a', 'b'}
+    assert s0 ^ s1 == {0, 1, 'a', 'b'}
+    assert isinstance(s0 ^ s1, LinkedSet)
+
+    assert s0 | s0 is s0
+
+    # unrelated operands
+    assert s0 & {1, 2, 'x'} == {1, 2}
+    assert s0 - set(range(1, 100)) == {0}
@@ -0,0 +1,84 @@
+import gc
+import os
+
+import pytest
+
+from timeflow.clock import LogicalClock
+from timeflow.tiered import ColdTier, SpilledDiff, TieredTimeLine
+
+from conftest import make_flows, commit_change, expected
+
+
+def build_events(tl, n_commits):
+    flows = make_flows()
+    return flows, [commit_change(tl, flows, ii) for ii in range(n_commits)]
+
+
+def test_tiered_timeline():
+    tier = ColdTier(cache_size=4)
+    tl = TieredTimeLine(tier, max_commits=3, clock=LogicalClock())
+    (mapping, set_, value), events = build_events(tl, 12)
+
+    assert type(mapping.at(events[2]).diff_parent) is SpilledDiff
+    assert type(mapping.at(events[-1]).diff_parent) is dict
+    assert len(tier) > 0
+
+    # events are memory misses when reading them loads spilled diffs
+    missed = []
+    for ii in range(12):
+        misses = tl.hot_misses
+        loads = tier.hits + tier.misses
+        event = tl.event_at(ii)
+        assert (dict(mapping.at(event)), set(set_.at(event)),
+                value.read_at(event)) == expected(ii)
+        assert (tl.hot_misses > misses) == (tier.hits + tier.misses > loads)
+        if tl.hot_misses > misses:
+            missed.append(ii)
+
+    # event 8 is spilled, but read from HEAD through the diffs of 9 to 11
+    assert missed == list(range(8))
+    stats = tl.stats()
+    assert (stats['memory']['hits'], stats['memory']['misses']) == (4, 8)
+    assert stats['cache']['misses'] > 0
+    assert stats['sqlite']['reads'] == tier.misses
+
+
+def test_max_age():
+    tl = TieredTimeLine(ColdTier(), max_commits=None, max_age=0, clock=LogicalClock())
+    (mapping, set_, value), events = build_events(tl, 3)
+    assert all(type(mapping.at(event).diff_parent) is SpilledDiff
+               for event in events[1:])
+    assert dict(mapping.at(events[1])) == expected(1)[0]
+
+
+def test_dropped_rows():
+    tier = ColdTier()
+    tl = TieredTimeLine(tier, max_commits=1, clock=LogicalClock())
+    (mapping, set_, value), events = build_events(tl, 6)
+    n_rows = len(tier)
+
+    # forgetting history drops the spilled diffs of the events left behind
+    events[-1].forget_parent()
+    del events[:-1]
+    gc.collect()
+    assert len(tier) < n_rows
+    assert dict(mapping.at(tl.HEAD)) == expected(5)[0]
+
+
+def test_default_max_commits():
+    tl = TieredTimeLine(ColdTier(), clock=LogicalClock())
+    (mapping, set_, value), events = build_events(tl, tl.max_commits + 10)
+    assert type(mapping.at(events[9]).diff_parent) is SpilledDiff
+    assert type(mapping.at(events[10]).diff_parent) is dict
+    assert (dict(mapping.at(events[3])), set(set_.at(events[3])),
+            value.read_at(events[3])) == expected(3)
+
+
+def test_temporary_file():
+    tier = ColdTier()
+    assert os.path.exists(tier.path)
+    tier.close()
+    assert not os.path.exists(tier.path)
+
+    with pytest.raises(ValueError):
+        TieredTimeLine(ColdTier(), max_commits=None)
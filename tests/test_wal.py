@@ -0,0 +1,161 @@
+import os
+import threading
+
+import pytest
+
+from timeflow import MappingFlow, TimeLine
+from timeflow.clock import LogicalClock
+from timeflow.serialize import iter_records
+from timeflow.wal import (WriteAheadLog, LoggedTimeLine, NONE, BATCHED, PER_COMMIT,
+                          COMMIT, CHECKPOINT)
+
+from conftest import build, expected
+
+
+@pytest.mark.parametrize('durability', [NONE, BATCHED, PER_COMMIT])
+def test_recover(tmpdir, durability):
+    path = str(tmpdir.join('wal'))
+    wal = WriteAheadLog(path, durability=durability)
+    build(LoggedTimeLine(wal, clock=LogicalClock()), 5)
+    wal.close()
+    assert wal.syncs == (0 if durability is NONE else 5)
+
+    wal = WriteAheadLog(path)
+    tl = wal.recover()
+    mapping, set_, value = [wal.registry.flow('flow-%d' % ii) for ii in range(3)]
+
+    for ii in range(5):
+        event = tl.event_at(ii)
+        assert (mapping.at(event), set_.at(event), value.read_at(event)) == expected(ii)
+
+    # the recovered timeline keeps logging
+    plan = tl.new_plan()
+    mapping.at(plan)['c'] = 'c'
+    tl.commit(plan, 5)
+    wal.close()
+
+    wal = WriteAheadLog(path)
+    assert len(wal) == 6
+    tl = wal.recover()
+    assert wal.registry.flow('flow-0').at(tl.HEAD) == {'a': 4, 'b': 0, 'c': 'c'}
+
+
+def test_torn_tail(tmpdir):
+    path = str(tmpdir.join('wal'))
+    wal = WriteAheadLog(path)
+    build(LoggedTimeLine(wal, clock=LogicalClock()), 3)
+    wal.close()
+    size = os.path.getsize(path)
+
+    with open(path, 'ab') as fp:
+        fp.write(b'\x01partial record')
+
+    wal = WriteAheadLog(path)
+    assert len(wal) == 3
+    assert os.path.getsize(path) == size
+    tl = wal.recover()
+    assert wal.registry.flow('flow-0').at(tl.HEAD) == expected(2)[0]
+
+
+def test_group_commit(tmpdir):
+    wal = WriteAheadLog(str(tmpdir.join('wal')), durability=BATCHED, max_delay=0.01)
+    tl = LoggedTimeLine(wal, require_single_plan=False)
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, dict.fromkeys(range(4), 0))
+    tl.commit(plan)
+
+    def committer(key):
+        for ii in range(10):
+            plan = tl.new_plan()
+            mapping.at(plan)[key] = ii
+            tl.commit(plan)
+
+    threads = [threading.Thread(target=committer, args=(key,)) for key in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wal.close()
+
+    assert len(wal) == 41
+    assert wal.syncs < 41
+    wal = WriteAheadLog(wal.path)
+    tl = wal.recover()
+    assert wal.registry.flow('flow-0').at(tl.HEAD) == {0: 9, 1: 9, 2: 9, 3: 9}
+
+
+def test_one_timeline(tmpdir):
+    wal = WriteAheadLog(str(tmpdir.join('wal')))
+    tl = LoggedTimeLine(wal)
+    with pytest.raises(ValueError):
+        LoggedTimeLine(wal)
+    del tl
+    LoggedTimeLine(wal)
+
+
+def test_existing_head(tmpdir):
+    tl = TimeLine()
+    plan = tl.new_plan()
+    mapping = MappingFlow.introduce_at(plan, {'a': 1})
+    tl.commit(plan)
+
+    path = str(tmpdir.join('wal'))
+    wal = WriteAheadLog(path)
+    logged = LoggedTimeLine(wal, HEAD=tl.HEAD)
+    plan = logged.new_plan()
+    mapping.at(plan)['b'] = 2
+    logged.commit(plan)
+    wal.close()
+
+    wal = WriteAheadLog(path)
+    assert len(wal) == 1
+    tl = wal.recover()
+    assert wal.registry.flow('flow-0').at(tl.HEAD) == {'a': 1, 'b': 2}
+
+
+def test_checkpoint(tmpdir):
+    path = str(tmpdir.join('wal'))
+    wal = WriteAheadLog(path)
+    tl = LoggedTimeLine(wal, clock=LogicalClock())
+    build(tl, 5)
+    size = os.path.getsize(path)
+    tl.checkpoint_every = 3
+
+    # the sixth commit since the start checkpoints
+    plan = tl.new_plan()
+    wal.registry.flow('flow-0').at(plan)['c'] = 'c'
+    tl.commit(plan)
+    checkpoint_size = os.path.getsize(path)
+    assert checkpoint_size < size
+
+    for ii in range(2):
+        plan = tl.new_plan()
+        wal.registry.flow('flow-2').set_at(plan, ii)
+        tl.commit(plan)
+    assert os.path.getsize(path) > checkpoint_size
+    wal.close()
+
+    # checkpoints are numbered apart from commits
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    assert [(kind, seq) for kind, seq, time, offset, end in iter_records(data)] == [
+        (CHECKPOINT, 0), (COMMIT, 6), (COMMIT, 7)]
+
+    wal = WriteAheadLog(path)
+    assert len(wal) == 8
+    assert wal.checkpoints == 1
+    tl = wal.recover()
+    mapping, set_, value = [wal.registry.flow('flow-%d' % ii) for ii in range(3)]
+    assert mapping.at(tl.HEAD) == {'a': 4, 'b': 0, 'c': 'c'}
+    assert set_.at(tl.HEAD) == set(range(5))
+    assert value.read_at(tl.HEAD) == 1
+
+    plan = tl.new_plan()
+    mapping.at(plan)['d'] = 'd'
+    tl.commit(plan)
+    wal.close()
+
+    wal = WriteAheadLog(path)
+    assert len(wal) == 9
+    tl = wal.recover()
+    assert wal.registry.flow('flow-0').at(tl.HEAD) == {'a': 4, 'b': 0, 'c': 'c', 'd': 'd'}
@@ -16,7 +16,7 @@ from .td_set import (
 
 from .timeline import TimeLine, StepLine, now
 
-from .plan import Plan
+from .plan import Plan, ConflictError
 
 from .flow import SimpleFlow
 
@@ -27,6 +27,28 @@ from .convenience import introduce
 # for handling diffs
 from .linked_structure import DIFF_LEFT, DIFF_RIGHT, NO_VALUE, diff
 
+from .linked_structure import Keyframes, InternTable, Arena
+
+from .linked_mapping import CompactDiffs
+
+from .placement import CorePlacement, CostModel
+
+from .serialize import FlowRegistry
+
+from .store import HistoryStore, StoredTimeLine
+
+from .wal import WriteAheadLog, LoggedTimeLine
+
+from .tiered import ColdTier, TieredTimeLine
+
+from .retention import Retention
+
+from .merge import Conflict
+
+from .observe import DerivedFlow
+
+from .replica import ChangeFeed, ReplicaTimeLine
+
 
 ##################
 # Read pkg_info
@@ -0,0 +1,43 @@
+"""Clocks for timestamping events
+
+A clock is a callable returning the time of the next event. Times should not
+decrease along a timeline; events with equal times are ordered by
+:attr:`Event.count`.
+
+"""
+
+import itertools
+import time as _time
+
+
+def wall_clock():
+    """Whole seconds since the epoch (the default)"""
+    return int(_time.time())
+
+
+def wall_clock_ns():
+    """Nanoseconds since the epoch"""
+    return _time.time_ns()
+
+
+def monotonic_ns():
+    """Nanoseconds from a clock that never goes back; not related to the epoch"""
+    return _time.monotonic_ns()
+
+
+class LogicalClock(object):
+    """Sequence numbers, unique across all timelines sharing the clock
+
+    Needs no system call.
+
+    """
+
+    def __init__(self, start=0):
+        self._counter = itertools.count(start)
+
+    def __call__(self):
+        # `next` on itertools.count is atomic under the GIL
+        return next(self._counter)
+
+
+logical_clock = LogicalClock()
@@ -6,13 +6,18 @@ from .ref_tools import strong_ref, empty_ref
 
 
 
-def representative_event(events, event):
-    """If event is not in the list of events, return the event recorded just before."""
-    index = bisect.bisect_right(events, event)
+def representative_index(sorted_list, item):
+    """Index of the last element of `sorted_list` not after `item`"""
+    index = bisect.bisect_right(sorted_list, item)
     if index == 0:
         raise ValueError("requested time too early in timeline")
     else:
-        return events[index - 1]
+        return index - 1
+
+
+def representative_event(events, event):
+    """If event is not in the list of events, return the event recorded just before."""
+    return events[representative_index(events, event)]
 
 
 def index_bounds(sorted_list, bounds, inclusive=True):
@@ -26,6 +31,84 @@ def index_bounds(sorted_list, bounds, inclusive=True):
     return left_bound, right_bound
 
 
+def _gone():
+    # stands for the weak references of compacted entries
+    return None
+
+
+class TimeIndex(object):
+    """Events ordered by :attr:`Event.time`, held weakly
+
+    Adding events in time order is O(1); lookups are bisects. Once entries
+    for garbage collected events are the majority, each run of them is
+    compacted into one entry, which still marks their times as gone.
+
+    """
+
+    def __init__(self):
+        self._times = []
+        self._refs = []
+        self._dead = 0
+
+        weak_self = weakref.ref(self)
+        def _on_dead(unused_):
+            _self = weak_self()
+            if _self is not None:
+                _self._dead += 1
+
+        self._on_dead = _on_dead
+
+    def __len__(self):
+        return len(self._refs) - self._dead
+
+    def add(self, event):
+        ref = weakref.ref(event, self._on_dead)
+
+        if not self._times or event.time >= self._times[-1]:
+            self._times.append(event.time)
+            self._refs.append(ref)
+        else:
+            index = bisect.bisect_right(self._times, event.time)
+            self._times.insert(index, event.time)
+            self._refs.insert(index, ref)
+
+        if self._dead * 2 > len(self._refs):
+            self._compact()
+
+    def _compact(self):
+        times = []
+        refs = []
+        for time, ref in zip(self._times, self._refs):
+            if ref() is not None:
+                times.append(time)
+                refs.append(ref)
+            elif not refs or refs[-1] is not _gone:
+                # the first time of a run of collected events
+                times.append(time)
+                refs.append(_gone)
+        self._times = times
+        self._refs = refs
+        self._dead = refs.count(_gone)
+
+    def event_at(self, time):
+        """The last event at or before `time`
+
+        :raises ValueError:     if `time` is before the first event.
+        :raises LookupError:    if that event has been garbage collected; an
+                                older event would not show the state at `time`.
+
+        """
+        event = self._refs[representative_index(self._times, time)]()
+        if event is None:
+            raise LookupError('the event at {} is no longer referenced'.format(time))
+        return event
+
+    def events_between(self, start, end, inclusive=True):
+        left, right = index_bounds(self._times, (start, end), inclusive)
+        events = (ref() for ref in self._refs[left:right])
+        return [event for event in events if event is not None]
+
+
 # Infinity
 # ########
 
@@ -69,6 +152,7 @@ class NullEvent:
     time = -inf
     count = 0
     parent = None
+    merged = None
 
     def __init__(self):
         self.referrers = ()
@@ -81,7 +165,12 @@ class NullEvent:
 
 
 class Event(object):
-    def __init__(self, instance_map, parent):
+    # One Event is retained per commit; weakrefs are used by timelines and
+    # the time index.
+    __slots__ = ('parent', 'instance', 'referrers', 'time', 'count',
+                 '_merged', '__weakref__')
+
+    def __init__(self, instance_map, parent, time=None, merged=None):
         """Events in a timeline map flows to instances
 
         :param linked_mapping.LinkedMapping instance_map:
@@ -90,14 +179,22 @@ class Event(object):
         :param Event parent:
             will be weak referenced, for walking event graph.
 
+        :param time:
+            timestamp, usually from a clock in :mod:`timeflow.clock`. Defaults
+            to whole seconds since the epoch.
+
+        :param Event merged:
+            for merges, the event merged into `parent`; weak referenced.
+
         """
         self.parent = parent
         parent.referrers += (self,)
+        self._merged = weakref.ref(merged) if merged is not None else None
 
         self.instance = instance_map
 
         self.referrers = ()
-        self.time = int(_time.time())
+        self.time = int(_time.time()) if time is None else time
 
         if parent and parent.time == self.time:
             self.count = parent.count + 1
@@ -109,6 +206,11 @@ class Event(object):
 
     read_flow_instance = get_flow_instance
 
+    @property
+    def merged(self):
+        """The event merged into the parent by this one, if still referenced"""
+        return self._merged() if self._merged is not None else None
+
     def __hash__(self):
         return hash((self.time, self.count))
 
@@ -137,6 +239,40 @@ def walk_to_fork(event):
     return path, True
 
 
+def _parents(event):
+    merged = event.merged
+    return (event.parent,) if merged is None else (event.parent, merged)
+
+
+def fork_point(left, right):
+    """Nearest event that `left` and `right` both are, or descend from
+
+    Both histories are walked back in step, following merged events as well as
+    parents, so the cost depends on how far they have diverged rather than on
+    their length.
+
+    :returns: the event, or None if they share no history.
+
+    """
+    left_seen = {}
+    right_seen = {}
+    left, right = [left], [right]
+    while left or right:
+        for side, seen, other_seen in ((left, left_seen, right_seen),
+                                       (right, right_seen, left_seen)):
+            parents = []
+            for event in side:
+                if id(event) in other_seen:
+                    return event
+                if id(event) not in seen:
+                    seen[id(event)] = event
+                    parents.extend(parent for parent in _parents(event)
+                                   if isinstance(parent, Event))
+            side[:] = parents
+
+    return None
+
+
 def walk(self, steps=1):
     target = self
     nn = abs(steps)
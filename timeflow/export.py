@@ -0,0 +1,253 @@
+"""Export and load of whole event graphs
+
+An export holds every event connected to a timeline's HEAD, forks included,
+and every flow instance held by them. Each structure is written as its diff
+from its parent structure when that parent is written too, so a flow's core is
+written once per independent history, and structures shared between events
+are written once. Loading rebuilds the structures from the stored diffs in one
+pass, without replaying plans.
+
+The file starts with :data:`MAGIC`, followed by batches of records, each a
+length-prefixed pickle of a list of records. Flows are identified by name
+through a :class:`serialize.FlowRegistry`.
+
+"""
+import struct
+
+from .event import Event, NullEvent
+from .flow import StructureFlow
+from .linked_mapping import LinkedMapping, empty_linked_mapping
+from .linked_structure import (LinkedStructure, NO_VALUE, diff,
+                               hatch_core, hatch_diff)
+from .serialize import FlowRegistry, class_path, structure_type, dumps, loads
+from .snapshot import materialize
+
+MAGIC = b'timeflow-events\x00\x01'
+
+_LENGTH = struct.Struct('<I')
+
+# records
+FLOW = 0        # (FLOW, name, class path)
+NODE = 1        # (NODE, flow name, parent node number or None, diff or core)
+EVENT = 2       # (EVENT, parent event number or None, time, changes)
+HEAD = 3        # (HEAD, event number)
+
+# changes of an event, by flow name
+VALUE = 0       # (name, VALUE, value)
+STRUCTURE = 1   # (name, STRUCTURE, node number)
+DEFAULT = 2     # (name, DEFAULT)
+
+
+def connected_events(event):
+    """Events connected to `event` through parents and children
+
+    Parents come before their children.
+
+    """
+    root = event
+    while isinstance(root.parent, Event):
+        root = root.parent
+
+    events = [root]
+    for event in events:
+        events.extend(child for child in event.referrers
+                      if isinstance(child, Event))
+    return events
+
+
+def _instance_changes(parent_map, instance_map):
+    # (flow, instance or NO_VALUE) for each flow changed between the maps
+    if parent_map is instance_map:
+        return ()
+    elif (isinstance(parent_map, LinkedStructure)
+          and isinstance(instance_map, LinkedStructure)):
+        return [(flow, instance) for flow, (_unused, instance)
+                in diff(parent_map, instance_map)]
+    else:
+        # materialized, as iterating an old structure walks all of its bases
+        instances = materialize(instance_map)
+        changes = list(instances.items())
+        changes.extend((flow, NO_VALUE) for flow in materialize(parent_map)
+                       if flow not in instances)
+        return changes
+
+
+class _Writer(object):
+    def __init__(self, fp, registry, batch_size):
+        self.fp = fp
+        self.registry = registry
+        self.batch_size = batch_size
+
+        self._batch = []
+        self._flows = set()
+        self._nodes = {}    # id of structure -> (node number, structure)
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            data = dumps(self._batch)
+            self.fp.write(_LENGTH.pack(len(data)))
+            self.fp.write(data)
+            self._batch = []
+
+    def flow_name(self, flow):
+        name = self.registry.name(flow)
+        if name not in self._flows:
+            self._flows.add(name)
+            self.write((FLOW, name, class_path(flow)))
+        return name
+
+    def node(self, name, flow, structure):
+        """Number of `structure`, writing it first if needed"""
+        try:
+            return self._nodes[id(structure)][0]
+        except KeyError:
+            pass
+
+        _parent = structure.parent()
+        parent_entry = self._nodes.get(id(_parent)) if _parent is not None else None
+        if parent_entry is not None and structure.diff_parent is not None:
+            self.write((NODE, name, parent_entry[0], dict(structure.diff_parent)))
+        else:
+            self.write((NODE, name, None,
+                        structure.core_type(materialize(structure))))
+
+        number = len(self._nodes)
+        # the structure is kept, so that its id is not reused
+        self._nodes[id(structure)] = (number, structure)
+        return number
+
+
+def export_events(head, fp, registry=None, batch_size=1024):
+    """Write the events connected to `head` to the binary file object `fp`
+
+    Values of non-structure flows, and the contents of structures, have to be
+    picklable.
+
+    """
+    registry = registry if registry is not None else FlowRegistry()
+    writer = _Writer(fp, registry, batch_size)
+    fp.write(MAGIC)
+
+    numbers = {}
+    for event in connected_events(head):
+        _parent = event.parent if isinstance(event.parent, Event) else None
+        parent_map = _parent.instance if _parent is not None else empty_linked_mapping
+
+        changes = []
+        for flow, instance in _instance_changes(parent_map, event.instance):
+            name = writer.flow_name(flow)
+            if instance is NO_VALUE:
+                changes.append((name, DEFAULT))
+            elif isinstance(flow, StructureFlow) and isinstance(instance, LinkedStructure):
+                changes.append((name, STRUCTURE, writer.node(name, flow, instance)))
+            else:
+                changes.append((name, VALUE, instance))
+
+        numbers[id(event)] = len(numbers)
+        writer.write((EVENT, numbers[id(_parent)] if _parent is not None else None,
+                      event.time, changes))
+
+    writer.write((HEAD, numbers[id(head)]))
+    writer.flush()
+
+
+def _read_batches(fp):
+    if fp.read(len(MAGIC)) != MAGIC:
+        raise ValueError('not an export of events')
+
+    while True:
+        header = fp.read(_LENGTH.size)
+        if not header:
+            return
+        length, = _LENGTH.unpack(header)
+        data = fp.read(length)
+        if len(data) < length:
+            raise ValueError('truncated export of events')
+        for record in loads(data):
+            yield record
+
+
+def _hatch_map(parent_map, changes):
+    # instance map of an event, from its parent's and the changed flows
+    if not changes:
+        return parent_map
+
+    if isinstance(parent_map, LinkedStructure):
+        diff_parent = {}
+        for flow, instance in changes.items():
+            old = parent_map.get(flow, NO_VALUE)
+            if old is not instance:
+                diff_parent[flow] = (old, instance)
+        if not diff_parent:
+            return parent_map
+        elif len(parent_map) + LinkedMapping._len_delta(diff_parent) > 0:
+            return hatch_diff(parent_map, diff_parent)
+        else:
+            return empty_linked_mapping
+    else:
+        core = dict((flow, instance) for flow, instance in changes.items()
+                    if instance is not NO_VALUE)
+        return hatch_core(LinkedMapping, core) if core else empty_linked_mapping
+
+
+def load_events(fp, registry=None):
+    """Events written by :func:`export_events`, read from the file object `fp`
+
+    Flows are looked up in `registry` by name, or created from their class.
+
+    :returns: the head event.
+
+    """
+    registry = registry if registry is not None else FlowRegistry()
+    nodes = []
+    events = []
+    head = None
+
+    for record in _read_batches(fp):
+        kind = record[0]
+        if kind == EVENT:
+            _unused, parent_number, time, changes = record
+            if parent_number is None:
+                _parent, parent_map = NullEvent(), empty_linked_mapping
+            else:
+                _parent = events[parent_number]
+                parent_map = _parent.instance
+
+            instances = {}
+            for change in changes:
+                flow = registry.flow(change[0])
+                if change[1] == STRUCTURE:
+                    instances[flow] = nodes[change[2]]
+                elif change[1] == VALUE:
+                    instances[flow] = change[2]
+                else:
+                    instances[flow] = NO_VALUE
+
+            events.append(Event(instance_map=_hatch_map(parent_map, instances),
+                                parent=_parent, time=time))
+
+        elif kind == NODE:
+            _unused, name, parent_number, contents = record
+            if parent_number is None:
+                cls = structure_type(registry.flow(name))
+                nodes.append(hatch_core(cls, contents))
+            else:
+                nodes.append(hatch_diff(nodes[parent_number], contents))
+
+        elif kind == FLOW:
+            registry.flow(record[1], record[2])
+
+        elif kind == HEAD:
+            head = events[record[1]]
+
+        else:
+            raise ValueError('unknown record {!r}'.format(kind))
+
+    if head is None:
+        raise ValueError('truncated export of events')
+    return head
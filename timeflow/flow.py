@@ -1,6 +1,9 @@
 import six
 from abc import abstractmethod, ABCMeta, abstractproperty
 
+from .snapshot import snapshot_cache, isolated
+from .linked_structure import consistent_read
+
 @six.add_metaclass(ABCMeta)
 class Flow(object):
 
@@ -16,12 +19,49 @@ class Flow(object):
     def __hash__(self):
         return object.__hash__(self)
 
+    # Whether reads through :meth:`read_at` are safe while another thread
+    # commits; see :mod:`timeflow.snapshot`.
+    isolated_reads = False
+
+    # Whether values are computed at commit from other flows, rather than
+    # staged; see :class:`observe.DerivedFlow`.
+    derived = False
+
     def read_at(self, event_like):
+        if self.isolated_reads:
+            return consistent_read(event_like.read_flow_instance, self)
         return event_like.read_flow_instance(self)
 
+    def read_at_time(self, timeline, time):
+        return self.read_at(timeline.event_at(time))
+
+    def hatch_instance(self, instance):
+        """Called by :meth:`Plan.hatch` to freeze the staged `instance`"""
+        return instance.hatch()
+
 
 class StructureFlow(Flow):
 
+    # A :class:`linked_structure.Keyframes` policy, or None.
+    keyframes = None
+
+    # A :class:`placement.CorePlacement` policy, or None.
+    core_placement = None
+
+    # A :class:`linked_structure.InternTable`, or None.
+    intern_table = None
+
+    # A :class:`linked_mapping.CompactDiffs`, or None.
+    compact_diffs = None
+
+    def read_at(self, event_like):
+        instance = Flow.read_at(self, event_like)
+        if self.core_placement is not None:
+            self.core_placement.record_read(instance)
+        if self.isolated_reads:
+            return isolated(instance)
+        return instance
+
     @classmethod
     def introduce_at(cls, plan, snapshot_or_stage):
         _flow = cls()
@@ -32,7 +72,31 @@ class StructureFlow(Flow):
         return object.__hash__(self)
 
     def at(self, event_like):
-        return event_like.get_flow_instance(self)
+        instance = event_like.get_flow_instance(self)
+        if self.core_placement is not None:
+            self.core_placement.record_read(instance)
+        return instance
+
+    def materialize(self, event_like):
+        """Plain `dict` or `frozenset` copy of the flow at `event_like`
+
+        Copies at events are kept in :data:`snapshot.snapshot_cache`, and are
+        shared, so must not be mutated.
+
+        """
+        return snapshot_cache.get(self, event_like)
+
+    def hatch_instance(self, instance):
+        if self.intern_table is not None:
+            hatched = self.intern_table.hatch(instance)
+        else:
+            hatched = instance.hatch()
+
+        if self.keyframes is not None:
+            self.keyframes.apply(hatched)
+        if self.compact_diffs is not None:
+            self.compact_diffs.apply(hatched)
+        return hatched
 
 
 class SimpleFlow(Flow):
@@ -1,14 +1,16 @@
 import collections
-import itertools
 import weakref
 from .ref_tools import empty_ref
 from .linked_structure import (CHILD, SELF, NO_VALUE,
                                empty_mapping, LinkedStructure, DIFF_LEFT, DIFF_RIGHT,
-                               hatch_egg_optimized)
+                               hatch_egg_optimized, batch_lookup, structure_eq,
+                               mix_hash, replace_diff_parent, iter_keys)
 
 
 class EmptyLinkedMapping(type(empty_mapping)):
 
+    snapshot_type = dict
+
     def __init__(self):
         self.parent = empty_ref
         self.relation_to_base = SELF
@@ -20,8 +22,10 @@ empty_linked_mapping = EmptyLinkedMapping()
 
 
 class LinkedMapping(LinkedStructure, collections.Mapping):
+    __slots__ = ()
 
     core_type = dict
+    snapshot_type = dict
     empty_variant = empty_linked_mapping
 
     def __init__(self, parent, diff_parent, base, relation_to_base):
@@ -43,18 +47,26 @@ class LinkedMapping(LinkedStructure, collections.Mapping):
             return val
 
     def __iter__(self):
-        return itertools.chain(
-            (k for k,v in self.diff_base.items() if v[self.relation_to_base] != NO_VALUE),
-            (k for k in self.base if k not in self.diff_base))
+        return iter_keys(self, NO_VALUE)
 
     def __len__(self):
-        count = len(self.base)
-        for k,v in self.diff_base.items():
-            if v[self.relation_to_base] is NO_VALUE:
-                count -= 1
-            elif k not in self.base:
-                count += 1
-        return count
+        # set when hatched
+        return self._len
+
+    def __eq__(self, other):
+        return structure_eq(self, other, collections.Mapping)
+
+    __hash__ = LinkedStructure._hash
+
+    @staticmethod
+    def _len_delta(diff_parent):
+        delta = 0
+        for parent_val, val in diff_parent.values():
+            if parent_val is NO_VALUE:
+                delta += 1
+            elif val is NO_VALUE:
+                delta -= 1
+        return delta
 
     @staticmethod
     def _update_core(core, target):
@@ -65,11 +77,65 @@ class LinkedMapping(LinkedStructure, collections.Mapping):
             else:
                 core[k] = target_val
 
+    @staticmethod
+    def _changes(diff_parent):
+        updates = {}
+        deleted = []
+        for key, (parent_val, val) in diff_parent.items():
+            if val is NO_VALUE:
+                deleted.append(key)
+            else:
+                updates[key] = val
+        return updates, tuple(deleted)
+
+    @staticmethod
+    def _apply_changes(core, changes):
+        updates, deleted = changes
+        core.update(updates)
+        for key in deleted:
+            del core[key]
+
+    @staticmethod
+    def _fingerprint_delta(diff_parent):
+        delta = 0
+        for key, (parent_val, val) in diff_parent.items():
+            if parent_val is not NO_VALUE:
+                delta ^= mix_hash(hash((key, parent_val)))
+            if val is not NO_VALUE:
+                delta ^= mix_hash(hash((key, val)))
+        return delta
+
+    @staticmethod
+    def _core_fingerprint(core):
+        fingerprint = 0
+        for item in core.items():
+            fingerprint ^= mix_hash(hash(item))
+        return fingerprint
+
+    @staticmethod
+    def _read_diff(item, relation):
+        return item[relation]
+
+    @staticmethod
+    def _read_core(core, key):
+        return core.get(key, NO_VALUE)
+
     @staticmethod
     def _reverse_diff(item):
         key, val = item
         return (key, (val[1], val[0]))
 
+    @staticmethod
+    def _diff_sides(item):
+        return item
+
+    @staticmethod
+    def _net_diff_item(key, left_value, right_value):
+        if left_value != right_value:
+            return (key, (left_value, right_value))
+        else:
+            return None
+
     @staticmethod
     def _diff(left, right):
         for key, left_val in left.items():
@@ -92,21 +158,66 @@ class LinkedDictionary(LinkedMapping, collections.MutableMapping):
     its `relation_to_base` cannot be PARENT. This assumption simplifies
     implementation.
 
+    Writes are buffered, and diffed against the parent in bulk by
+    :meth:`flush`, which happens on hatching or when the buffer would otherwise
+    have to be scanned.
+
     """
 
+    __slots__ = ('_pending',)
+
+    def __init__(self, parent, diff_parent, base, relation_to_base):
+        LinkedMapping.__init__(self, parent, diff_parent, base, relation_to_base)
+        self._pending = {}    # writes not yet in diff_parent
+
+    __len__ = LinkedStructure._egg_len
+    __hash__ = None
+
+    def __getitem__(self, k):
+        try:
+            return self._pending[k]
+        except KeyError:
+            return LinkedMapping.__getitem__(self, k)
+
+    def __iter__(self):
+        self.flush()
+        return LinkedMapping.__iter__(self)
+
     def __setitem__(self, k, v):
         # cannot have children
         if self.parent() is not None:
-            parent_value = self.parent().get(k, NO_VALUE)
+            self._pending[k] = v
+
+        if self.relation_to_base is SELF:
+            self.base[k] = v
+
+    def update(self, *args, **kwargs):
+        writes = dict(*args, **kwargs)
+
+        if self.parent() is not None:
+            self._pending.update(writes)
+
+        if self.relation_to_base is SELF:
+            self.base.update(writes)
+
+    def flush(self):
+        """Diff buffered writes against the parent, in one walk of its bases"""
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = {}
+
+        parent_values = batch_lookup(self.parent(), pending)
+        for k, v in pending.items():
+            parent_value = parent_values[k]
             if parent_value != v:
                 self.diff_parent[k] = (parent_value, v)
             else:
                 self.diff_parent.pop(k, None)
 
-        if self.relation_to_base is SELF:
-            self.base[k] = v
-
     def __delitem__(self, k):
+        self.flush()
+
         # cannot have children
         if self.relation_to_base is SELF:
             try:
@@ -133,3 +244,81 @@ class LinkedDictionary(LinkedMapping, collections.MutableMapping):
 
 LinkedMapping.mutable_variant = LinkedDictionary
 LinkedDictionary.immutable_variant = LinkedMapping
+
+
+class CompactDiff(collections.Mapping):
+    """Read-only `diff_parent` of a LinkedMapping, packed into a flat tuple
+
+    The entry for `k` is ``(values[2 * i], values[2 * i + 1])``, where
+    ``i = index[k]``. Diffs of the same keys share one `index`.
+
+    """
+    __slots__ = ('index', 'values')
+
+    def __init__(self, index, values):
+        self.index = index
+        self.values = values
+
+    def __getitem__(self, k):
+        ii = 2 * self.index[k]
+        return self.values[ii], self.values[ii + 1]
+
+    def __contains__(self, k):
+        return k in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self.items()))
+
+
+class CompactDiffs(object):
+    """Policy for storing the diffs of hatched LinkedMappings as :class:`CompactDiff`
+
+    Key indexes are interned, so that a history of diffs over a stable set of
+    keys stores each set of keys once. At most `max_indexes` are kept; diffs
+    of other key sets get their own index.
+
+    Set on a flow as :attr:`StructureFlow.compact_diffs`, or on a timeline for
+    its instance maps. One policy can be shared by several.
+
+    """
+
+    def __init__(self, max_indexes=4096):
+        self.max_indexes = max_indexes
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def index(self, keys):
+        keys = frozenset(keys)
+        try:
+            return self._indexes[keys]
+        except KeyError:
+            index = dict((k, ii) for ii, k in enumerate(keys))
+            if len(self._indexes) < self.max_indexes:
+                self._indexes[keys] = index
+            return index
+
+    def pack(self, diff_parent):
+        index = self.index(diff_parent)
+        values = [None] * (2 * len(index))
+        for k, ii in index.items():
+            values[2 * ii], values[2 * ii + 1] = diff_parent[k]
+        return CompactDiff(index, tuple(values))
+
+    def apply(self, hatched):
+        """Replace the `diff_parent` of a freshly hatched LinkedMapping"""
+        if not isinstance(hatched, LinkedMapping):
+            return
+
+        diff_parent = hatched.diff_parent
+        if not diff_parent or type(diff_parent) is CompactDiff:
+            return
+
+        replace_diff_parent(hatched, self.pack(diff_parent))
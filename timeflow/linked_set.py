@@ -4,11 +4,15 @@ import weakref
 from .event import empty_ref
 from .linked_structure import (SELF, LinkedStructure,
                                PARENT, CHILD, DIFF_LEFT, DIFF_RIGHT,
-                               hatch_egg_optimized)
+                               hatch_egg_optimized, hatch_egg_simple,
+                               batch_lookup, structure_eq, stored_diff, mix_hash,
+                               iter_keys)
 
 
 class EmptyLinkedSet(frozenset):
 
+    snapshot_type = frozenset
+
     def __init__(self):
         self.parent = empty_ref
         self.relation_to_base = SELF
@@ -32,9 +36,12 @@ empty_linked_set = EmptyLinkedSet()
 
 
 class LinkedSet(LinkedStructure, collections.Set):
+    __slots__ = ()
+
     # mutable_variant is set after LinkedMutableSet is defined
 
     core_type = set
+    snapshot_type = frozenset
     empty_variant = empty_linked_set
 
     def __contains__(self, k):
@@ -44,18 +51,26 @@ class LinkedSet(LinkedStructure, collections.Set):
             return k in self.base
 
     def __iter__(self):
-        return itertools.chain(
-            (k for k,v in self.diff_base.items() if v is self.relation_to_base),
-            (k for k in self.base if k not in self.diff_base))
+        return iter_keys(self, False)
 
     def __len__(self):
-        count = len(self.base)
-        for k,v in self.diff_base.items():
-            if v is self.relation_to_base:
-                count += 1
+        # set when hatched
+        return self._len
+
+    def __eq__(self, other):
+        return structure_eq(self, other, collections.Set)
+
+    __hash__ = LinkedStructure._hash
+
+    @staticmethod
+    def _len_delta(diff_parent):
+        delta = 0
+        for side in diff_parent.values():
+            if side is CHILD:
+                delta += 1
             else:
-                count -= 1
-        return count
+                delta -= 1
+        return delta
 
     @staticmethod
     def _update_core(core, target):
@@ -69,11 +84,56 @@ class LinkedSet(LinkedStructure, collections.Set):
             else:
                 core.remove(k)
 
+    @staticmethod
+    def _changes(diff_parent):
+        added = tuple(elt for elt, side in diff_parent.items() if side is CHILD)
+        removed = tuple(elt for elt, side in diff_parent.items() if side is PARENT)
+        return added, removed
+
+    @staticmethod
+    def _apply_changes(core, changes):
+        added, removed = changes
+        core.update(added)
+        core.difference_update(removed)
+
+    @staticmethod
+    def _fingerprint_delta(diff_parent):
+        delta = 0
+        for elt in diff_parent:
+            delta ^= mix_hash(hash(elt))
+        return delta
+
+    @staticmethod
+    def _core_fingerprint(core):
+        fingerprint = 0
+        for elt in core:
+            fingerprint ^= mix_hash(hash(elt))
+        return fingerprint
+
+    @staticmethod
+    def _read_diff(item, relation):
+        return item is relation
+
+    @staticmethod
+    def _read_core(core, key):
+        return key in core
+
     @staticmethod
     def _reverse_diff(item):
         val, diff_side = item
         return (val, (diff_side + 1) % 2)
 
+    @staticmethod
+    def _diff_sides(item):
+        return (item is PARENT, item is CHILD)
+
+    @staticmethod
+    def _net_diff_item(key, left_value, right_value):
+        if left_value is right_value:
+            return None
+        else:
+            return (key, DIFF_LEFT if left_value else DIFF_RIGHT)
+
     @staticmethod
     def _diff(left, right):
         return itertools.chain(((val, DIFF_LEFT) for val in left if val not in right),
@@ -82,13 +142,52 @@ class LinkedSet(LinkedStructure, collections.Set):
     def __repr__(self):
         return '{}({})'.format(repr(type(self)), repr(list(self)))
 
+    # Set algebra
+    # ###########
+    # When both operands share history, results are computed from the diff
+    # between them. Union and intersection are then LinkedSets based on
+    # `self`, sharing its structure; difference and symmetric difference are
+    # LinkedSets holding only the differing elements.
+
+    @classmethod
+    def _from_iterable(cls, it):
+        # used by the collections.Set mixin methods
+        return frozenset(it)
+
     def __and__(self, other):
         return self.intersection(other)
 
     def __or__(self, other):
         return self.union(other)
 
+    def __sub__(self, other):
+        return self.difference(other)
+
+    def __xor__(self, other):
+        return self.symmetric_difference(other)
+
+    def _shared_diff(self, other):
+        if (isinstance(other, LinkedSet)
+            and type(self) is not self.mutable_variant
+            and type(other) is not other.mutable_variant):
+            return stored_diff(self, other)
+        else:
+            return None
+
+    def _derive(self, diff_parent):
+        if not diff_parent:
+            return self
+
+        egg = self.egg()
+        egg.diff_parent.update(diff_parent)
+        return hatch_egg_simple(egg)
+
     def intersection(self, other):
+        _diff = self._shared_diff(other)
+        if _diff is not None:
+            return self._derive({elt: PARENT for elt, side in _diff
+                                 if side == DIFF_LEFT})
+
         if len(self) > len(other):
             larger, smaller = self, other
         else:
@@ -97,8 +196,28 @@ class LinkedSet(LinkedStructure, collections.Set):
         return frozenset(elt for elt in smaller if elt in larger)
 
     def union(self, other):
+        _diff = self._shared_diff(other)
+        if _diff is not None:
+            return self._derive({elt: CHILD for elt, side in _diff
+                                 if side == DIFF_RIGHT})
+
         return frozenset(itertools.chain(self, other))
 
+    def difference(self, other):
+        _diff = self._shared_diff(other)
+        if _diff is not None:
+            return self.first_egg({elt for elt, side in _diff
+                                   if side == DIFF_LEFT}).hatch()
+
+        return frozenset(elt for elt in self if elt not in other)
+
+    def symmetric_difference(self, other):
+        _diff = self._shared_diff(other)
+        if _diff is not None:
+            return self.first_egg({elt for elt, _unused in _diff}).hatch()
+
+        return frozenset(self).symmetric_difference(other)
+
 
 class LinkedMutableSet(LinkedSet, collections.MutableSet):
     """Mutable version of LinkedSet, with restrictions
@@ -107,18 +226,38 @@ class LinkedMutableSet(LinkedSet, collections.MutableSet):
     its `relation_to_base` cannot be PARENT. This assumption simplifies
     implementation.
 
+    Changes are buffered, and diffed against the parent in bulk by
+    :meth:`flush`, which happens on hatching or when the buffer would otherwise
+    have to be scanned.
+
     """
 
+    __slots__ = ('_pending',)
+
+    def __init__(self, parent, diff_parent, base, relation_to_base):
+        LinkedSet.__init__(self, parent, diff_parent, base, relation_to_base)
+        self._pending = {}    # maps elements not yet in diff_parent to membership
+
+    __len__ = LinkedStructure._egg_len
+    __hash__ = None
+
+    def __contains__(self, k):
+        try:
+            return self._pending[k]
+        except KeyError:
+            return LinkedSet.__contains__(self, k)
+
+    def __iter__(self):
+        self.flush()
+        return LinkedSet.__iter__(self)
+
     def add(self, k):
         if self.relation_to_base is SELF:
             self.base.add(k)
 
         # NB cannot have children
         if self.parent() is not None:
-            if k not in self.parent():
-                self.diff_parent[k] = CHILD
-            else:
-                self.diff_parent.pop(k, None)
+            self._pending[k] = True
 
     def discard(self, k):
         if self.relation_to_base is SELF:
@@ -126,15 +265,39 @@ class LinkedMutableSet(LinkedSet, collections.MutableSet):
 
         # NB cannot have children
         if self.parent() is not None:
-            if k in self.parent():
-                self.diff_parent[k] = PARENT
-            else:
-                self.diff_parent.pop(k, None)
-
+            self._pending[k] = False
 
     def update(self, other):
-        for elt in other:
-            self.add(elt)
+        self._bulk_set(other, True)
+
+    def difference_update(self, other):
+        self._bulk_set(other, False)
+
+    def _bulk_set(self, elements, membership):
+        changes = dict.fromkeys(elements, membership)
+
+        if self.relation_to_base is SELF:
+            if membership:
+                self.base.update(changes)
+            else:
+                self.base.difference_update(changes)
+
+        if self.parent() is not None:
+            self._pending.update(changes)
+
+    def flush(self):
+        """Diff buffered changes against the parent, in one walk of its bases"""
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = {}
+
+        in_parent = batch_lookup(self.parent(), pending)
+        for k, membership in pending.items():
+            if membership is not in_parent[k]:
+                self.diff_parent[k] = CHILD if membership else PARENT
+            else:
+                self.diff_parent.pop(k, None)
 
     hatch = hatch_egg_optimized
 
@@ -1,3 +1,4 @@
+import sys
 import six
 from abc import abstractmethod, ABCMeta
 import weakref
@@ -5,9 +6,13 @@ import collections
 import uuid
 import itertools
 import logging
+import threading
+import time as _time
 
 import toolz
 
+from .ref_tools import empty_ref
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,19 +26,114 @@ SELF = 2
 DIFF_LEFT, DIFF_RIGHT = 0, 1
 
 
+# Fingerprints
+# ############
+# A fingerprint is the XOR of a mixed hash of each entry, so that it can be
+# updated from a diff. Mixing and finishing follow `collections.abc.Set._hash`.
+
+_MASK = 2 * sys.maxsize + 1
+
+
+def mix_hash(h):
+    return ((h ^ (h << 16) ^ 89869747) * 3644798167) & _MASK
+
+
+def finish_hash(fingerprint, length):
+    h = (1927868237 * (length + 1)) & _MASK
+    h ^= fingerprint
+    h ^= (h >> 11) ^ (h >> 25)
+    h = (h * 69069 + 907133923) & _MASK
+    if h > sys.maxsize:
+        h -= _MASK + 1
+    if h == -1:
+        h = 590923713
+    return h
+
+
+# Consistent reads
+# ################
+# Cores are updated in place when they move between structures, and a move
+# changes several attributes of each structure involved. A read running
+# meanwhile in another thread can see a half-moved core. Moves are therefore
+# bracketed by `core_moves`, a sequence lock: readers that must not block
+# retry through :func:`consistent_read` instead of locking.
+
+class CoreMoves(object):
+    """Sequence lock held while cores, or base chains, are being changed
+
+    :attr:`sequence` is odd while any thread holds the lock, and grows by two
+    with each hold. Holds are reentrant, and exclude each other.
+
+    """
+
+    def __init__(self):
+        self.sequence = 0
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._owner = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._depth += 1
+        if self._depth == 1:
+            self._owner = threading.get_ident()
+            self.sequence += 1
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            self.sequence += 1
+            self._owner = None
+        self._lock.release()
+
+    def held(self):
+        """Whether the current thread holds the lock"""
+        return self._owner == threading.get_ident()
+
+
+core_moves = CoreMoves()
+
+
+def consistent_read(read, *args):
+    """`read(*args)`, retried until no core moved while it ran
+
+    `read` must not have side effects, and must not return anything that
+    reads a structure lazily, such as an iterator over it. Errors are raised
+    only if no core moved meanwhile.
+
+    """
+    while True:
+        sequence = core_moves.sequence
+        if sequence & 1:
+            if core_moves.held():
+                return read(*args)
+            _time.sleep(0)      # let the writer finish
+            continue
+
+        try:
+            result = read(*args)
+        except Exception:
+            if core_moves.sequence == sequence:
+                raise
+        else:
+            if core_moves.sequence == sequence:
+                return result
+
+
 def transfer_core(self, other):
     assert self.relation_to_base is SELF
 
-    core = self.base
+    with core_moves:
+        core = self.base
 
-    self._update_core(core, other)
-    other.set_base(core, SELF)
+        self._update_core(core, other)
+        other.set_base(core, SELF)
 
-    if self.parent() is other:
-        self.set_base(other, relation_to_base=CHILD)
-    else:
-        assert other.parent() is self
-        self.set_base(other, relation_to_base=PARENT)
+        if self.parent() is other:
+            self.set_base(other, relation_to_base=CHILD)
+        else:
+            assert other.parent() is self
+            self.set_base(other, relation_to_base=PARENT)
 
 
 class EmptyMapping(collections.Mapping):
@@ -57,6 +157,28 @@ empty_mapping = EmptyMapping()
 del EmptyMapping
 
 
+def _drop_diff_parent(parent_ref):
+    child = parent_ref.child()
+    if child is not None:
+        child.diff_parent = None
+
+
+class _ParentRef(weakref.ref):
+    """Weak ref to the parent that removes the child's diff_parent on death
+
+    Avoids a closure per node; the child is only weakly referenced.
+
+    """
+    __slots__ = ('child',)
+
+    def __new__(cls, parent, child):
+        return weakref.ref.__new__(cls, parent, _drop_diff_parent)
+
+    def __init__(self, parent, child):
+        super(_ParentRef, self).__init__(parent, _drop_diff_parent)
+        self.child = weakref.ref(child)
+
+
 @six.add_metaclass(ABCMeta)
 class LinkedStructure(object):
     """LinkedStructure
@@ -86,6 +208,9 @@ class LinkedStructure(object):
     A LinkedStructure has no strong refs to its parent except for :attr:base .
     :attr:diff_parent is automatically removed if the parent has no strong refs.
 
+    Alternatively, structures can be owned by an :class:`Arena`, which keeps
+    them until they are explicitly released.
+
 
 
     Specs (Incomplete)
@@ -101,20 +226,41 @@ class LinkedStructure(object):
     core_type = None
     empty_variant = None
 
-    alt_bases = ()  # used in creating/deleting forks.
+    # Nodes are retained once per event, so keep them free of a per-instance
+    # dict. `debug_label` is for labelling nodes in tests and logs.
+    __slots__ = ('parent', 'diff_parent', 'base', 'diff_base',
+                 'relation_to_base', 'generation', 'alt_bases',
+                 'keyframe_distance', 'keyframe_diff_count', 'read_count',
+                 'fingerprint', '_len', 'arena_ref', 'debug_label',
+                 '__weakref__')
 
     def __init__(self, parent, diff_parent, base, relation_to_base):
-        weak_self = weakref.ref(self)
-        def _del_diff_parent(unused_):
-            try:
-                weak_self().diff_parent = None
-            except AttributeError:
-                pass
+        self.alt_bases = ()  # used in creating/deleting forks.
+
+        # Commits, and diffed keys, since the nearest older node holding a core.
+        # Maintained by :func:`hatch_egg_optimized`; see :class:`Keyframes`.
+        self.keyframe_distance = 0
+        self.keyframe_diff_count = 0
+
+        self.read_count = 0    # see :class:`placement.CorePlacement`
+
+        # Set when hatched; None if the contents are unhashable.
+        self.fingerprint = None
+
+        self.arena_ref = None    # set by :meth:`Arena.adopt`
 
-        self.parent = weakref.ref(parent, _del_diff_parent) if parent is not None else lambda : None
+        if parent is None:
+            self.parent = empty_ref
+        elif parent.arena_ref is not None:
+            self.parent = parent.arena_ref
+        else:
+            self.parent = _ParentRef(parent, self)
         self.diff_parent = diff_parent
         self.set_base(base, relation_to_base)
 
+        # decreases strictly along parents; used to find common ancestors
+        self.generation = parent.generation + 1 if parent is not None else 0
+
 
     def set_base(self, base, relation_to_base):
         self.relation_to_base = relation_to_base
@@ -126,7 +272,8 @@ class LinkedStructure(object):
             self.base = base
             self.diff_base = self.diff_parent
         elif self.relation_to_base is PARENT:
-            self.base = weakref.proxy(base)
+            # the arena keeps `base` alive, so no proxy is needed
+            self.base = base if self.arena_ref is not None else weakref.proxy(base)
             self.diff_base = self.base.diff_parent
 
     @classmethod
@@ -160,12 +307,109 @@ class LinkedStructure(object):
         """
         pass
 
+    @staticmethod
+    @abstractmethod
+    def _changes(diff_parent):
+        """Plain, picklable form of `diff_parent`, read from parent to child
+
+        Applied to a copy of the parent's core by :meth:`_apply_changes`.
+
+        """
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _apply_changes(core, changes):
+        """Mutate `core` by `changes` from :meth:`_changes`"""
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _len_delta(diff_parent):
+        """Change in size from parent to child, given `diff_parent`"""
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _read_diff(item, relation):
+        """Read a value from a diff entry, from the side given by `relation`
+
+        Used by :func:`batch_lookup`.
+
+        """
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _read_core(core, key):
+        """Read a value from a core; used by :func:`batch_lookup`"""
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _fingerprint_delta(diff_parent):
+        """XOR of the mixed hashes of entries changed by `diff_parent`"""
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _core_fingerprint(core):
+        pass
+
+    def _egg_fingerprint(self):
+        _parent = self.parent()
+        try:
+            if _parent is None:
+                return self._core_fingerprint(self.base)
+            elif _parent.fingerprint is None:
+                return None
+            else:
+                return _parent.fingerprint ^ self._fingerprint_delta(self.diff_parent)
+        except TypeError:
+            # unhashable contents
+            return None
+
+    def _hash(self):
+        if self.fingerprint is None:
+            raise TypeError('unhashable contents in {}'.format(type(self)))
+        return finish_hash(self.fingerprint, len(self))
+
+    def _egg_len(self):
+        # Size of a mutable variant. Only the diff is scanned, as the parent is
+        # hatched and knows its size.
+        self.flush()
+        _parent = self.parent()
+        if _parent is None or self.relation_to_base is SELF:
+            return len(self.base)
+        else:
+            return len(_parent) + self._len_delta(self.diff_parent)
+
     @staticmethod
     @abstractmethod
     def _reverse_diff(item):
         """Reverses left/right polarity of an item from :meth:`_diff`"""
         pass
 
+    @staticmethod
+    @abstractmethod
+    def _diff_sides(item):
+        """(Parent value, child value) of a `diff_parent` entry
+
+        Used by :func:`ancestry_diff`.
+
+        """
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _net_diff_item(key, left_value, right_value):
+        """Item of :meth:`_diff` for `key`, or None if the values are equal
+
+        Values are as from :meth:`_diff_sides`.
+
+        """
+        pass
+
     def _get_self(self):
         # only used in :prop:`unproxied_base`
         return self
@@ -184,7 +428,6 @@ class LinkedStructure(object):
                             if _elt is not alt_base)
 
         if not self.alt_bases:
-            del self.alt_bases
             if type(self.base) is weakref.ProxyType:
                 self.base = self.unproxied_base
 
@@ -196,6 +439,10 @@ class LinkedStructure(object):
             # no structure other than `self` should be based on the mutable variant
             return
 
+        if self.arena_ref is not None:
+            # the arena is being dropped along with everything it owns
+            return
+
         _parent = self.parent()
 
         try:
@@ -217,45 +464,66 @@ class LinkedStructure(object):
                 # _parent.base should be another child; no need to do anything
                 return
 
-        if _parent.alt_bases:
-            # set _parent base to an alternative
-            new_base = _parent.alt_bases[0]()
+        with core_moves:
+            # checked again, as another thread may have moved the core since
+            try:
+                if (_parent.relation_to_base != PARENT
+                        or _parent.unproxied_base is not self):
+                    return
+            except ReferenceError:
+                pass
 
-            # figure relation of _parent to new_base
-            if new_base.parent() is _parent:
-                relation_to_base = PARENT
-            elif _parent.parent() is new_base:
-                relation_to_base = CHILD
-            else:
-                raise ValueError("invalid relation_to_base")
+            if _parent.alt_bases:
+                # set _parent base to an alternative
+                new_base = _parent.alt_bases[0]()
 
-            _parent.set_base(new_base, relation_to_base)
+                # figure relation of _parent to new_base
+                if new_base.parent() is _parent:
+                    relation_to_base = PARENT
+                elif _parent.parent() is new_base:
+                    relation_to_base = CHILD
+                else:
+                    raise ValueError("invalid relation_to_base")
 
-            _rest_alt_bases = _parent.alt_bases[1:]
-            if not _rest_alt_bases:
-                del _parent.alt_bases
-            else:
+                _parent.set_base(new_base, relation_to_base)
+
+                _rest_alt_bases = _parent.alt_bases[1:]
                 _parent.alt_bases = _rest_alt_bases
-                _parent.base = weakref.proxy(_parent.base)
-        else:
-            # move core to parent
-            _path = walk_to_core(self)
-            _path.reverse()  # now _path is from core to self
-            for ls1, ls2 in toolz.sliding_window(2, itertools.chain(_path, (_parent,))):
-                transfer_core(ls1, ls2)
+                if _rest_alt_bases and _parent.arena_ref is None:
+                    _parent.base = weakref.proxy(_parent.base)
+            else:
+                # move core to parent
+                _path = walk_to_core(self)
+                _path.reverse()  # now _path is from core to self
+                for ls1, ls2 in toolz.sliding_window(2, itertools.chain(_path, (_parent,))):
+                    transfer_core(ls1, ls2)
 
 
-def hatch_egg_simple(egg):
+def _hatch(egg, parent):
     hatched = egg.immutable_variant(
-        egg.parent(), egg.diff_parent,
+        parent, egg.diff_parent,
         egg.unproxied_base, egg.relation_to_base)
 
+    # hatched structures are immutable, so these are computed once
+    hatched._len = len(egg)
+    hatched.fingerprint = egg._egg_fingerprint()
+
+    _discard_egg(egg)
+    return hatched
+
+
+def _discard_egg(egg):
     # make egg unusable; references to
     # egg should be deleted so memory can be reclaimed.
     del egg.base
     del egg.diff_base
+    # no longer counts as a child of its parent; see :func:`squashable`
+    egg.parent = empty_ref
 
-    return hatched
+
+def hatch_egg_simple(egg):
+    egg.flush()
+    return _hatch(egg, egg.parent())
 
 
 def hatch_egg_optimized(egg: LinkedStructure):
@@ -265,50 +533,493 @@ def hatch_egg_optimized(egg: LinkedStructure):
     """
     # TODO: rename this func to "hatch_egg_and_manage_memory"
 
-    if egg == egg.empty_variant:
+    egg.flush()
+
+    if len(egg) == 0:
         return egg.empty_variant
     elif egg.relation_to_base is CHILD and len(egg.diff_base) == 0:
         # The egg is a NOP.
         # NOTE: If egg.relation_to_base is SELF, then `len(egg.diff_base) == 0`
         # trivially and tells us nothing.
 
-        # make egg unusable; references to
-        # egg should be deleted so memory can be reclaimed.
         logger.debug('NOP')
 
-        del egg.base
-        del egg.diff_base
-        return egg.parent()
+        _parent = egg.parent()
+        _discard_egg(egg)
+        return _parent
     else:
         _parent = egg.parent()
-        hatched = egg.immutable_variant(
-            _parent, egg.diff_parent,
-            egg.unproxied_base, egg.relation_to_base)
+        hatched = _hatch(egg, _parent)
+        _place_core(hatched, _parent)
+        return hatched
 
-        # make egg unusable; references to
-        # egg should be deleted so memory can be reclaimed.
-        del egg.base
-        del egg.diff_base
 
-        if hatched.relation_to_base == CHILD:
-            if _parent.relation_to_base is SELF:
-                logger.debug('Transferring core.')
+def _place_core(hatched, _parent):
+    # Give a freshly hatched child of `_parent` a core: the parent's, or a
+    # copy if the parent's core has moved on to another child.
+    if hatched.relation_to_base != CHILD:
+        return
 
-                transfer_core(_parent, hatched)
-            else:
-                logger.debug('Creating a fork.')
+    with core_moves:
+        if _parent.relation_to_base is SELF:
+            logger.debug('Transferring core.')
 
-                create_core_in(hatched)
-                _parent.alt_bases += (
-                    weakref.ref(hatched, _parent._remove_alt_base),)
+            transfer_core(_parent, hatched)
+            hatched.keyframe_distance = _parent.keyframe_distance + 1
+            hatched.keyframe_diff_count = (_parent.keyframe_diff_count
+                                           + len(hatched.diff_parent))
+        else:
+            logger.debug('Creating a fork.')
+
+            create_core_in(hatched)
+            _parent.alt_bases += (
+                weakref.ref(hatched, _parent._remove_alt_base),)
+
+
+def hatch_core(cls, core):
+    """A hatched structure of type `cls` holding `core`, without a parent
+
+    `core` is taken over, not copied.
+
+    """
+    hatched = cls(parent=None, diff_parent=None, base=core, relation_to_base=SELF)
+    hatched._len = len(core)
+    hatched.fingerprint = hatched._egg_fingerprint()
+    return hatched
+
+
+def hatch_diff(parent, diff_parent):
+    """A hatched child of `parent`, differing from it by `diff_parent`
+
+    Same as hatching an egg of `parent` holding the diff, without diffing
+    writes against the parent; used to rebuild stored histories. `diff_parent`
+    must be in the format of a hatched structure's, and is taken over.
+
+    """
+    hatched = type(parent)(parent, diff_parent, parent, CHILD)
+    hatched._len = len(parent) + hatched._len_delta(diff_parent)
+    hatched.fingerprint = hatched._egg_fingerprint()
+
+    # rebuilt histories belong to the arena of their parent, if any
+    arena = parent.arena_ref.arena if parent.arena_ref is not None else None
+    if arena is not None:
+        arena.adopt(hatched)
+
+    _place_core(hatched, parent)
+    return hatched
+
+
+def replace_diff_parent(linked_structure, diff_parent):
+    """Swap the `diff_parent` of a hatched structure for an equal mapping
+
+    References to the old diff as a `diff_base`, from the structure or from
+    its parent, are swapped too.
+
+    """
+    with core_moves:
+        old = linked_structure.diff_parent
+        linked_structure.diff_parent = diff_parent
+        if linked_structure.diff_base is old:
+            linked_structure.diff_base = diff_parent
+
+        _parent = linked_structure.parent()
+        if _parent is not None and _parent.diff_base is old:
+            _parent.diff_base = diff_parent
 
-        return hatched
+
+def _only_child(linked_structure):
+    # The one structure, hatched or not, whose parent is `linked_structure`;
+    # None if there are several, or none.
+    children = [ref.child() for ref in weakref.getweakrefs(linked_structure)
+                if type(ref) is _ParentRef]
+    if len(children) == 1:
+        return children[0]
+    return None
+
+
+def compose_diffs(linked_structure, diff_parent, child_diff_parent):
+    """The `diff_parent` of a grandchild, given the two diffs leading to it
+
+    `diff_parent` is that of a child of `linked_structure`, and
+    `child_diff_parent` that of the child's child.
+
+    """
+    _diff_sides = linked_structure._diff_sides
+    _net_diff_item = linked_structure._net_diff_item
+
+    composed = {}
+    for key in diff_parent.keys() | child_diff_parent.keys():
+        try:
+            left = _diff_sides(diff_parent[key])[0]
+        except KeyError:
+            left = _diff_sides(child_diff_parent[key])[0]
+
+        try:
+            right = _diff_sides(child_diff_parent[key])[1]
+        except KeyError:
+            right = _diff_sides(diff_parent[key])[1]
+
+        item = _net_diff_item(key, left, right)
+        if item is not None:
+            composed[key] = item[1]
+    return composed
+
+
+def squashable(linked_structure):
+    """The only child of `linked_structure`, if :func:`squash` can remove it"""
+    if (type(linked_structure) is linked_structure.mutable_variant
+            or type(linked_structure.parent) is not _ParentRef
+            or linked_structure.diff_parent is None
+            or linked_structure.parent() is None):
+        return None
+
+    child = _only_child(linked_structure)
+    if (child is None
+            or type(child) is child.mutable_variant
+            or child.diff_parent is None):
+        return None
+    return child
+
+
+def squash(linked_structure):
+    """Remove a hatched structure from the middle of its history
+
+    Its only child is re-parented onto its parent, with the two diffs
+    composed, and takes over the core if it held it. Afterwards the structure
+    stays readable only while that child lives, and should not be hatched
+    from. Structures owned by an :class:`Arena` are not squashed.
+
+    :returns: whether the structure was removed; nothing is changed unless
+              it has a parent and exactly one child, counting eggs, and both
+              diffs are known (see :func:`squashable`).
+
+    """
+    child = squashable(linked_structure)
+    if child is None:
+        return False
+
+    with core_moves:
+        _parent = linked_structure.parent()
+        if linked_structure.relation_to_base is SELF:
+            transfer_core(linked_structure, child)
+
+        child.parent = _ParentRef(_parent, child)
+        child.diff_parent = compose_diffs(linked_structure,
+                                          linked_structure.diff_parent,
+                                          child.diff_parent)
+        if child.relation_to_base is CHILD:
+            child.set_base(_parent, CHILD)
+
+        if (_parent.relation_to_base is PARENT
+                and _parent.unproxied_base is linked_structure):
+            proxied = type(_parent.base) is weakref.ProxyType
+            _parent.set_base(child, PARENT)
+            if not proxied:
+                _parent.base = child
+
+        if any(ref() is linked_structure for ref in _parent.alt_bases):
+            _parent.alt_bases = tuple(
+                weakref.ref(child, _parent._remove_alt_base)
+                if ref() is linked_structure else ref
+                for ref in _parent.alt_bases)
+
+        # detach, so that it is not counted as a child of `_parent`, and does
+        # not hand the core back to it when it dies
+        linked_structure.parent = empty_ref
+    return True
+
+
+def copy_core(linked_structure):
+    """A new core holding the contents of `linked_structure`
+
+    Copied from the nearest core, applying the diffs on the way back, in one
+    walk of the bases.
+
+    """
+    path = walk_to_core(linked_structure)
+    core = linked_structure.core_type(path[-1].base)
+    for node in reversed(path[:-1]):
+        node._update_core(core, node)
+    return core
 
 
 def create_core_in(linked_structure):
-    linked_structure.base = linked_structure.core_type(linked_structure)
-    linked_structure.diff_base = empty_mapping
-    linked_structure.relation_to_base = SELF
+    with core_moves:
+        linked_structure.base = copy_core(linked_structure)
+        linked_structure.diff_base = empty_mapping
+        linked_structure.relation_to_base = SELF
+
+
+def make_keyframe(linked_structure):
+    """Give `linked_structure` its own copy of the core
+
+    Reads of `linked_structure`, and of older structures based on it, then stop
+    at `linked_structure` instead of walking on toward the newest core.
+
+    """
+    if linked_structure.relation_to_base is not SELF:
+        logger.debug('Creating a keyframe.')
+        create_core_in(linked_structure)
+
+
+class Keyframes(object):
+    """Policy for materializing full snapshots along a history
+
+    Normally only the newest structure in a history holds a core, so reading a
+    structure `n` commits behind it walks `n` diffs. With a `Keyframes` policy,
+    the parent of a freshly hatched structure is made a keyframe (see
+    :func:`make_keyframe`) once enough history has accumulated since the last
+    one.
+
+    :param int every:       keyframe after this many commits; bounds the
+                            number of diffs walked by a read.
+    :param int max_diffs:   keyframe after this many diffed keys; bounds the
+                            diffs walked by a read, by size rather than count.
+
+    Each keyframe costs a copy of the structure, so larger values trade read
+    depth for memory.
+
+    """
+
+    def __init__(self, every=None, max_diffs=None):
+        self.every = every
+        self.max_diffs = max_diffs
+
+    def due(self, hatched):
+        return ((self.every is not None
+                 and hatched.keyframe_distance >= self.every)
+                or (self.max_diffs is not None
+                    and hatched.keyframe_diff_count >= self.max_diffs))
+
+    def apply(self, hatched):
+        """Called on each newly hatched structure"""
+        try:
+            _parent = hatched.parent()
+        except AttributeError:
+            # e.g. an empty variant
+            return
+
+        if (_parent is None
+            or _parent.relation_to_base is not PARENT
+            or _parent.unproxied_base is not hatched):
+            return
+
+        if self.due(hatched):
+            make_keyframe(_parent)
+            hatched.keyframe_distance = 1
+            hatched.keyframe_diff_count = len(hatched.diff_parent)
+
+
+class InternTable(object):
+    """Reuses hatched structures instead of hatching identical ones
+
+    Set on a flow as :attr:`StructureFlow.intern_table`. Structures are looked
+    up by :attr:`LinkedStructure.fingerprint`, and are held weakly.
+
+    """
+
+    def __init__(self):
+        self._structures = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._structures)
+
+    def hatch(self, egg):
+        """Hatch `egg`, or return an existing structure equal to it"""
+        egg.flush()
+
+        fingerprint = egg._egg_fingerprint()
+        if fingerprint is not None:
+            existing = self._structures.get(finish_hash(fingerprint, len(egg)))
+            if existing is not None and existing == egg:
+                logger.debug('Reusing interned structure.')
+                _discard_egg(egg)
+                return existing
+
+        hatched = egg.hatch()
+        if isinstance(hatched, LinkedStructure) and hatched.fingerprint is not None:
+            self._structures.setdefault(hash(hatched), hatched)
+        return hatched
+
+
+class _ArenaRef(object):
+    """Stands in for a weakref to a structure owned by an :class:`Arena`
+
+    The arena itself is weakly referenced, so that the arena and the
+    structures it owns do not form a cycle.
+
+    """
+    __slots__ = ('_arena', 'slot')
+
+    def __init__(self, arena, slot):
+        self._arena = weakref.ref(arena)
+        self.slot = slot
+
+    @property
+    def arena(self):
+        return self._arena()
+
+    def __call__(self):
+        arena = self._arena()
+        return arena.nodes[self.slot] if arena is not None else None
+
+
+class Arena(object):
+    """Explicit ownership of linked structures
+
+    The instance maps and flow instances of events committed to a timeline
+    using the arena are owned by it, as are children rebuilt from owned
+    structures by :func:`hatch_diff`. Other structures hatched from owned
+    ones, such as the results of set algebra, are not.
+
+    Owned structures refer to their parents by slot in :attr:`nodes`, and hold
+    their bases directly, so they need no weakref callbacks or proxies. They
+    are kept until the arena is dropped or they are :meth:`release` d.
+
+    Set on a timeline with the `arena` parameter of
+    :class:`timeline.TimeLine`. Owned structures only refer to the arena
+    weakly; once it is dropped, they no longer know their parents.
+
+    """
+
+    def __init__(self):
+        # slot 0 stays empty; refs to released structures point to it
+        self.nodes = [None]
+        self._free = []
+        self._children = {}     # slot -> slots of owned children
+
+    def __len__(self):
+        return len(self.nodes) - 1 - len(self._free)
+
+    def __contains__(self, linked_structure):
+        arena_ref = getattr(linked_structure, 'arena_ref', None)
+        return arena_ref is not None and arena_ref.arena is self
+
+    def adopt(self, linked_structure):
+        """Take ownership of `linked_structure`, and of structures hatched from it
+
+        Anything other than a hatched, unowned LinkedStructure is ignored.
+
+        """
+        if (not isinstance(linked_structure, LinkedStructure)
+                or linked_structure.arena_ref is not None
+                or type(linked_structure) is linked_structure.mutable_variant):
+            return
+
+        if self._free:
+            slot = self._free.pop()
+            self.nodes[slot] = linked_structure
+        else:
+            slot = len(self.nodes)
+            self.nodes.append(linked_structure)
+
+        linked_structure.arena_ref = _ArenaRef(self, slot)
+
+        parent_ref = linked_structure.parent
+        if type(parent_ref) is _ArenaRef and parent_ref.arena is self:
+            self._children.setdefault(parent_ref.slot, set()).add(slot)
+
+    def release(self, *linked_structures):
+        """Give up ownership of `linked_structures`
+
+        Released structures are weakly linked to their parents and children
+        again, and are reclaimed like unowned structures once unreferenced.
+        Structures not owned by the arena are ignored. Eggs of a released
+        structure should be hatched or discarded first.
+
+        """
+        released = [_ls for _ls in linked_structures if _ls in self]
+
+        for ls in released:
+            for slot in self._children.pop(ls.arena_ref.slot, ()):
+                child = self.nodes[slot]
+                child.parent = _ParentRef(ls, child)
+
+        for ls in released:
+            _parent = ls.parent()
+            if _parent is not None:
+                if type(ls.parent) is _ArenaRef:
+                    siblings = self._children.get(ls.parent.slot)
+                    if siblings is not None:
+                        siblings.discard(ls.arena_ref.slot)
+                        if not siblings:
+                            del self._children[ls.parent.slot]
+                    ls.parent = _ParentRef(_parent, ls)
+                if _parent.relation_to_base is PARENT and _parent.base is ls:
+                    # so that `ls` can die, handing the core back to _parent
+                    _parent.base = weakref.proxy(ls)
+
+            arena_ref = ls.arena_ref
+            self.nodes[arena_ref.slot] = None
+            self._free.append(arena_ref.slot)
+            arena_ref.slot = 0
+            ls.arena_ref = None
+
+
+def batch_lookup(linked_structure, keys):
+    """Look up many keys, walking the base chain of `linked_structure` once
+
+    Values are read as by :meth:`LinkedStructure._read_diff` and
+    :meth:`LinkedStructure._read_core`.
+
+    :returns: dict mapping each key to its value in `linked_structure`.
+
+    """
+    found = {}
+    remaining = set(keys)
+    node = linked_structure
+
+    while node.relation_to_base is not SELF:
+        if not remaining:
+            return found
+
+        diff_base = node.diff_base
+        relation = node.relation_to_base
+
+        # iterate over whichever is smaller
+        if len(diff_base) < len(remaining):
+            hits = [k for k in diff_base if k in remaining]
+        else:
+            hits = [k for k in remaining if k in diff_base]
+
+        for k in hits:
+            found[k] = node._read_diff(diff_base[k], relation)
+        remaining.difference_update(hits)
+
+        node = node.unproxied_base
+
+    core = node.base
+    for k in remaining:
+        found[k] = node._read_core(core, k)
+
+    return found
+
+
+def iter_keys(linked_structure, absent):
+    """Iterate over the keys of `linked_structure`, walking its bases once
+
+    Each key is read from the nearest node whose diff holds it, as by
+    :func:`batch_lookup`; `absent` is the value read for a key that is not
+    there. Keys are yielded as they are found, without copying the core.
+
+    """
+    path = walk_to_core(linked_structure)
+    if len(path) == 1:
+        return iter(linked_structure.base)
+    seen = set()
+
+    def in_diffs():
+        for node in path[:-1]:
+            relation = node.relation_to_base
+            for k, item in node.diff_base.items():
+                if k not in seen:
+                    seen.add(k)
+                    if node._read_diff(item, relation) != absent:
+                        yield k
+
+    # the keys of the core are filtered once the diffs are exhausted
+    return itertools.chain(in_diffs(),
+                           itertools.filterfalse(seen.__contains__, path[-1].base))
 
 
 def walk_to_core(linked_structure):
@@ -318,7 +1029,13 @@ def walk_to_core(linked_structure):
     return path
 
 
-def diff(left: LinkedStructure, right: LinkedStructure):
+def adjacent_diff(left: LinkedStructure, right: LinkedStructure):
+    """The diff between `left` and `right` if it is stored, else None
+
+    The diff is stored if `left` and `right` are the same, or one is the base
+    or the parent of the other.
+
+    """
     if left is right:
         return ()
 
@@ -338,5 +1055,138 @@ def diff(left: LinkedStructure, right: LinkedStructure):
             return (right._reverse_diff(item) for item in
                     right.diff_base.items())
 
+    elif right.parent() is left and right.diff_parent is not None:
+        return right.diff_parent.items()
+
+    elif left.parent() is right and left.diff_parent is not None:
+        return (left._reverse_diff(item)
+                for item in left.diff_parent.items())
+
     else:
+        return None
+
+
+def common_ancestor(left: LinkedStructure, right: LinkedStructure):
+    """Nearest structure that both are descended from (via `parent`)
+
+    :returns: (ancestor, path from `left`, path from `right`), where paths
+              exclude the ancestor; or None if there is no common ancestor.
+
+    """
+    left_path = []
+    right_path = []
+
+    while left is not right:
+        if left.generation >= right.generation:
+            left_path.append(left)
+            left = left.parent()
+            if left is None:
+                return None
+        else:
+            right_path.append(right)
+            right = right.parent()
+            if right is None:
+                return None
+
+    return left, left_path, right_path
+
+
+def _path_values(path):
+    # Values of keys changed along `path`, at either end of it:
+    # (values at path[0], values at the parent of path[-1])
+    near = {}
+    far = {}
+    for node in path:
+        _diff_sides = node._diff_sides
+        for key, item in node.diff_parent.items():
+            far[key], near_value = _diff_sides(item)
+            near.setdefault(key, near_value)
+    return near, far
+
+
+def ancestry_diff(left: LinkedStructure, right: LinkedStructure):
+    """The diff between `left` and `right`, composed from stored diffs
+
+    The `diff_parent` of every structure between `left`, `right` and their
+    common ancestor is composed into a net diff, so the cost depends on the
+    number of changes rather than on the size of the structures.
+
+    :returns: list of items as from :meth:`LinkedStructure._diff`, or None if
+              there is no common ancestor, or part of the history is gone.
+
+    """
+    found = common_ancestor(left, right)
+    if found is None:
+        return None
+
+    _unused, left_path, right_path = found
+    if any(node.diff_parent is None for node in itertools.chain(left_path, right_path)):
+        return None
+
+    left_values, left_ancestor_values = _path_values(left_path)
+    right_values, right_ancestor_values = _path_values(right_path)
+
+    _net_diff_item = left._net_diff_item
+    result = []
+    for key in left_values.keys() | right_values.keys():
+        try:
+            left_value = left_values[key]
+        except KeyError:
+            left_value = right_ancestor_values[key]
+
+        try:
+            right_value = right_values[key]
+        except KeyError:
+            right_value = left_ancestor_values[key]
+
+        item = _net_diff_item(key, left_value, right_value)
+        if item is not None:
+            result.append(item)
+
+    return result
+
+
+def stored_diff(left: LinkedStructure, right: LinkedStructure):
+    """The diff between `left` and `right` if it can be found from stored
+    diffs, else None"""
+    _diff = adjacent_diff(left, right)
+    if _diff is None:
+        _diff = ancestry_diff(left, right)
+    return _diff
+
+
+def diff(left: LinkedStructure, right: LinkedStructure):
+    _diff = stored_diff(left, right)
+    if _diff is None:
         return left._diff(left, right)
+    else:
+        return _diff
+
+
+def structure_eq(left: LinkedStructure, other, abc):
+    """`left == other`, skipping a full comparison where possible
+
+    Sizes and fingerprints are compared first; then, if `left` and `other`
+    share history, only the diff between them is checked.
+
+    :param abc:     the abstract base class whose `__eq__` to fall back on.
+
+    """
+    if left is other:
+        return True
+
+    if isinstance(other, abc) and len(left) != len(other):
+        return False
+
+    if isinstance(other, LinkedStructure) and left.core_type is other.core_type:
+        if (left.fingerprint is not None and other.fingerprint is not None
+            and left.fingerprint != other.fingerprint):
+            return False
+
+        _diff = stored_diff(left, other)
+        if _diff is not None:
+            for _unused in _diff:
+                return False
+            return True
+
+    return abc.__eq__(left, other)
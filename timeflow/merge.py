@@ -0,0 +1,134 @@
+"""Three-way merges of forked histories
+
+:func:`merge_events` stages, in a plan based on one event, the changes made on
+another since their fork point. Changes are net diffs per flow, composed from
+the stored diffs between the fork point and each side, so the cost of a merge
+depends on how far the sides have diverged rather than on the size of the
+flows.
+
+Keys (or elements) changed differently on both sides are conflicts. They are
+passed to a resolver, a callable taking a :class:`Conflict` and returning the
+value to keep; see :func:`ours` and :func:`theirs`. Without a resolver, a
+:class:`plan.ConflictError` is raised.
+
+"""
+import collections
+
+from .event import fork_point
+from .flow import StructureFlow
+from .linked_mapping import LinkedMapping
+from .linked_structure import LinkedStructure, NO_VALUE, diff
+from .plan import ConflictError
+from .serialize import structure_type
+
+
+class Conflict(collections.namedtuple('Conflict', 'flow key base ours theirs')):
+    """A key changed differently on both sides of a merge
+
+    `base`, `ours` and `theirs` are the values at the fork point and on each
+    side: values of a mapping, or NO_VALUE where the key is missing; for a
+    set, whether the element is in it. `key` is None for flows that are not
+    structures, whose values are then the flow's values.
+
+    """
+    __slots__ = ()
+
+
+def ours(conflict):
+    """Resolver keeping the value of the side merged into"""
+    return conflict.ours
+
+
+def theirs(conflict):
+    """Resolver keeping the value of the side merged from"""
+    return conflict.theirs
+
+
+def _changes(cls, left, right):
+    # key -> diff item from `left` to `right`, either of which may be a default
+    if left is right:
+        return {}
+    elif isinstance(left, LinkedStructure) and isinstance(right, LinkedStructure):
+        return dict(diff(left, right))
+    else:
+        return dict(cls._diff(left, right))
+
+
+def _merge_structure(plan, flow, base, ours_instance, theirs_instance,
+                     resolver, conflicts):
+    cls = structure_type(flow)
+    ours_changes = _changes(cls, base, ours_instance)
+
+    merged = {}
+    for key, item in _changes(cls, base, theirs_instance).items():
+        base_value, theirs_value = cls._diff_sides(item)
+        try:
+            ours_value = cls._diff_sides(ours_changes[key])[1]
+        except KeyError:
+            ours_value = base_value
+        else:
+            if ours_value == theirs_value:
+                continue
+            conflict = Conflict(flow, key, base_value, ours_value, theirs_value)
+            if resolver is None:
+                conflicts.setdefault(flow, set()).add(key)
+                continue
+            theirs_value = resolver(conflict)
+
+        net_item = cls._net_diff_item(key, ours_value, theirs_value)
+        if net_item is not None:
+            merged[key] = net_item[1]
+
+    if merged:
+        cls._apply_changes(plan.get_flow_instance(flow), cls._changes(merged))
+
+
+def merge_events(plan, event, resolver=None):
+    """Stage in `plan` the changes from the fork point of its base to `event`
+
+    The event committed from `plan` records `event` as merged, so that later
+    merges from the same history start from it.
+
+    :raises plan.ConflictError:     on conflicts, if `resolver` is None; the
+                                    plan may have been partly staged.
+    :raises ValueError:             if the two share no history.
+
+    """
+    base_event = fork_point(plan.base_event, event)
+    if base_event is None:
+        raise ValueError('{} and {} share no history'.format(plan.base_event, event))
+
+    ours_map_changes = _changes(LinkedMapping, base_event.instance,
+                                plan.base_event.instance)
+    theirs_map_changes = _changes(LinkedMapping, base_event.instance, event.instance)
+
+    conflicts = {}
+    for flow, (base, theirs_instance) in theirs_map_changes.items():
+        if flow.derived:
+            # recomputed from the merged inputs when committed
+            continue
+        try:
+            ours_instance = ours_map_changes[flow][1]
+        except KeyError:
+            ours_instance = base
+        base, ours_instance, theirs_instance = (
+            flow.default if instance is NO_VALUE else instance
+            for instance in (base, ours_instance, theirs_instance))
+
+        if ours_instance is base:
+            plan.set_flow_instance(flow, theirs_instance)
+        elif theirs_instance is ours_instance:
+            continue
+        elif isinstance(flow, StructureFlow):
+            _merge_structure(plan, flow, base, ours_instance, theirs_instance,
+                             resolver, conflicts)
+        elif theirs_instance != ours_instance:
+            if resolver is None:
+                conflicts[flow] = None
+            else:
+                plan.set_flow_instance(flow, resolver(
+                    Conflict(flow, None, base, ours_instance, theirs_instance)))
+
+    if conflicts:
+        raise ConflictError(conflicts)
+    plan.merged = event
@@ -1,15 +1,92 @@
+"""Flows computed from other flows
 
-class TDObserver(object):
-    def __init__(self, rule, *observed_args, **observed_kwargs):
+A :class:`DerivedFlow`, from :meth:`TimeLine.derive`, holds the value of a
+rule over input flows::
+
+  total = tl.derive(lambda prices: sum(prices.values()), prices)
+  total.read_at(event)
+
+Its value is stored in each event like that of any other flow, and is only
+recomputed by commits whose instance map changes an input. Rules can also be
+incremental, taking the previous value and the diff of each input::
+
+  def add(total, diff):
+      return total + sum((new if new is not NO_VALUE else 0) -
+                         (old if old is not NO_VALUE else 0)
+                         for old, new in diff.values())
+
+  total = tl.derive(add, prices, incremental=True, default=0)
+
+Diffs are those of :func:`subscribe.flow_diff`, empty for inputs that did not
+change.
+
+Rules are not stored: stores, logs, exports and change feeds record derived
+flows as plain values, read back as :class:`SimpleFlow` flows unless a
+DerivedFlow is registered under the same name.
+
+"""
+from .flow import SimpleFlow
+from .linked_structure import NO_VALUE
+from .subscribe import flow_diff
+
+
+class DerivedFlow(SimpleFlow):
+    """Flow holding the value of `rule` over the values of `inputs`
+
+    Derived flows are maintained by the timeline they were added to with
+    :meth:`TimeLine.derive`; commits to other timelines, forks included, leave
+    them as they were. Their values are set at commit, not staged by users.
+
+    :param incremental: whether `rule` is called with the previous value and
+                        the diff of each input, rather than with the values
+                        of the inputs.
+    :param default:     the value before the flow is first computed; the
+                        starting value of incremental rules.
+
+    """
+
+    derived = True
+
+    def __init__(self, rule, *inputs, incremental=False, default=None):
         self.rule = rule
-        self.observed_args = observed_args
-        self.observed_kwargs = observed_kwargs
+        self.inputs = inputs
+        self.incremental = incremental
+        self.default = default
+
+    def compute(self, instance_map, parent_instance_map):
+        """The value at an instance map, hatched from `parent_instance_map`"""
+        def read(flow, instance_map):
+            instance = instance_map.get(flow, NO_VALUE)
+            return flow.default if instance is NO_VALUE else instance
+
+        if not self.incremental:
+            return self.rule(*[read(flow, instance_map) for flow in self.inputs])
+
+        return self.rule(
+            read(self, parent_instance_map),
+            *[flow_diff(flow, read(flow, parent_instance_map), read(flow, instance_map))
+              for flow in self.inputs])
+
+    def derive_at(self, instance_map, parent_instance_map, changed):
+        """Recompute the value in the egg `instance_map`, if an input is in
+        `changed`, the set of flows changed from `parent_instance_map`
+
+        Called by :meth:`Plan.hatch`. If the value changes, this flow is
+        added to `changed`, for the flows derived from it.
+
+        :returns: the new value, or NO_VALUE if not recomputed.
 
-    def __getitem__(self, time):
-        return rule(*[oa[time] for oa in observed_args],
-                    **{k:v[time] for k,v in observed_kwargs.items()})
+        """
+        if changed.isdisjoint(self.inputs):
+            return NO_VALUE
 
+        old_value = instance_map.get(self, self.default)
+        value = self.compute(instance_map, parent_instance_map)
+        if value == self.default:
+            instance_map.pop(self, None)
+        else:
+            instance_map[self] = value
+        if value != old_value:
+            changed.add(self)
+        return value
 
-def TDRule(rule):
-    # convenience
-    return tz.partial(TDObserver, rule)
@@ -0,0 +1,101 @@
+"""Adaptive core placement
+
+Only the newest structure in a history normally holds a core, so reads of old
+structures walk every diff in between. A :class:`CorePlacement` policy counts
+reads per structure and, once reading a structure has cost more than copying
+it would, gives that structure a second core (see
+:func:`linked_structure.make_keyframe`).
+
+"""
+
+import collections
+import weakref
+import logging
+
+from .linked_structure import LinkedStructure, make_keyframe, walk_to_core
+
+logger = logging.getLogger(__name__)
+
+
+Migration = collections.namedtuple(
+    'Migration', ['node_ref', 'reads', 'depth', 'read_cost', 'copy_cost'])
+
+
+class CostModel(object):
+    """Estimates what reads, and core copies, cost
+
+    :param float hop_cost:      cost of walking one diff during a read.
+    :param float item_cost:     cost of copying one item into a new core.
+
+    """
+
+    def __init__(self, hop_cost=1., item_cost=1.):
+        self.hop_cost = hop_cost
+        self.item_cost = item_cost
+
+    def read_cost(self, depth):
+        return depth * self.hop_cost
+
+    def copy_cost(self, linked_structure):
+        return len(linked_structure) * self.item_cost
+
+
+class CorePlacement(object):
+    """Gives heavily read structures their own core
+
+    Set on a flow as :attr:`StructureFlow.core_placement`; reads through
+    :meth:`StructureFlow.read_at` and :meth:`StructureFlow.at` are counted.
+
+    :param CostModel cost_model:
+    :param int min_reads:       reads before a structure is considered.
+    :param int history:         number of :class:`Migration` records kept.
+
+    A structure is considered whenever its read count reaches a power of two,
+    so checking costs O(log reads) walks in total.
+
+    """
+
+    def __init__(self, cost_model=None, min_reads=8, history=100):
+        self.cost_model = cost_model if cost_model is not None else CostModel()
+        self.min_reads = min_reads
+        self.migrations = collections.deque(maxlen=history)
+
+    @staticmethod
+    def reads(linked_structure):
+        return linked_structure.read_count
+
+    def stats(self, linked_structure):
+        """Counters behind the placement decision for `linked_structure`"""
+        depth = len(walk_to_core(linked_structure)) - 1
+        return {'reads': linked_structure.read_count,
+                'depth': depth,
+                'read_cost': (linked_structure.read_count
+                              * self.cost_model.read_cost(depth)),
+                'copy_cost': self.cost_model.copy_cost(linked_structure)}
+
+    def record_read(self, linked_structure):
+        if (not isinstance(linked_structure, LinkedStructure)
+            or type(linked_structure) is linked_structure.mutable_variant):
+            return
+
+        count = linked_structure.read_count = linked_structure.read_count + 1
+        if count >= self.min_reads and count & (count - 1) == 0:
+            self.consider(linked_structure)
+
+    def consider(self, linked_structure):
+        """Give `linked_structure` a core if reads have outweighed a copy
+
+        :returns: the :class:`Migration`, or None if the core was not placed.
+
+        """
+        stats = self.stats(linked_structure)
+        if stats['depth'] == 0 or stats['read_cost'] <= stats['copy_cost']:
+            return None
+
+        logger.debug('Placing core after %d reads at depth %d.',
+                     stats['reads'], stats['depth'])
+        make_keyframe(linked_structure)
+
+        migration = Migration(node_ref=weakref.ref(linked_structure), **stats)
+        self.migrations.append(migration)
+        return migration
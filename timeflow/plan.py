@@ -3,13 +3,49 @@ from functools import partial
 import weakref
 import logging
 
-from .linked_structure import SELF, CHILD
+from .linked_structure import SELF, CHILD, LinkedStructure, NO_VALUE, diff
 from .event import Event
 from .flow import Flow
 
 logger = logging.getLogger(__name__)
 
 
+class ConflictError(Exception):
+    """A plan changes what was committed since its base event
+
+    :attr:`conflicts` maps each conflicting flow to the set of conflicting keys
+    (or elements), or to None when the flow conflicts as a whole.
+
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        Exception.__init__(self, 'conflicting changes to {}'.format(
+            ', '.join('{!r} {}'.format(flow, 'as a whole' if keys is None
+                                       else sorted(keys, key=repr))
+                      for flow, keys in conflicts.items())))
+
+
+def _written_keys(base_instance, staged):
+    # keys changed by `staged`, or None if it replaces `base_instance` whole
+    if (isinstance(staged, LinkedStructure)
+            and staged.parent() is base_instance
+            and staged.diff_parent is not None):
+        staged.flush()
+        return set(staged.diff_parent)
+    return None
+
+
+def _committed_keys(base_instance, head_instance):
+    # keys changed from `base_instance` to `head_instance`, or None if unknown
+    if base_instance is head_instance:
+        return set()
+    elif (isinstance(base_instance, LinkedStructure)
+          and isinstance(head_instance, LinkedStructure)):
+        return set(item[0] for item in diff(base_instance, head_instance))
+    return None
+
+
 class Plan(object):
     modified_flow = 'modified_flow'
     new_flow = 'new_flow'
@@ -31,6 +67,8 @@ class Plan(object):
 
         self.frozen = set()    # a set of frozen flows
 
+        self.merged = None     # the event merged, see merge.merge_events
+
         self.status = self.planning
 
     def get_flow_instance(self, flow: Flow):
@@ -67,32 +105,127 @@ class Plan(object):
             else:
                 self.stage[flow] = _other_stage
 
-    def hatch(self):
+    def conflicts(self, event):
+        """Changes staged here that conflict with those from the base to `event`
+
+        Staged structures conflict on the keys (or elements) that both they
+        and `event` changed; other staged values conflict when the flow changed
+        at all.
+
+        :returns: a mapping like :attr:`ConflictError.conflicts`.
+
+        """
+        conflicts = {}
+        for flow, staged in self.stage.items():
+            base_instance = self.base_event.read_flow_instance(flow)
+            head_instance = event.read_flow_instance(flow)
+            if base_instance is head_instance:
+                continue
+
+            written = _written_keys(base_instance, staged)
+            if written is None:
+                conflicts[flow] = None
+                continue
+
+            committed = _committed_keys(base_instance, head_instance)
+            if committed is None:
+                committed = written
+            if written & committed:
+                conflicts[flow] = written & committed
+        return conflicts
+
+    def rebase(self, event):
+        """Move the plan onto `event`, keeping the changes staged here
+
+        Used by :meth:`TimeLine.commit` for plans based on an older HEAD.
+
+        :raises ConflictError:  if the plan conflicts with `event`; the plan is
+                                then left as it was.
+
+        """
+        conflicts = self.conflicts(event)
+        if conflicts:
+            raise ConflictError(conflicts)
+
+        for flow, staged in list(self.stage.items()):
+            base_instance = self.base_event.read_flow_instance(flow)
+            head_instance = event.read_flow_instance(flow)
+            if base_instance is not head_instance:
+                # both are structures with disjoint changes
+                rebased = head_instance.egg()
+                staged._apply_changes(rebased, staged._changes(staged.diff_parent))
+                self.stage[flow] = rebased
+
+        self.base_event = event
+
+    def hatch(self, keyframes=None, time=None, arena=None, compact_diffs=None,
+              derived=()):
         """Create a new event from the plan
 
         WARNING: Assumes flow instances of the parent event have "cores".
 
+        :param linked_structure.Keyframes keyframes:
+            keyframe policy for the event's instance map.
+
+        :param time:    time of the new event; see :class:`Event`.
+
+        :param linked_structure.Arena arena:
+            takes ownership of the event's instance map and of introduced flow
+            instances. Other instances are owned if their parents are.
+
+        :param linked_mapping.CompactDiffs compact_diffs:
+            storage policy for the diff of the event's instance map.
+
+        :param derived: :class:`observe.DerivedFlow` instances to recompute,
+                        inputs first, if the instance map changes their inputs.
+                        Their new values are added to the stage.
+
         """
 
         parent_instance_map = self.base_event.instance
         instance_map = parent_instance_map.egg()
 
         for flow, instance in self.stage.items():
-            try:
-                hatched_item = instance.hatch()
-            except AttributeError:
+            if not hasattr(instance, 'hatch'):
+                # plain values, e.g. those of a SimpleFlow
                 instance_map[flow] = instance
                 continue
 
+            hatched_item = flow.hatch_instance(instance)
+
             if hatched_item is flow.default:
                 instance_map.pop(flow, None)
             else:
+                if arena is not None:
+                    arena.adopt(hatched_item)
                 instance_map[flow] = hatched_item
                 if instance_map[flow] is not hatched_item:
                     logger.warn('Plan.hatch: redundant attempt to update flow')
 
-        return Event(instance_map=instance_map.hatch(),
-                     parent=self.base_event)
+        if derived:
+            instance_map.flush()
+            if instance_map.parent() is None:
+                # first egg, without a parent to diff against
+                changed = set(instance_map)
+            else:
+                changed = set(instance_map.diff_parent)
+            for flow in derived:
+                value = flow.derive_at(instance_map, parent_instance_map, changed)
+                if value is not NO_VALUE:
+                    self.stage[flow] = value
+
+        hatched_map = instance_map.hatch()
+        if arena is not None:
+            arena.adopt(hatched_map)
+        if keyframes is not None:
+            keyframes.apply(hatched_map)
+        if compact_diffs is not None:
+            compact_diffs.apply(hatched_map)
+
+        return Event(instance_map=hatched_map,
+                     parent=self.base_event,
+                     time=time,
+                     merged=self.merged)
 
 
 class SubPlan(object):
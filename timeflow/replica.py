@@ -0,0 +1,348 @@
+"""Copying the history of a timeline to followers
+
+A :class:`ChangeFeed` turns each commit of a leader timeline into a record
+holding the commit's sequence number, its time, the id of the feed, and the
+change to each flow it touched; for structures, the diff hatched by the plan. Records are kept in
+a bounded backlog, read from a cursor with :meth:`ChangeFeed.read`, and sent
+to attached transports as they are made.
+
+A :class:`ReplicaTimeLine` commits the records it receives from a transport,
+and serves reads from its own events. It stores its history in a
+:class:`store.HistoryStore`, so that after a restart it continues from the
+last record it applied::
+
+  # leader
+  feed = ChangeFeed(tl)
+  feed.attach(transport)
+
+  # follower
+  replica = ReplicaTimeLine(HistoryStore('replica/'), transport)
+  replica.sync(timeout=1)
+  flow.read_at(replica.HEAD)
+
+Flows are matched by name; see :class:`serialize.FlowRegistry`. Flows not
+named on the follower are created from their class on their first change,
+which only works for classes constructible without arguments. Other flows,
+such as :class:`BridgeMappingFlow`, have to be registered under their name on
+the follower beforehand. Derived flows are followed as :class:`SimpleFlow`
+flows holding their values; see :mod:`timeflow.observe`.
+
+Sequence numbers start from 0 with each feed, so a replica follows a single
+feed: it records the id of the first feed it applies, and rejects records
+from others. A restarted leader needs new replicas.
+
+Transports have a ``send(record)`` method, used by the feed, and a
+``receive(timeout)`` method, used by the replica, returning the records
+received within `timeout` seconds (forever if None) as a list. Records are
+bytes. :class:`QueueTransport`, :class:`PipeTransport` and
+:class:`FileTransport` are included.
+
+"""
+import collections
+import itertools
+import multiprocessing
+import os
+import queue as _queue
+import threading
+import time as _time
+import uuid
+
+from .event import NullEvent
+from .linked_mapping import LinkedMapping
+from .merge import _changes
+from .serialize import (FlowRegistry, instance_change, stage_change,
+                        pack_record, iter_records, read_payload)
+from .store import StoredTimeLine
+from .subscribe import changed_flows
+
+COMMIT = 1
+
+FEED_ID_NAME = 'feed-id'
+
+
+class ChangeFeed(object):
+    """Records of the commits of `timeline`, see the module docs
+
+    If `timeline` already has a history, the first record holds the state of
+    its HEAD. Only the last `backlog` records are kept. The feed stops when
+    it is no longer referenced.
+
+    Each feed has a random :attr:`feed_id`, held by its records.
+
+    Values in flows have to be picklable. Flows are identified by name through
+    `registry`; see :class:`serialize.FlowRegistry`.
+
+    """
+
+    def __init__(self, timeline, registry=None, backlog=10000):
+        self.registry = registry if registry is not None else FlowRegistry()
+        self.backlog = backlog
+        self.feed_id = uuid.uuid4().hex
+
+        self._records = collections.deque(maxlen=backlog)
+        self._first_seq = 0     # sequence number of the oldest record kept
+        self._transports = []
+        self._lock = threading.RLock()
+
+        with timeline._commit_lock:
+            if len(timeline.HEAD.instance):
+                self.committed(NullEvent(), timeline.HEAD)
+            timeline._subscriptions.add(self)
+
+    def __len__(self):
+        """Number of records made so far"""
+        return self._first_seq + len(self._records)
+
+    def committed(self, parent, event, flows=None):
+        """Record the change from `parent` to `event`; called by the timeline
+
+        :param flows:   the flows changed, as from :func:`subscribe.changed_flows`.
+
+        """
+        if flows is None:
+            flows = changed_flows(parent, event)
+        if flows is None:
+            flows = _changes(LinkedMapping, parent.instance, event.instance)
+
+        changes = []
+        for flow in flows:
+            change = instance_change(flow, parent.get_flow_instance(flow),
+                                     event.get_flow_instance(flow))
+            if change is not None:
+                changes.append((self.registry.name(flow), change))
+
+        with self._lock:
+            record = pack_record(COMMIT, len(self), event.time,
+                                 (self.feed_id, changes))
+            if len(self._records) == self.backlog:
+                self._first_seq += 1
+            self._records.append(record)
+            for transport in self._transports:
+                transport.send(record)
+
+    def read(self, cursor=0):
+        """Records from sequence number `cursor` on
+
+        :raises IndexError:     if some of them are no longer kept.
+
+        """
+        with self._lock:
+            if cursor < self._first_seq:
+                raise IndexError('records before {} are no longer kept'.format(
+                    self._first_seq))
+            return list(itertools.islice(
+                self._records, cursor - self._first_seq, None))
+
+    def attach(self, transport, cursor=None):
+        """Send the records from now on to `transport`
+
+        :param cursor:  if given, first send the kept records from this
+                        sequence number on, e.g. the :attr:`ReplicaTimeLine.cursor`
+                        of a restarted follower.
+
+        """
+        with self._lock:
+            if cursor is not None:
+                for record in self.read(cursor):
+                    transport.send(record)
+            self._transports.append(transport)
+
+    def detach(self, transport):
+        with self._lock:
+            self._transports.remove(transport)
+
+
+class ReplicaTimeLine(StoredTimeLine):
+    """TimeLine following the records of a :class:`ChangeFeed`
+
+    Commits are only made by :meth:`sync` and :meth:`apply`, which keep the
+    sequence numbers of `store` equal to those of the feed. Records already
+    applied are skipped, so a restarted replica may be sent records from
+    before its :attr:`cursor`. The id of the feed is kept in the directory of
+    `store`, as :attr:`feed_id`.
+
+    :param store:       :class:`store.HistoryStore` of the replica; its
+                        registry names the flows.
+    :param transport:   transport records are received from.
+
+    """
+
+    def __init__(self, store, transport, horizon=1000, **kwargs):
+        HEAD = store.event(len(store) - 1) if len(store) else None
+        StoredTimeLine.__init__(self, store, horizon=horizon, HEAD=HEAD, **kwargs)
+        self.transport = transport
+
+        self._feed_id_path = os.path.join(store.path, FEED_ID_NAME)
+        self.feed_id = None     # of the feed followed, once a record is applied
+        if os.path.exists(self._feed_id_path):
+            with open(self._feed_id_path) as fp:
+                self.feed_id = fp.read()
+
+    @property
+    def cursor(self):
+        """Sequence number of the next record to apply"""
+        return len(self.store)
+
+    def commit(self, plan, time=None):
+        raise TypeError('{} follows a change feed, and cannot be committed '
+                        'to'.format(self))
+
+    def apply(self, record):
+        """Commit `record`, unless already applied
+
+        :returns:           the number of commits made, 0 or 1.
+        :raises ValueError: if records before `record` are missing, or if it
+                            is from another feed than those applied before.
+
+        """
+        applied = 0
+        for kind, seq, time, offset, end in iter_records(record):
+            feed_id, changes = read_payload(record, offset, end)
+            if feed_id != self.feed_id:
+                self._follow(feed_id)
+
+            if seq < self.cursor:
+                continue
+            elif seq > self.cursor:
+                raise ValueError('records {} to {} are missing'.format(
+                    self.cursor, seq - 1))
+
+            plan = self.new_plan()
+            try:
+                for name, change in changes:
+                    stage_change(self.store.registry, plan, name, change)
+            except Exception:
+                self.cancel(plan)
+                raise
+            StoredTimeLine.commit(self, plan, time)
+            applied += 1
+        return applied
+
+    def _follow(self, feed_id):
+        if self.feed_id is not None:
+            raise ValueError('record from feed {}, but {} follows feed {}; a '
+                             'restarted leader needs a new replica'.format(
+                                 feed_id, self, self.feed_id))
+
+        with open(self._feed_id_path, 'w') as fp:
+            fp.write(feed_id)
+            fp.flush()
+            os.fsync(fp.fileno())
+        self.feed_id = feed_id
+
+    def sync(self, timeout=0):
+        """Apply the records received within `timeout` seconds
+
+        :returns: the number of commits made.
+
+        """
+        return sum(self.apply(record) for record in self.transport.receive(timeout))
+
+
+# Transports
+# ##########
+
+class QueueTransport(object):
+    """Transport through a queue, by default a new :class:`queue.Queue`
+
+    A :class:`multiprocessing.Queue` may be given to reach other processes.
+
+    """
+
+    def __init__(self, queue=None):
+        self.queue = queue if queue is not None else _queue.Queue()
+
+    def send(self, record):
+        self.queue.put(record)
+
+    def receive(self, timeout=0):
+        try:
+            records = [self.queue.get(timeout=timeout)]
+        except _queue.Empty:
+            return []
+        try:
+            while True:
+                records.append(self.queue.get_nowait())
+        except _queue.Empty:
+            return records
+
+
+class PipeTransport(object):
+    """Transport through a :mod:`multiprocessing` connection
+
+    Sending blocks while the pipe is full, holding up commits to the leader
+    until the follower catches up. Receiving raises :class:`EOFError` once the
+    other end is closed.
+
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @classmethod
+    def pair(cls):
+        """Transports for the leader and the follower ends of a new pipe"""
+        receiving, sending = multiprocessing.Pipe(duplex=False)
+        return cls(sending), cls(receiving)
+
+    def send(self, record):
+        self.connection.send_bytes(record)
+
+    def receive(self, timeout=0):
+        records = []
+        if self.connection.poll(timeout):
+            records.append(self.connection.recv_bytes())
+            while self.connection.poll(0):
+                records.append(self.connection.recv_bytes())
+        return records
+
+    def close(self):
+        self.connection.close()
+
+
+class FileTransport(object):
+    """Transport through the file `path`, appended to and read from the start
+
+    The file holds every record sent, so a follower reading it, even from
+    another process, can start at any time. Receiving polls the file every
+    `poll_interval` seconds while waiting.
+
+    """
+
+    def __init__(self, path, poll_interval=0.01):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.offset = 0         # of the next record to receive
+        self._file = None
+
+    def send(self, record):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        self._file.write(record)
+        self._file.flush()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as fp:
+            fp.seek(self.offset)
+            data = fp.read()
+
+        records = []
+        for kind, seq, time, offset, end in iter_records(data):
+            records.append(data[offset:end])
+        self.offset += sum(len(record) for record in records)
+        return records
+
+    def receive(self, timeout=0):
+        deadline = None if timeout is None else _time.monotonic() + timeout
+        while True:
+            records = self._read()
+            if records or (deadline is not None and _time.monotonic() >= deadline):
+                return records
+            _time.sleep(self.poll_interval)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,226 @@
+"""History retention, between keeping every event and keeping none
+
+A :class:`Retention` drops events from the history of a timeline as they age,
+a few per commit. Events are dropped from the oldest end by unlinking them, as
+:class:`timeline.StepLine` does, or from the middle by :func:`squash_event`,
+which composes their diffs into the next event's.
+
+"""
+from .event import Event
+from .linked_structure import LinkedStructure, squash, squashable
+
+
+# All events of the last hour, hourly ones for the last day, then daily ones;
+# for clocks counting seconds.
+HOURLY_THEN_DAILY = ((60 * 60, 60 * 60), (24 * 60 * 60, 24 * 60 * 60))
+
+
+def only_child(event):
+    """The only referrer of `event`, if it is an event"""
+    referrers = event.referrers
+    if len(referrers) == 1 and isinstance(referrers[0], Event):
+        return referrers[0]
+    return None
+
+
+def squash_event(event):
+    """Drop `event` from between its parent and its only child
+
+    Structures of flows that `event` changed, and that its child changed
+    again, are removed by :func:`linked_structure.squash`; the child's instance
+    map is rebased onto the parent's. The dropped event, and its structures,
+    should not be read afterwards.
+
+    :returns: whether the event was dropped; it is not if it has no parent
+              event, if anything other than its one child refers to it (e.g.
+              a timeline, or a fork), or if its structures cannot be
+              squashed, e.g. while a plan is based on it.
+
+    """
+    _parent = event.parent
+    child = only_child(event)
+    if not isinstance(_parent, Event) or child is None:
+        return False
+
+    parent_map = _parent.instance
+    instance_map = event.instance
+    child_map = child.instance
+
+    if instance_map is not parent_map and child_map is not instance_map:
+        if (child_map.parent() is not instance_map
+                or instance_map.parent() is not parent_map
+                or squashable(instance_map) is not child_map):
+            return False
+
+        # structures changed by both `event` and its child
+        instances = []
+        child_diff = child_map.diff_parent
+        for flow, (parent_instance, instance) in instance_map.diff_parent.items():
+            if flow not in child_diff:
+                continue
+            child_instance = child_diff[flow][1]
+            if (isinstance(instance, LinkedStructure)
+                    and isinstance(child_instance, LinkedStructure)
+                    and child_instance.parent() is instance
+                    and instance.parent() is parent_instance):
+                if squashable(instance) is not child_instance:
+                    return False
+                instances.append(instance)
+
+        for instance in instances:
+            squash(instance)
+        squash(instance_map)
+
+    child.parent = _parent
+    _parent.referrers = tuple(child if referrer is event else referrer
+                              for referrer in _parent.referrers)
+    event.referrers = ()
+    event.parent = None
+    return True
+
+
+class Retention(object):
+    """Policy for dropping old events from a timeline's history
+
+    Events are kept while any rule keeps them:
+
+    :param int keep_last:   the latest `keep_last` events.
+    :param max_age:         events less than `max_age` older than HEAD.
+    :param thinning:        sequence of ``(age, interval)``; of events at least
+                            `age` older than HEAD, one per `interval` is kept,
+                            the oldest. See :data:`HOURLY_THEN_DAILY`.
+
+    Without thinning, the oldest end of the history is dropped once it is
+    outside both `keep_last` and `max_age`; with neither, it is kept. With
+    thinning, events outside both are thinned out instead. Ages and intervals
+    are in units of the timeline's clock.
+
+    At most `max_steps` events are looked at per commit, so commits are never
+    held up for long; a backlog, e.g. after a burst of commits, is worked off
+    over later commits. Forks, and events that other timelines are at, are
+    kept.
+
+    A Retention keeps track of one timeline; pass it as the `retention`
+    parameter of :class:`timeline.TimeLine`.
+
+    """
+
+    def __init__(self, keep_last=None, max_age=None, thinning=(), max_steps=16):
+        self.keep_last = keep_last
+        self.max_age = max_age
+        self.thinning = tuple(sorted(thinning, reverse=True))
+        self.max_steps = max_steps
+
+        self._oldest = None     # oldest event kept
+        self._count = 0         # events from `_oldest` to HEAD
+        self._latest = None     # oldest of the latest `keep_last` events
+        self._n_latest = 0      # events from `_latest` to HEAD
+        self._cursors = []      # newest event thinned so far, by thinning rule
+        self._forks = {}        # id of a fork -> its child on this timeline
+
+    def __len__(self):
+        return self._count
+
+    def start(self, event):
+        """Track history from `event` on; called by the timeline"""
+        self._oldest = event
+        self._count = 1
+        if self.keep_last is not None:
+            self._latest = event
+            self._n_latest = 1
+        self._cursors = [event] * len(self.thinning)
+
+    def committed(self, head):
+        """Called by the timeline after each commit, with the new HEAD"""
+        if self._oldest is None:
+            self.start(head)
+            return
+
+        self._count += 1
+        base = head.parent
+        if sum(isinstance(referrer, Event) for referrer in base.referrers) > 1:
+            self._forks[id(base)] = head
+
+        if self.keep_last is not None:
+            self._n_latest += 1
+            if self._n_latest > self.keep_last:
+                self._latest = self._next(self._latest)
+                self._n_latest -= 1
+
+        steps = self.max_steps
+        steps -= self._truncate(head, steps)
+        for index in range(len(self.thinning)):
+            if steps <= 0:
+                break
+            steps -= self._thin(index, head, steps)
+
+    def _next(self, event):
+        # the child of `event` on this timeline
+        child = only_child(event)
+        if child is None:
+            child = self._forks.get(id(event))
+            if child is None:
+                child = next((referrer for referrer in event.referrers
+                              if isinstance(referrer, Event)), None)
+        return child
+
+    def _outside_window(self, event, head):
+        # Whether `event` is outside both `keep_last` and `max_age`, if set.
+        # The latest `keep_last` events start at `_latest`, and `event` is
+        # never newer than it: the oldest event, or a thinning cursor.
+        if self.keep_last is not None and event is self._latest:
+            return False
+        return self.max_age is None or head.time - event.time >= self.max_age
+
+    def _truncate(self, head, steps):
+        if self.thinning or (self.keep_last is None and self.max_age is None):
+            return 0
+
+        taken = 0
+        while taken < steps and self._outside_window(self._oldest, head):
+            taken += 1
+            child = self._next(self._oldest)
+            if child is None or child is head:
+                break
+
+            oldest = self._oldest
+            child.forget_parent()
+            if oldest.parent is not None:
+                # otherwise it lives on in a cycle with its parent, until
+                # collected; if it dies after `child`, the core is moved back
+                oldest.forget_parent()
+
+            self._forks.pop(id(oldest), None)
+            self._moved(oldest, child)
+            self._oldest = child
+            self._count -= 1
+        return taken
+
+    def _thin(self, index, head, steps):
+        age, interval = self.thinning[index]
+        taken = 0
+        while taken < steps:
+            taken += 1
+            cursor = self._cursors[index]
+            candidate = self._next(cursor)
+            if (candidate is None or candidate is head
+                    or head.time - candidate.time < age
+                    or not self._outside_window(cursor, head)
+                    or not self._outside_window(candidate, head)):
+                break
+
+            successor = only_child(candidate)
+            if (candidate.time // interval == cursor.time // interval
+                    and squash_event(candidate)):
+                self._moved(candidate, cursor)
+                if self._forks.get(id(cursor)) is candidate:
+                    self._forks[id(cursor)] = successor
+                self._count -= 1
+            else:
+                self._cursors[index] = candidate
+        return taken
+
+    def _moved(self, event, replacement):
+        # `event` was dropped; cursors on it move to `replacement`
+        self._cursors = [replacement if cursor is event else cursor
+                         for cursor in self._cursors]
@@ -0,0 +1,278 @@
+"""Plain, picklable forms of flows, their changes and events
+
+Used to keep histories outside of memory; see :mod:`timeflow.store`. Flows are
+identified by name, through a :class:`FlowRegistry`.
+
+"""
+import importlib
+import io
+import pickle
+import struct
+import zlib
+
+from .event import Event, NullEvent
+from .flow import SimpleFlow, StructureFlow
+from .linked_mapping import empty_linked_mapping
+from .linked_structure import LinkedStructure, NO_VALUE
+from .snapshot import materialize
+
+
+# kinds of change; see :func:`instance_change`
+DIFF = 'diff'
+STATE = 'state'
+DEFAULT = 'default'
+
+
+def class_path(flow):
+    # derived flows are read back as plain values; their rules are not stored
+    cls = SimpleFlow if flow.derived else type(flow)
+    return '{}:{}'.format(cls.__module__, cls.__qualname__)
+
+
+def import_class(path):
+    module_name, _unused, qualname = path.partition(':')
+    obj = importlib.import_module(module_name)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+class FlowRegistry(object):
+    """Names flows, so that they can be identified across processes
+
+    Flows not registered under a name are named in order of first use. Flows
+    read back under an unknown name are created from their class, which then
+    has to be constructible without arguments; others, such as bridge flows,
+    have to be registered before they are read back.
+
+    """
+
+    def __init__(self):
+        self._flows = {}
+        self._names = {}
+
+    def __len__(self):
+        return len(self._flows)
+
+    def __contains__(self, name):
+        return name in self._flows
+
+    def register(self, flow, name):
+        if self._flows.get(name, flow) is not flow:
+            raise ValueError('name {!r} is taken by another flow'.format(name))
+        self._flows[name] = flow
+        self._names[flow] = name
+        return flow
+
+    def name(self, flow):
+        try:
+            return self._names[flow]
+        except KeyError:
+            number = len(self._flows)
+            while 'flow-{}'.format(number) in self._flows:
+                number += 1
+            name = 'flow-{}'.format(number)
+            self.register(flow, name)
+            return name
+
+    def flow(self, name, cls_path=None):
+        """The flow named `name`, created from `cls_path` if not yet known
+
+        :raises TypeError:  if the class of an unknown flow cannot be
+                            constructed without arguments.
+
+        """
+        try:
+            return self._flows[name]
+        except KeyError:
+            if cls_path is None:
+                raise
+        try:
+            flow = import_class(cls_path)()
+        except TypeError as exc:
+            raise TypeError('flow {!r} of class {} cannot be created without '
+                            'arguments, and has to be registered under its '
+                            'name first: {}'.format(name, cls_path, exc))
+        return self.register(flow, name)
+
+
+class _Pickler(pickle.Pickler):
+    # NO_VALUE is compared by identity, so it is pickled by reference
+    def persistent_id(self, obj):
+        return 'NO_VALUE' if obj is NO_VALUE else None
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        if pid == 'NO_VALUE':
+            return NO_VALUE
+        raise pickle.UnpicklingError('unknown persistent id {!r}'.format(pid))
+
+
+def dumps(obj):
+    """Pickle `obj`, which may hold stored diffs; see :func:`loads`"""
+    buf = io.BytesIO()
+    _Pickler(buf, pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buf.getvalue()
+
+
+def loads(data):
+    """Unpickle from :func:`dumps`, keeping the identity of :data:`NO_VALUE`"""
+    return _Unpickler(io.BytesIO(data)).load()
+
+
+# States
+# ######
+# The state of a structure flow is its core (a `dict` or `set`); that of any
+# other flow is its value.
+
+def structure_type(flow):
+    """LinkedStructure subclass of the instances of a StructureFlow"""
+    return type(flow.default.egg()).immutable_variant
+
+
+def flow_state(flow, instance):
+    if isinstance(flow, StructureFlow):
+        return structure_type(flow).core_type(materialize(instance))
+    else:
+        return instance
+
+
+def instance_change(flow, parent_instance, instance):
+    """Change of `flow` from `parent_instance` to `instance`
+
+    One of ``(DIFF, changes)``, when `instance` was hatched or staged from
+    `parent_instance`; ``(STATE, class path, state)``; or ``(DEFAULT,)``.
+    None if there is no change. Changes from the default are states, so that
+    flows can be created from their first change when read back. Derived flows
+    only have states, as their defaults are not those of the SimpleFlow they
+    are read back as.
+
+    """
+    if instance is parent_instance:
+        return None
+    elif flow.derived:
+        return (STATE, class_path(flow), instance)
+    elif instance is flow.default:
+        return (DEFAULT,)
+
+    flush = getattr(instance, 'flush', None)
+    if flush is not None:
+        flush()
+
+    if (isinstance(instance, LinkedStructure)
+            and instance.parent() is parent_instance
+            and parent_instance is not flow.default
+            and instance.diff_parent is not None):
+        return (DIFF, instance._changes(instance.diff_parent))
+    else:
+        return (STATE, class_path(flow), flow_state(flow, instance))
+
+
+def apply_change(registry, states, name, change):
+    """Apply a change from :func:`instance_change` to `states`, by flow name
+
+    States are mutated in place.
+
+    """
+    kind = change[0]
+    if kind == DIFF:
+        flow = registry.flow(name)
+        structure_type(flow)._apply_changes(states[name], change[1])
+    elif kind == STATE:
+        registry.flow(name, change[1])
+        states[name] = change[2]
+    elif kind == DEFAULT:
+        states.pop(name, None)
+    else:
+        raise ValueError('unknown change {!r}'.format(kind))
+
+
+def stage_change(registry, plan, name, change):
+    """Stage a change from :func:`instance_change` in `plan`, by flow name"""
+    kind = change[0]
+    flow = registry.flow(name, change[1] if kind == STATE else None)
+    state = change[2] if kind == STATE else None
+
+    if not isinstance(flow, StructureFlow):
+        plan.set_flow_instance(flow, flow.default if kind == DEFAULT else state)
+        return
+
+    staged = flow.at(plan)
+    if kind == DIFF:
+        changes = change[1]
+    else:
+        state = state if kind == STATE else ()
+        # new contents, and the keys or elements to remove; fits either type
+        changes = (state, tuple(k for k in staged if k not in state))
+    structure_type(flow)._apply_changes(staged, changes)
+
+
+def instance_from_state(flow, state):
+    if not isinstance(flow, StructureFlow):
+        return state
+    elif not state:
+        return flow.default
+
+    egg = flow.default.egg()
+    egg.update(state)
+    return egg.hatch()
+
+
+def event_from_states(registry, states, time):
+    """A parentless event holding `states`, by flow name"""
+    instance_map = empty_linked_mapping.egg()
+    for name, state in states.items():
+        flow = registry.flow(name)
+        instance = instance_from_state(flow, state)
+        if instance is not flow.default:
+            instance_map[flow] = instance
+
+    return Event(instance_map=instance_map.hatch(), parent=NullEvent(), time=time)
+
+
+# Records
+# #######
+# A record is a header followed by a pickled payload. The header holds the
+# record's kind, sequence number and time, and the payload's length and CRC.
+
+_HEADER = struct.Struct('<BBQ8sII')
+_INT_TIME = struct.Struct('<q')
+_FLOAT_TIME = struct.Struct('<d')
+
+HEADER_SIZE = _HEADER.size
+
+
+def pack_record(kind, seq, time, obj):
+    payload = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    if isinstance(time, float):
+        time_kind, time_bytes = 1, _FLOAT_TIME.pack(time)
+    else:
+        time_kind, time_bytes = 0, _INT_TIME.pack(time)
+
+    return _HEADER.pack(kind, time_kind, seq, time_bytes,
+                        len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_records(buf, offset=0, end=None):
+    """Yield ``(kind, seq, time, offset, end)`` for each record in `buf`
+
+    `offset` and `end` delimit the record. Stops at the first truncated or
+    corrupt record.
+
+    """
+    end = len(buf) if end is None else end
+    while offset + HEADER_SIZE <= end:
+        kind, time_kind, seq, time_bytes, length, crc = _HEADER.unpack_from(buf, offset)
+        record_end = offset + HEADER_SIZE + length
+        if (record_end > end
+                or zlib.crc32(buf[offset + HEADER_SIZE:record_end]) != crc):
+            return
+
+        time = (_FLOAT_TIME if time_kind else _INT_TIME).unpack(time_bytes)[0]
+        yield kind, seq, time, offset, record_end
+        offset = record_end
+
+
+def read_payload(buf, offset, end):
+    return pickle.loads(buf[offset + HEADER_SIZE:end])
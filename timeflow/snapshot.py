@@ -0,0 +1,207 @@
+"""Materialized snapshots, and isolated views
+
+Iterating a LinkedStructure looks up every key through its base chain. A
+snapshot instead copies the core once and applies the diffs on the way back,
+giving a plain `dict` or `frozenset`.
+
+Committing moves cores between structures in place (see
+:data:`linked_structure.core_moves`), so reading a flow while another thread
+commits can see a half-moved core. A flow with :attr:`Flow.isolated_reads`
+set instead returns read-only views from :meth:`Flow.read_at`, whose reads
+retry until no core moved meanwhile. Readers never lock, and a view keeps
+showing the flow as it was at its event, whatever is committed later.
+
+"""
+
+import collections
+import threading
+import weakref
+
+from .linked_structure import LinkedStructure, copy_core, consistent_read
+from .event import Event
+
+
+def materialize(instance):
+    """A plain copy of `instance`, built in one pass
+
+    :param instance:    a flow instance; LinkedStructures are copied into
+                        their :attr:`snapshot_type`, other values are returned
+                        as is.
+
+    """
+    if isinstance(instance, (IsolatedMapping, IsolatedSet)):
+        return instance.snapshot()
+    elif not isinstance(instance, LinkedStructure):
+        try:
+            return instance.snapshot_type()   # empty variants
+        except AttributeError:
+            return instance
+
+    if type(instance) is instance.mutable_variant:
+        instance.flush()
+
+    result = copy_core(instance)
+    if type(result) is instance.snapshot_type:
+        return result
+    else:
+        return instance.snapshot_type(result)
+
+
+class IsolatedMapping(collections.Mapping):
+    """Read-only view of a hatched LinkedMapping, safe during commits"""
+
+    __slots__ = ('instance',)
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    def __getitem__(self, k):
+        return consistent_read(self.instance.__getitem__, k)
+
+    def get(self, k, default=None):
+        return consistent_read(self.instance.get, k, default)
+
+    def __contains__(self, k):
+        return consistent_read(self.instance.__contains__, k)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        return len(self.instance)
+
+    def snapshot(self):
+        """A plain copy, as from :func:`snapshot.materialize`"""
+        return consistent_read(materialize, self.instance)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.snapshot())
+
+
+class IsolatedSet(collections.Set):
+    """Read-only view of a hatched LinkedSet, safe during commits"""
+
+    __slots__ = ('instance',)
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    def __contains__(self, k):
+        return consistent_read(self.instance.__contains__, k)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        return len(self.instance)
+
+    snapshot = IsolatedMapping.snapshot
+    __repr__ = IsolatedMapping.__repr__
+
+
+def isolated(instance):
+    """A view of `instance` for reads during commits
+
+    Values other than hatched linked structures are returned as is.
+
+    """
+    if (not isinstance(instance, LinkedStructure)
+            or type(instance) is instance.mutable_variant):
+        return instance
+    elif isinstance(instance, collections.Mapping):
+        return IsolatedMapping(instance)
+    else:
+        return IsolatedSet(instance)
+
+
+class SnapshotCache(object):
+    """Size-bounded LRU cache of snapshots, keyed by (flow, event)
+
+    Entries are dropped when their event is garbage collected. Cached
+    snapshots are shared between callers, so must not be mutated.
+
+    :param int maxsize:     maximum number of snapshots kept.
+
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._snapshots = collections.OrderedDict()   # (flow, id(event)) -> snapshot
+        self._event_keys = {}       # id(event) -> (weakref to event, set of keys)
+        self._lock = threading.RLock()   # weakref callbacks can run inside `get`
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+            self._event_keys.clear()
+
+    def get(self, flow, event_like):
+        """Snapshot of `flow` at `event_like`; only events are cached"""
+        if not isinstance(event_like, Event):
+            return materialize(flow.read_at(event_like))
+
+        key = (flow, id(event_like))
+        with self._lock:
+            try:
+                snapshot = self._snapshots[key]
+            except KeyError:
+                pass
+            else:
+                self._snapshots.move_to_end(key)
+                self.hits += 1
+                return snapshot
+
+        snapshot = materialize(flow.read_at(event_like))
+
+        with self._lock:
+            self.misses += 1
+            self._snapshots[key] = snapshot
+            self._register(event_like, key)
+
+            while len(self._snapshots) > self.maxsize:
+                self._discard(self._snapshots.popitem(last=False)[0])
+
+        return snapshot
+
+    def _register(self, event, key):
+        event_id = id(event)
+        try:
+            _unused, keys = self._event_keys[event_id]
+        except KeyError:
+            keys = set()
+            self._event_keys[event_id] = (
+                weakref.ref(event, self._make_callback(event_id)), keys)
+        keys.add(key)
+
+    def _make_callback(self, event_id):
+        weak_self = weakref.ref(self)
+
+        def _drop_event(unused_):
+            _self = weak_self()
+            if _self is None:
+                return
+            with _self._lock:
+                _unused, keys = _self._event_keys.pop(event_id, (None, ()))
+                for key in keys:
+                    _self._snapshots.pop(key, None)
+
+        return _drop_event
+
+    def _discard(self, key):
+        event_id = key[1]
+        try:
+            _unused, keys = self._event_keys[event_id]
+        except KeyError:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._event_keys[event_id]
+
+
+snapshot_cache = SnapshotCache()
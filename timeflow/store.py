@@ -0,0 +1,294 @@
+"""Append-only history of a timeline, on disk
+
+A :class:`HistoryStore` keeps the commits of a :class:`StoredTimeLine` in
+segment files. Only recent events are kept in memory; older ones are rebuilt
+from the store when read.
+
+"""
+import bisect
+import collections
+import mmap
+import os
+import threading
+
+from .event import Event
+from .timeline import TimeLine
+from .serialize import (FlowRegistry, instance_change, apply_change,
+                        flow_state, class_path, event_from_states,
+                        pack_record, iter_records, read_payload)
+
+# record kinds
+COMMIT = 1
+SNAPSHOT = 2
+
+SEGMENT_NAME = 'segment-{:08d}.tfs'
+
+
+class Segment(object):
+    """A segment file, appended to through a file and read through an mmap"""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._file = open(path, 'ab')
+        self._map = None
+
+    def append(self, record):
+        offset = self.size
+        self._file.write(record)
+        self._file.flush()
+        self.size += len(record)
+        return offset
+
+    def truncate(self, size):
+        self._file.truncate(size)
+        self.size = size
+        self._unmap()
+
+    def view(self, end=None):
+        """mmap of the segment, covering at least its first `end` bytes
+
+        By default, everything appended so far. The map is only replaced when
+        it is too short, so reads of older records do not remap it.
+
+        """
+        end = self.size if end is None else end
+        if self._map is None or len(self._map) < end:
+            self._unmap()
+            with open(self.path, 'rb') as fp:
+                self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _unmap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def close(self):
+        self._unmap()
+        self._file.close()
+
+
+class HistoryStore(object):
+    """Commits of a timeline, in segment files in the directory `path`
+
+    Each commit is one record holding the changes to its staged flows. Every
+    `snapshot_every` commits, the state of every flow is recorded as well, so
+    that reading a commit, or reopening the store, replays at most
+    `snapshot_every` commits.
+
+    Values in flows have to be picklable. Flows are identified by name through
+    `registry`; see :class:`serialize.FlowRegistry`.
+
+    :param path:            directory of the store; created if missing.
+    :param segment_size:    size in bytes after which a new segment is started.
+    :param cache_size:      number of events read from the store to keep.
+
+    """
+
+    def __init__(self, path, registry=None, snapshot_every=1000,
+                 segment_size=64 * 2 ** 20, cache_size=16):
+        self.path = path
+        self.registry = registry if registry is not None else FlowRegistry()
+        self.snapshot_every = snapshot_every
+        self.segment_size = segment_size
+        self.cache_size = cache_size
+
+        self._segments = []
+        self._times = []        # time of each commit, by sequence number
+        self._commits = []      # (segment number, offset, end) of each commit
+        self._snapshots = []    # sequence numbers of snapshots
+        self._snapshot_locations = []
+        self._events = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._scan()
+
+    def _scan(self):
+        names = sorted(name for name in os.listdir(self.path)
+                       if name.startswith('segment-'))
+        for number, name in enumerate(names):
+            last = number == len(names) - 1
+            segment = Segment(os.path.join(self.path, name))
+            self._segments.append(segment)
+
+            end = 0
+            if segment.size:
+                for kind, seq, time, offset, end in iter_records(segment.view()):
+                    if kind == COMMIT:
+                        self._times.append(time)
+                        self._commits.append((number, offset, end))
+                    elif kind == SNAPSHOT:
+                        self._snapshots.append(seq)
+                        self._snapshot_locations.append((number, offset, end))
+
+            if end < segment.size:
+                if not last:
+                    # only the last segment may have been written to when
+                    # interrupted; anything else is corruption
+                    raise ValueError('corrupt record at offset {} of {}'.format(
+                        end, segment.path))
+                # torn write at the tail of the last segment
+                segment.truncate(end)
+
+    def __len__(self):
+        return len(self._times)
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+
+    # Writing
+    # #######
+
+    def _write(self, kind, seq, time, obj):
+        record = pack_record(kind, seq, time, obj)
+        if not self._segments or self._segments[-1].size >= self.segment_size:
+            self._segments.append(Segment(os.path.join(
+                self.path, SEGMENT_NAME.format(len(self._segments)))))
+
+        offset = self._segments[-1].append(record)
+        return len(self._segments) - 1, offset, offset + len(record)
+
+    def append(self, plan, event):
+        """Record `event`, just committed from `plan`
+
+        :returns: the sequence number of the commit.
+
+        """
+        base_event = plan.base_event
+        changes = []
+        for flow in plan.stage:
+            change = instance_change(flow, base_event.get_flow_instance(flow),
+                                     event.get_flow_instance(flow))
+            if change is not None:
+                changes.append((self.registry.name(flow), change))
+
+        with self._lock:
+            seq = len(self._times)
+            self._commits.append(self._write(COMMIT, seq, event.time, changes))
+            self._times.append(event.time)
+
+            if (seq + 1) % self.snapshot_every == 0:
+                self._snapshot(seq, event)
+
+        return seq
+
+    def _snapshot(self, seq, event):
+        states = dict(
+            (self.registry.name(flow),
+             (class_path(flow), flow_state(flow, instance)))
+            for flow, instance in event.instance.items())
+
+        self._snapshot_locations.append(self._write(SNAPSHOT, seq, event.time, states))
+        self._snapshots.append(seq)
+
+    # Reading
+    # #######
+
+    def _read(self, location):
+        number, offset, end = location
+        return read_payload(self._segments[number].view(end), offset, end)
+
+    def states_at(self, seq):
+        """States of the flows after commit `seq`, by flow name"""
+        if not 0 <= seq < len(self._times):
+            raise IndexError('no commit {}'.format(seq))
+
+        with self._lock:
+            states = {}
+            start = 0
+            index = bisect.bisect_right(self._snapshots, seq) - 1
+            if index >= 0:
+                for name, (cls_path, state) in self._read(
+                        self._snapshot_locations[index]).items():
+                    self.registry.flow(name, cls_path)
+                    states[name] = state
+                start = self._snapshots[index] + 1
+
+            for location in self._commits[start:seq + 1]:
+                for name, change in self._read(location):
+                    apply_change(self.registry, states, name, change)
+
+        return states
+
+    def event(self, seq):
+        """Event after commit `seq`, rebuilt from the store
+
+        Rebuilt events have no parent event. The last `cache_size` are kept.
+
+        """
+        with self._lock:
+            try:
+                self._events[seq] = event = self._events.pop(seq)
+                return event
+            except KeyError:
+                pass
+
+            event = event_from_states(self.registry, self.states_at(seq),
+                                      self._times[seq])
+            self._events[seq] = event
+            while len(self._events) > self.cache_size:
+                self._events.popitem(last=False)
+            return event
+
+    def seq_at(self, time):
+        """Sequence number of the last commit at or before `time`"""
+        index = bisect.bisect_right(self._times, time)
+        if index == 0:
+            raise ValueError("requested time too early in timeline")
+        return index - 1
+
+    def timeline(self, horizon=1000, **kwargs):
+        """A :class:`StoredTimeLine` continuing the stored history"""
+        if self._times:
+            HEAD = self.event(len(self._times) - 1)
+        else:
+            HEAD = None
+        return StoredTimeLine(self, horizon=horizon, HEAD=HEAD, **kwargs)
+
+
+class StoredTimeLine(TimeLine):
+    """TimeLine recording its commits in a :class:`HistoryStore`
+
+    Only the latest `horizon` events stay linked in memory; older events are
+    evicted by unlinking them, and :meth:`event_at` rebuilds them from the
+    store. Obtain one from :meth:`HistoryStore.timeline`.
+
+    """
+
+    def __init__(self, store, horizon=1000, HEAD=None, **kwargs):
+        TimeLine.__init__(self, HEAD=HEAD, **kwargs)
+        self.store = store
+        self.horizon = horizon
+
+        # sequence number of the oldest event kept in memory, and the events
+        self._first_seq = len(store) - 1 if isinstance(HEAD, Event) else len(store)
+        self._recent = collections.deque([HEAD] if isinstance(HEAD, Event) else [])
+
+    def commit(self, plan, time=None):
+        # events are stored and evicted in the order they are committed
+        with self._commit_lock:
+            event = TimeLine.commit(self, plan, time)
+            self.store.append(plan, event)
+
+            self._recent.append(event)
+            if len(self._recent) > self.horizon:
+                evicted = self._recent.popleft()
+                if evicted.parent is not None:
+                    # the initial NullEvent, which refers back to it; the evicted
+                    # event must die before its child's structures do, or the
+                    # cores move back to its own
+                    evicted.forget_parent()
+                self._recent[0].forget_parent()
+                self._first_seq += 1
+            return event
+
+    def event_at(self, time):
+        seq = self.store.seq_at(time)
+        if seq >= self._first_seq:
+            return TimeLine.event_at(self, time)
+        else:
+            return self.store.event(seq)
@@ -0,0 +1,175 @@
+"""Pushing the changes of each commit to asyncio consumers
+
+A :class:`Subscription`, from :meth:`TimeLine.subscribe`, is an asynchronous
+iterator over the changes to one flow, one :class:`Change` per commit::
+
+  async for change in tl.subscribe(flow, keys={'price'}):
+      send(change.diff)
+
+Diffs are taken from the `diff_parent` of the hatched structures, so their
+cost depends on the size of the change, not of the flow. Commits may come
+from any thread. Consumers that fall behind do not queue up without bound:
+once `maxsize` changes are waiting, further changes are merged into the last
+one, which then holds the net diff of several commits.
+
+"""
+import asyncio
+import collections
+import threading
+
+from .flow import StructureFlow
+from .linked_mapping import LinkedMapping
+from .linked_structure import LinkedStructure, compose_diffs
+from .merge import _changes
+from .serialize import structure_type
+
+
+class Change(collections.namedtuple('Change', 'event diff commits')):
+    """The change to a flow up to `event`, over `commits` commits
+
+    `diff` maps keys (or elements) to items in the format of
+    :func:`linked_structure.diff`. For flows that are not structures, it maps
+    None to ``(old value, new value)``.
+
+    """
+    __slots__ = ()
+
+
+def _structure_type(flow):
+    if isinstance(flow, StructureFlow):
+        return structure_type(flow)
+    return LinkedMapping
+
+
+def flow_diff(flow, parent_instance, instance):
+    """The diff of `flow` from `parent_instance` to `instance`, as a dict
+
+    Taken from `instance.diff_parent` when `instance` was hatched from
+    `parent_instance`.
+
+    """
+    if instance is parent_instance:
+        return {}
+    elif not isinstance(flow, StructureFlow):
+        return {None: (parent_instance, instance)}
+    elif (isinstance(instance, LinkedStructure)
+          and instance.parent() is parent_instance
+          and instance.diff_parent is not None):
+        return dict(instance.diff_parent)
+    else:
+        return _changes(structure_type(flow), parent_instance, instance)
+
+
+def changed_flows(parent, event):
+    """Flows whose instances differ between the events `parent` and `event`
+
+    Read from the diff of the instance maps if there is one; otherwise None,
+    meaning any flow may have changed.
+
+    """
+    instance_map = event.instance
+    if instance_map is parent.instance:
+        return ()
+    elif (isinstance(instance_map, LinkedStructure)
+          and instance_map.parent() is parent.instance
+          and instance_map.diff_parent is not None):
+        return instance_map.diff_parent
+    return None
+
+
+class Subscription(object):
+    """Asynchronous iterator over the changes to `flow`, see the module docs
+
+    :param keys:    if given, only changes to these keys (or elements) are
+                    passed on; commits not touching them are skipped.
+    :param maxsize: number of changes queued before they are coalesced.
+    :param loop:    the event loop of the consumer; by default, the one
+                    running the first iteration.
+
+    Coalesced commits are counted in :attr:`coalesced`. The subscription ends
+    when :meth:`close` is called, and is dropped by its timeline once it is
+    no longer referenced.
+
+    """
+
+    def __init__(self, flow, keys=None, maxsize=64, loop=None):
+        self.flow = flow
+        self.keys = frozenset(keys) if keys is not None else None
+        self.maxsize = maxsize
+        self.coalesced = 0
+
+        self._loop = loop       # bound by the first iteration if None
+        self._structure_type = _structure_type(flow)
+        self._lock = threading.Lock()
+        self._queue = collections.deque()
+        self._waiter = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            with self._lock:
+                if self._queue:
+                    return self._queue.popleft()
+                elif self._closed:
+                    raise StopAsyncIteration
+                if self._loop is None:
+                    self._loop = asyncio.get_running_loop()
+                self._waiter = self._loop.create_future()
+            await self._waiter
+
+    def close(self):
+        """End the iteration, once queued changes have been consumed"""
+        with self._lock:
+            self._closed = True
+            waiting = self._waiter is not None
+        if waiting:
+            self._notify()
+
+    def committed(self, parent, event, flows=None):
+        """Queue the change from `parent` to `event`; called by the timeline
+
+        :param flows:   the flows changed, as from :func:`changed_flows`.
+
+        """
+        if self._closed or (flows is not None and self.flow not in flows):
+            return
+
+        diff = flow_diff(self.flow, parent.read_flow_instance(self.flow),
+                         event.read_flow_instance(self.flow))
+        if self.keys is not None:
+            diff = dict((key, item) for key, item in diff.items()
+                        if key in self.keys)
+        if not diff:
+            return
+
+        with self._lock:
+            queue = self._queue
+            if len(queue) < self.maxsize:
+                queue.append(Change(event, diff, 1))
+            else:
+                last = queue.pop()
+                diff = compose_diffs(self._structure_type, last.diff, diff)
+                if diff:
+                    queue.append(Change(event, diff, last.commits + 1))
+                self.coalesced += 1
+            waiting = self._waiter is not None
+        if waiting:
+            self._notify()
+
+    def _notify(self):
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # the loop is closed; nobody is waiting
+            pass
+
+    def _wake(self):
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
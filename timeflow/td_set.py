@@ -39,8 +39,19 @@ class BridgeSetFlow(SetFlow, collections.Set):
     def __repr__(self):
         return object.__repr__(self) + repr(self.head)
 
+    @staticmethod
+    def _operand(other):
+        return other.head if isinstance(other, BridgeSetFlow) else other
+
     def intersection(self, other):
-        return set(self.head).intersection(set(other))
+        # a mutable set, as always returned here
+        return set(self.head.intersection(self._operand(other)))
 
     def union(self, other):
-        return self.head.__or__(other)
+        return self.head.union(self._operand(other))
+
+    def difference(self, other):
+        return self.head.difference(self._operand(other))
+
+    def symmetric_difference(self, other):
+        return self.head.symmetric_difference(self._operand(other))
@@ -0,0 +1,291 @@
+"""Tiered storage of diffs: recent ones in memory, older ones in SQLite
+
+A :class:`TieredTimeLine` spills the diffs of events that have gone cold to a
+:class:`ColdTier`, leaving a :class:`SpilledDiff` in their place. Reading a
+cold event fetches its diffs back, through a bounded cache.
+
+"""
+import collections
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time as _time
+import weakref
+
+from .timeline import TimeLine
+from .linked_structure import LinkedStructure, replace_diff_parent, walk_to_core
+from .serialize import dumps, loads
+
+
+class SpilledDiff(collections.Mapping):
+    """Read-only `diff_parent` whose contents are in a :class:`ColdTier`
+
+    Contents are fetched on each use, which usually hits the tier's cache. When
+    the stub dies, e.g. once the parent structure is gone, its row is dropped.
+
+    """
+    __slots__ = ('tier', 'rowid', '_len')
+
+    def __init__(self, tier, rowid, length):
+        self.tier = tier
+        self.rowid = rowid
+        self._len = length
+
+    def _contents(self):
+        return self.tier.load(self.rowid)
+
+    def __getitem__(self, k):
+        return self._contents()[k]
+
+    def __contains__(self, k):
+        return k in self._contents()
+
+    def __iter__(self):
+        return iter(self._contents())
+
+    def __len__(self):
+        return self._len
+
+    def items(self):
+        return self._contents().items()
+
+    def values(self):
+        return self._contents().values()
+
+    def __del__(self):
+        self.tier.discard(self.rowid)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.rowid)
+
+
+class ColdTier(object):
+    """Diffs of cold structures, in the SQLite database at `path`
+
+    The database is scratch space for this process: it is emptied when opened,
+    and nothing is synced. Rows are dropped along with the structures holding
+    them. If `path` is None, the database is a temporary file, removed once the
+    tier is closed or dropped.
+
+    :param cache_size:  number of diffs read back to keep in memory.
+
+    Reads of diffs are counted in :attr:`hits`, when served from the cache, and
+    :attr:`misses`, when read from the database.
+
+    """
+
+    def __init__(self, path=None, cache_size=1024):
+        self._remove = None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='timeflow-', suffix='.sqlite')
+            os.close(fd)
+            self._remove = weakref.finalize(self, os.remove, path)
+
+        self.path = path
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._cache = collections.OrderedDict()
+        self._dead = []     # rows of dead stubs, deleted at the next spill
+
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode = OFF')
+        self._db.execute('PRAGMA synchronous = OFF')
+        self._db.execute('CREATE TABLE IF NOT EXISTS diffs '
+                         '(id INTEGER PRIMARY KEY, payload BLOB NOT NULL)')
+        self._db.execute('DELETE FROM diffs')
+
+    def __len__(self):
+        with self._lock:
+            self._delete_dead()
+            return self._db.execute('SELECT COUNT(*) FROM diffs').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+            self._db.close()
+            if self._remove is not None:
+                self._remove()
+
+    def spill(self, linked_structures):
+        """Move the diffs of hatched `linked_structures` into the database
+
+        Structures without a diff, already spilled, or whose diff cannot be
+        pickled, are skipped.
+
+        :returns: the number of diffs spilled.
+
+        """
+        spilled = 0
+        with self._lock:
+            self._delete_dead()
+            self._db.execute('BEGIN')
+            try:
+                for ls in linked_structures:
+                    diff_parent = getattr(ls, 'diff_parent', None)
+                    if not diff_parent or type(diff_parent) is SpilledDiff:
+                        continue
+
+                    try:
+                        payload = dumps(dict(diff_parent))
+                    except (pickle.PicklingError, AttributeError, TypeError):
+                        # unpicklable contents stay in memory
+                        continue
+
+                    rowid = self._db.execute(
+                        'INSERT INTO diffs (payload) VALUES (?)',
+                        (payload,)).lastrowid
+                    replace_diff_parent(ls, SpilledDiff(self, rowid, len(diff_parent)))
+                    spilled += 1
+            finally:
+                self._db.execute('COMMIT')
+        return spilled
+
+    def load(self, rowid):
+        """Contents of a spilled diff"""
+        with self._lock:
+            try:
+                self._cache[rowid] = contents = self._cache.pop(rowid)
+                self.hits += 1
+                return contents
+            except KeyError:
+                pass
+
+            self.misses += 1
+            payload, = self._db.execute(
+                'SELECT payload FROM diffs WHERE id = ?', (rowid,)).fetchone()
+            contents = self._cache[rowid] = loads(payload)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return contents
+
+    def discard(self, rowid):
+        # Called from `SpilledDiff.__del__`, possibly during garbage
+        # collection; the row is deleted later.
+        self._dead.append(rowid)
+
+    def _delete_dead(self):
+        dead, self._dead = self._dead, []
+        if dead:
+            for rowid in dead:
+                self._cache.pop(rowid, None)
+            self._db.executemany('DELETE FROM diffs WHERE id = ?',
+                                 ((rowid,) for rowid in dead))
+
+
+def event_structures(event):
+    """The hatched linked structures of the flows changed at `event`
+
+    Read from the diff of the event's instance map, so that other flows, whose
+    structures are those of earlier events, are not looked up. The instance
+    map itself is left out; its diffs refer to the structures.
+
+    """
+    diff = event.instance.diff_parent
+    if diff is None:
+        return
+    for _parent_instance, instance in diff.values():
+        if isinstance(instance, LinkedStructure):
+            yield instance
+
+
+def needs_spilled(instance):
+    """Whether reading `instance` loads a spilled diff
+
+    True if a diff on the way from `instance` to its core is a
+    :class:`SpilledDiff`.
+
+    """
+    if not isinstance(instance, LinkedStructure):
+        return False
+    return any(type(node.diff_base) is SpilledDiff
+               for node in walk_to_core(instance)[:-1])
+
+
+def hit_rate(hits, misses):
+    return hits / (hits + misses) if hits + misses else None
+
+
+class TieredTimeLine(TimeLine):
+    """TimeLine spilling the diffs of cold events to a :class:`ColdTier`
+
+    An event goes cold once `max_commits` newer events have been committed, or
+    `max_age` seconds after it was committed, whichever comes first. Either,
+    but not both, can be None. Events are held weakly while hot; whatever is
+    dropped meanwhile is never spilled.
+
+    Only the diffs move out of memory. Events, their structures and the index
+    of event times stay, so memory still grows with history; bound it with a
+    :class:`retention.Retention`, or keep history in a :class:`store.HistoryStore`.
+
+    Reads through :meth:`event_at` are counted per tier; see :meth:`stats`.
+
+    """
+
+    def __init__(self, tier, max_commits=1000, max_age=None, **kwargs):
+        TimeLine.__init__(self, **kwargs)
+        if max_commits is None and max_age is None:
+            raise ValueError('events would never go cold; give max_commits '
+                             'or max_age')
+        self.tier = tier
+        self.max_commits = max_commits
+        self.max_age = max_age
+
+        self.hot_hits = 0
+        self.hot_misses = 0
+
+        # (commit time on the monotonic clock, weakref to event), oldest first
+        self._hot = collections.deque()
+
+    def commit(self, plan, time=None):
+        # events join the hot set in the order they are committed
+        with self._commit_lock:
+            event = TimeLine.commit(self, plan, time)
+            self._hot.append((_time.monotonic(), weakref.ref(event)))
+            self.spill_cold()
+            return event
+
+    def spill_cold(self):
+        """Spill events that have gone cold; also called on each commit"""
+        with self._commit_lock:
+            hot = self._hot
+            deadline = (_time.monotonic() - self.max_age
+                        if self.max_age is not None else None)
+
+            while hot and ((self.max_commits is not None
+                            and len(hot) > self.max_commits)
+                           or (deadline is not None and hot[0][0] <= deadline)):
+                event = hot.popleft()[1]()
+                if event is not None:
+                    self.tier.spill(event_structures(event))
+
+    def event_at(self, time):
+        event = TimeLine.event_at(self, time)
+        if any(needs_spilled(instance) for instance in event.instance.values()):
+            self.hot_misses += 1
+        else:
+            self.hot_hits += 1
+        return event
+
+    def stats(self):
+        """Hits, misses and hit rate of reads, by tier
+
+        Reads of events are hits on the ``'memory'`` tier unless reading a
+        structure of the event loads a spilled diff; see :func:`needs_spilled`. Reads of spilled diffs are hits
+        on the ``'cache'`` tier when cached, and otherwise read from the
+        ``'sqlite'`` tier.
+
+        """
+        tier = self.tier
+        return {
+            'memory': {'hits': self.hot_hits, 'misses': self.hot_misses,
+                       'hit_rate': hit_rate(self.hot_hits, self.hot_misses)},
+            'cache': {'hits': tier.hits, 'misses': tier.misses,
+                      'hit_rate': hit_rate(tier.hits, tier.misses)},
+            'sqlite': {'reads': tier.misses},
+        }
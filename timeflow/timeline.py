@@ -1,4 +1,5 @@
 import collections
+import threading
 import uuid
 import operator
 import weakref
@@ -6,8 +7,13 @@ from abc import abstractmethod
 
 import toolz
 
-from .event import Event, NullEvent, _drop_from_tuple, walk_to_fork
+from .event import Event, NullEvent, TimeIndex, _drop_from_tuple, walk_to_fork
 from .plan import Plan
+from .clock import wall_clock
+from .export import export_events, load_events
+from .merge import merge_events
+from .observe import DerivedFlow
+from .subscribe import Subscription, changed_flows
 from .linked_structure import (LinkedStructure, transfer_core, walk_to_core,
                                SELF, PARENT, CHILD)
 
@@ -22,12 +28,63 @@ def referent_linked_structures(event):
 
 
 class TimeLine(object):
+    """
+    :param bool require_single_plan:
+        whether at most one plan may be open at a time. Otherwise plans can be
+        opened concurrently, e.g. from several threads; a plan whose base is no
+        longer HEAD is rebased onto it when committed, unless it conflicts with
+        the changes committed since, see :meth:`Plan.rebase`.
 
-    def __init__(self, HEAD=None, require_single_plan=True):
+    :param linked_structure.Keyframes keyframes:
+        keyframe policy for the events' instance maps, which bounds the cost of
+        looking up flows at old events. Keyframes for the flows themselves are
+        set per flow, via :attr:`StructureFlow.keyframes`.
+
+    :param clock:
+        callable timestamping new events; see :mod:`timeflow.clock`.
+
+    :param linked_structure.Arena arena:
+        owner of the structures of events committed here, which are then kept
+        until released from the arena rather than when events are dropped.
+        Forks of an owned history stay in its arena.
+
+    :param linked_mapping.CompactDiffs compact_diffs:
+        storage policy for the diffs of the events' instance maps. Policies for
+        the flows themselves are set per flow, via
+        :attr:`StructureFlow.compact_diffs`.
+
+    :param retention.Retention retention:
+        policy for dropping old events from this timeline's history, which is
+        otherwise kept for as long as the timeline is.
+
+    """
+
+    def __init__(self, HEAD=None, require_single_plan=True, keyframes=None,
+                 clock=wall_clock, arena=None, compact_diffs=None,
+                 retention=None):
         self.HEAD = HEAD if HEAD is not None else NullEvent()
         self.ref = weakref.ref(self)
         self.HEAD.referrers += (self.ref,)
         self.require_single_plan = require_single_plan
+        self.keyframes = keyframes
+        self.clock = clock
+        if arena is None and isinstance(self.HEAD, Event):
+            # forks stay in the arena of their history, and keep it alive
+            arena_ref = self.HEAD.instance.arena_ref
+            arena = arena_ref.arena if arena_ref is not None else None
+        self.arena = arena
+        self.compact_diffs = compact_diffs
+        self.retention = retention
+        self._commit_lock = threading.RLock()
+        self._subscriptions = weakref.WeakSet()
+        self._derived = []
+
+        # events committed on this timeline, and its initial HEAD
+        self.time_index = TimeIndex()
+        if isinstance(self.HEAD, Event):
+            self.time_index.add(self.HEAD)
+            if retention is not None:
+                retention.start(self.HEAD)
 
         # Set to True when `new_plan` is called, set to False when `commit` is called
         self.has_uncommitted_plan = False
@@ -45,22 +102,149 @@ class TimeLine(object):
         base_event = self.HEAD
         return Plan(base_event, only_flows)
 
-    def commit(self, plan: Plan):
+    def commit(self, plan: Plan, time=None):
+        """Make `plan` the new HEAD
+
+        :param time:    time of the new event, instead of reading the clock.
+
+        :raises plan.ConflictError:
+            if the plan is based on an older event, and conflicts with what
+            was committed since; the plan is left open.
+
+        """
         if self.require_single_plan:
             assert self.has_uncommitted_plan, '{} tried to commit a plan, but there should be no uncommitted plan.'.format(self)
-        assert plan.status == Plan.planning
-        plan.status = Plan.committing
 
-        base_event = plan.base_event
-        assert base_event == self.HEAD
-        self.HEAD = plan.hatch()
+        with self._commit_lock:
+            assert plan.status == Plan.planning
+            if plan.base_event is not self.HEAD:
+                plan.rebase(self.HEAD)
+            plan.status = Plan.committing
 
-        base_event.referrers = _drop_from_tuple(base_event.referrers, self.ref)
-        self.HEAD.referrers += (self.ref,)
+            base_event = plan.base_event
+            # Hatching takes `core_moves` only around each core it moves, so
+            # that commits to other timelines, and isolated reads, do not
+            # wait for the whole hatch.
+            self.HEAD = plan.hatch(keyframes=self.keyframes,
+                                   time=self.clock() if time is None else time,
+                                   arena=self.arena,
+                                   compact_diffs=self.compact_diffs,
+                                   derived=self._derived)
 
-        self.has_uncommitted_plan = False
-        plan.status = Plan.committed
-        return self.HEAD
+            base_event.referrers = _drop_from_tuple(base_event.referrers, self.ref)
+            self.HEAD.referrers += (self.ref,)
+            self.time_index.add(self.HEAD)
+            if self.retention is not None:
+                self.retention.committed(self.HEAD)
+            if self._subscriptions:
+                flows = changed_flows(base_event, self.HEAD)
+                for subscription in list(self._subscriptions):
+                    subscription.committed(base_event, self.HEAD, flows)
+
+            self.has_uncommitted_plan = False
+            plan.status = Plan.committed
+            return self.HEAD
+
+    def subscribe(self, flow, keys=None, maxsize=64, loop=None):
+        """A :class:`subscribe.Subscription` to the changes of `flow`
+
+        Iterate over it with ``async for``, from the event loop `loop`, by
+        default the one iterating first, to get the change made by each commit
+        from now on. Changes to keys other than `keys` are skipped, if given.
+
+        """
+        subscription = Subscription(flow, keys, maxsize, loop)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def derive(self, rule, *inputs, incremental=False, default=None):
+        """A :class:`observe.DerivedFlow` of `rule` over the flows `inputs`
+
+        The flow is recomputed by each commit here that changes one of its
+        inputs. Its value at HEAD is computed now, and committed if it is not
+        `default`; no plan may be open.
+
+        """
+        flow = DerivedFlow(rule, *inputs, incremental=incremental, default=default)
+        with self._commit_lock:
+            value = flow.compute(self.HEAD.instance, NullEvent.instance)
+            if value != default:
+                plan = self.new_plan()
+                flow.set_at(plan, value)
+                self.commit(plan)
+            self._derived.append(flow)
+        return flow
+
+    def merge(self, other, resolver=None, time=None):
+        """Commit the changes made on `other` since it forked from this timeline
+
+        `other` is a timeline or an event. Changes on both sides are found from
+        the fork point, and those made on `other` only are committed here in
+        one event; see :mod:`timeflow.merge`.
+
+        :param resolver:    callable choosing the value of keys changed on both
+                            sides, given a :class:`merge.Conflict`.
+        :param time:        as for :meth:`commit`.
+
+        :raises plan.ConflictError:     on conflicts, if `resolver` is None;
+                                        nothing is committed.
+        :returns: the new HEAD.
+
+        """
+        event = other.HEAD if isinstance(other, TimeLine) else other
+        plan = self.new_plan()
+        try:
+            merge_events(plan, event, resolver)
+        except Exception:
+            self.cancel(plan)
+            raise
+        return self.commit(plan, time)
+
+    def event_at(self, time):
+        """The last event committed at or before `time`
+
+        Only events that are still referenced can be found.
+
+        :raises LookupError:    if that event is no longer referenced, e.g.
+                                dropped by :attr:`retention`.
+
+        """
+        return self.time_index.event_at(time)
+
+    def events_between(self, start, end, inclusive=True):
+        return self.time_index.events_between(start, end, inclusive)
+
+    def export(self, path, registry=None):
+        """Write the event graph around HEAD, forks included, to the file `path`
+
+        See :mod:`timeflow.export`. Flows are named through `registry`, which
+        should be passed to :meth:`load` as well to get the same flows back.
+
+        """
+        with open(path, 'wb') as fp:
+            export_events(self.HEAD, fp, registry)
+
+    @classmethod
+    def load(cls, path, registry=None, **kwargs):
+        """A timeline whose HEAD is that of an export from :meth:`export`
+
+        Ancestors of HEAD can be found by time. Keyword arguments are passed on
+        to the constructor.
+
+        """
+        with open(path, 'rb') as fp:
+            HEAD = load_events(fp, registry)
+
+        ancestors = []
+        event = HEAD.parent
+        while isinstance(event, Event):
+            ancestors.append(event)
+            event = event.parent
+
+        tl = cls(HEAD=HEAD, **kwargs)
+        for event in reversed(ancestors):
+            tl.time_index.add(event)
+        return tl
 
     def cancel(self, plan: Plan):
         if self.require_single_plan:
@@ -99,6 +283,7 @@ class TimeLine(object):
 
 
 class StepLine(TimeLine):
-    def commit(self, plan):
-        TimeLine.commit(self, plan)
+    def commit(self, plan, time=None):
+        TimeLine.commit(self, plan, time)
         self.HEAD.forget_parent()
+        return self.HEAD
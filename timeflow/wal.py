@@ -0,0 +1,312 @@
+"""Write-ahead log of commits, for durable timelines
+
+A :class:`LoggedTimeLine` writes the staged changes of each plan to a
+:class:`WriteAheadLog` before hatching it. After a crash,
+:meth:`WriteAheadLog.recover` replays the log into a fresh timeline.
+
+A checkpoint replaces the log with a single record of the state at HEAD, so
+that the log does not grow without bounds; see :meth:`LoggedTimeLine.checkpoint`.
+
+"""
+import os
+import threading
+import time as _time
+import weakref
+
+from .timeline import TimeLine
+from .serialize import (FlowRegistry, instance_change, stage_change,
+                        pack_record, iter_records, read_payload)
+
+# durability levels
+NONE = 'none'               # written to the OS, never synced
+BATCHED = 'batched'         # synced in groups; commits wait for their group
+PER_COMMIT = 'per_commit'   # synced by each commit
+
+# Record kinds. Commits are numbered from 0 by their sequence numbers. Each
+# checkpoint replaces the log, and is numbered from 0 in a sequence of its
+# own; its payload holds the number of commits it covers, and their state.
+COMMIT = 1
+CHECKPOINT = 2
+
+
+class WriteAheadLog(object):
+    """Log of staged changes in the file `path`
+
+    A log is written by a single :class:`LoggedTimeLine`. With :data:`BATCHED` durability, commits from concurrent threads share
+    syncs: commits arriving while a sync is under way are written and synced
+    together by the next one. The first commit of a group may also wait up to
+    `max_delay` seconds, or until `max_batch_bytes` are waiting, for others to
+    join it.
+
+    Values in flows have to be picklable. Flows are identified by name through
+    `registry`; see :class:`serialize.FlowRegistry`.
+
+    """
+
+    def __init__(self, path, durability=BATCHED, max_batch_bytes=2 ** 20,
+                 max_delay=0, registry=None):
+        if durability not in (NONE, BATCHED, PER_COMMIT):
+            raise ValueError('unknown durability {!r}'.format(durability))
+
+        self.path = path
+        self.durability = durability
+        self.max_batch_bytes = max_batch_bytes
+        self.max_delay = max_delay
+        self.registry = registry if registry is not None else FlowRegistry()
+
+        self._cond = threading.Condition()
+        self._pending = []          # records not yet written
+        self._pending_bytes = 0
+        self._flushing = False
+        self._next_seq = 0
+        self._synced_seq = -1       # last sequence number known to be durable
+        self.syncs = 0
+        self.checkpoints = 0        # number of checkpoints made
+
+        self._timeline = None       # weak reference to the LoggedTimeLine
+        self._records = []          # (kind, time, offset, end), from the file
+        if os.path.exists(path):
+            self._scan()
+        self._file = open(path, 'ab')
+
+    def _scan(self):
+        with open(self.path, 'rb') as fp:
+            self._data = fp.read()
+
+        end = 0
+        for kind, seq, time, offset, end in iter_records(self._data):
+            if kind == CHECKPOINT:
+                # holds the state made by the records before it
+                self._records = []
+                self._next_seq = read_payload(self._data, offset, end)[0]
+                self.checkpoints = seq + 1
+            else:
+                self._next_seq = seq + 1
+            self._records.append((kind, time, offset, end))
+
+        if end < len(self._data):
+            # torn write at the tail
+            with open(self.path, 'r+b') as fp:
+                fp.truncate(end)
+
+        self._synced_seq = self._next_seq - 1
+
+    def __len__(self):
+        """Number of commits logged, including those before a checkpoint"""
+        return self._next_seq
+
+    def close(self):
+        with self._cond:
+            if self._pending:
+                self._flush(sync=self.durability is not NONE)
+            self._file.close()
+
+    def log(self, plan, time):
+        """Record the staged changes of `plan`, to be committed at `time`
+
+        Returns once the record is as durable as :attr:`durability` requires.
+
+        """
+        seq = self.append(plan, time)
+        self.wait(seq)
+        return seq
+
+    def append(self, plan, time):
+        """Queue the record of `plan`, see :meth:`log`, without waiting for it
+        to be durable
+
+        :returns: its sequence number, for :meth:`wait`.
+
+        """
+        base_event = plan.base_event
+        changes = []
+        for flow, instance in plan.stage.items():
+            change = instance_change(flow, base_event.get_flow_instance(flow), instance)
+            if change is not None:
+                changes.append((self.registry.name(flow), change))
+
+        with self._cond:
+            seq = self._next_seq
+            self._next_seq += 1
+            record = pack_record(COMMIT, seq, time, changes)
+            self._pending.append(record)
+            self._pending_bytes += len(record)
+            if self.durability is NONE:
+                self._flush(sync=False)
+
+        return seq
+
+    def wait(self, seq):
+        """Wait until the record `seq` is as durable as :attr:`durability`
+        requires"""
+        with self._cond:
+            if self.durability is PER_COMMIT:
+                while self._synced_seq < seq:
+                    self._flush(sync=True)
+            elif self.durability is BATCHED:
+                self._wait_for_sync(seq)
+
+    def _wait_for_sync(self, seq):
+        deadline = _time.monotonic() + self.max_delay
+        while self._synced_seq < seq:
+            if self._flushing:
+                self._cond.wait()
+                continue
+
+            remaining = deadline - _time.monotonic()
+            if remaining <= 0 or self._pending_bytes >= self.max_batch_bytes:
+                self._flush(sync=True)
+            else:
+                self._cond.wait(remaining)
+
+    def _flush(self, sync):
+        # Called with the lock held; released while writing so that other
+        # commits can queue up behind this one.
+        while self._flushing:
+            self._cond.wait()
+
+        records, self._pending = self._pending, []
+        self._pending_bytes = 0
+        last_seq = self._next_seq - 1
+        self._flushing = True
+
+        self._cond.release()
+        try:
+            self._file.write(b''.join(records))
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+        finally:
+            self._cond.acquire()
+            self._flushing = False
+            if sync:
+                self._synced_seq = last_seq
+                self.syncs += 1
+            self._cond.notify_all()
+
+    def checkpoint(self, event):
+        """Replace the log with a record of the state of `event`
+
+        The records logged so far, written or not, are dropped, and recovery
+        starts from `event`, so it has to hold every commit logged. The record
+        is written to a new file, which takes the place of the log once synced.
+        Sequence numbers of commits go on from those dropped.
+
+        """
+        changes = []
+        for flow, instance in event.instance.items():
+            change = instance_change(flow, flow.default, instance)
+            if change is not None:
+                changes.append((self.registry.name(flow), change))
+
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            self._pending = []
+            self._pending_bytes = 0
+
+            record = pack_record(CHECKPOINT, self.checkpoints, event.time,
+                                 (self._next_seq, changes))
+            sync = self.durability is not NONE
+            path = self.path + '.checkpoint'
+            with open(path, 'wb') as fp:
+                fp.write(record)
+                fp.flush()
+                if sync:
+                    os.fsync(fp.fileno())
+
+            self._file.close()
+            os.replace(path, self.path)
+            if sync:
+                # makes the rename durable
+                _fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+            self._file = open(self.path, 'ab')
+            self.checkpoints += 1
+            if sync:
+                self._synced_seq = self._next_seq - 1
+                self.syncs += 1
+            self._cond.notify_all()
+
+    def recover(self, **kwargs):
+        """A :class:`LoggedTimeLine` replaying the records read at opening
+
+        Keyword arguments are passed on to :class:`LoggedTimeLine`.
+
+        """
+        tl = LoggedTimeLine(self, **kwargs)
+        for kind, time, offset, end in self._records:
+            changes = read_payload(self._data, offset, end)
+            if kind == CHECKPOINT:
+                changes = changes[1]
+            plan = tl.new_plan()
+            for name, change in changes:
+                stage_change(self.registry, plan, name, change)
+            TimeLine.commit(tl, plan, time)
+
+        self._records = []
+        self._data = None
+        return tl
+
+
+def _fsync_directory(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class LoggedTimeLine(TimeLine):
+    """TimeLine logging each plan to a :class:`WriteAheadLog` before committing
+
+    If the timeline starts on an event with a state, the log is checkpointed
+    at it.
+
+    Commits return once their record is durable. They take effect as soon as
+    the record is queued, so that the commits made while a record is synced
+    are synced together with the next one; a commit may thus be read by other
+    threads before it is durable.
+
+    :param wal:                 the log, written by no other timeline.
+    :param checkpoint_every:    if given, the number of commits after which
+                                the log is checkpointed.
+
+    """
+
+    def __init__(self, wal, checkpoint_every=None, **kwargs):
+        TimeLine.__init__(self, **kwargs)
+        if wal._timeline is not None and wal._timeline() is not None:
+            raise ValueError('{} is already written by another timeline'.format(wal))
+
+        self.wal = wal
+        self.checkpoint_every = checkpoint_every
+        self._since_checkpoint = 0
+        wal._timeline = weakref.ref(self)
+
+        if len(self.HEAD.instance):
+            self.checkpoint()
+
+    def commit(self, plan, time=None):
+        # Plans are logged in the order they are committed, and only once
+        # they are known not to conflict. Times are read in the same order.
+        with self._commit_lock:
+            if time is None:
+                time = self.clock()
+            if plan.base_event is not self.HEAD:
+                plan.rebase(self.HEAD)
+            seq = self.wal.append(plan, time)
+            event = TimeLine.commit(self, plan, time)
+
+            self._since_checkpoint += 1
+            if (self.checkpoint_every is not None
+                    and self._since_checkpoint >= self.checkpoint_every):
+                self.checkpoint()
+
+        self.wal.wait(seq)
+        return event
+
+    def checkpoint(self):
+        """Replace the log with a record of the state at HEAD"""
+        with self._commit_lock:
+            self.wal.checkpoint(self.HEAD)
+            self._since_checkpoint = 0